@@ -0,0 +1,31 @@
+"""Add Index Attempt Batch Size Stats
+
+Revision ID: 3c1f2b8e5d07
+Revises: 7f3a1c2d9e41
+Create Date: 2023-12-19 16:40:22.108934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3c1f2b8e5d07"
+down_revision = "7f3a1c2d9e41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "index_attempt",
+        sa.Column(
+            "batch_size_stats",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=True,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("index_attempt", "batch_size_stats")
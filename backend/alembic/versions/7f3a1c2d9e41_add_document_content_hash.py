@@ -0,0 +1,26 @@
+"""Add Document Content Hash
+
+Revision ID: 7f3a1c2d9e41
+Revises: b156fa702355
+Create Date: 2023-12-18 10:12:04.517240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7f3a1c2d9e41"
+down_revision = "b156fa702355"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "document",
+        sa.Column("content_hash", sa.String(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("document", "content_hash")
@@ -0,0 +1,36 @@
+"""Add Index Attempt Priority
+
+Revision ID: a5d2e8c4f913
+Revises: 3c1f2b8e5d07
+Create Date: 2023-12-21 11:02:47.519240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a5d2e8c4f913"
+down_revision = "3c1f2b8e5d07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "index_attempt",
+        sa.Column(
+            "priority",
+            sa.Enum(
+                "MANUAL",
+                "INCREMENTAL",
+                "FULL_REINDEX",
+                name="indexingpriority",
+                native_enum=False,
+            ),
+            nullable=True,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("index_attempt", "priority")
@@ -0,0 +1,39 @@
+"""Add Connector Credential Pair State
+
+Revision ID: b7d4e2a9c1f3
+Revises: e4b9c3a7d2f1
+Create Date: 2023-12-27 14:21:08.734126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "b7d4e2a9c1f3"
+down_revision = "e4b9c3a7d2f1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "connector_credential_pair_state",
+        sa.Column("connector_id", sa.Integer(), nullable=False),
+        sa.Column("credential_id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["connector_id"],
+            ["connector.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["credential_id"],
+            ["credential.id"],
+        ),
+        sa.PrimaryKeyConstraint("connector_id", "credential_id", "key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("connector_credential_pair_state")
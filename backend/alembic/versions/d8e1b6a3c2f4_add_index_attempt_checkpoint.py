@@ -0,0 +1,26 @@
+"""Add Index Attempt Checkpoint
+
+Revision ID: d8e1b6a3c2f4
+Revises: a5d2e8c4f913
+Create Date: 2023-12-22 09:14:05.381920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d8e1b6a3c2f4"
+down_revision = "a5d2e8c4f913"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "index_attempt",
+        sa.Column("checkpoint", sa.Text(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("index_attempt", "checkpoint")
@@ -0,0 +1,27 @@
+"""Add Task Queue Progress
+
+Revision ID: e4b9c3a7d2f1
+Revises: f2c7a9d4b1e6
+Create Date: 2023-12-23 10:12:44.518327
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e4b9c3a7d2f1"
+down_revision = "f2c7a9d4b1e6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "task_queue_jobs",
+        sa.Column("progress", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("task_queue_jobs", "progress")
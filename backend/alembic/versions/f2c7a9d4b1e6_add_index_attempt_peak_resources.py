@@ -0,0 +1,31 @@
+"""Add Index Attempt Peak Resource Usage
+
+Revision ID: f2c7a9d4b1e6
+Revises: d8e1b6a3c2f4
+Create Date: 2023-12-22 15:37:51.204116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "f2c7a9d4b1e6"
+down_revision = "d8e1b6a3c2f4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "index_attempt",
+        sa.Column("peak_rss_mb", sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        "index_attempt",
+        sa.Column("peak_cpu_percent", sa.Float(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("index_attempt", "peak_cpu_percent")
+    op.drop_column("index_attempt", "peak_rss_mb")
@@ -6,10 +6,12 @@ from typing import cast
 from celery import Celery  # type: ignore
 from sqlalchemy.orm import Session
 
+from danswer.background.celery.celery_utils import enqueue_document_set_sync
 from danswer.background.connector_deletion import delete_connector_credential_pair
 from danswer.background.task_utils import build_celery_task_wrapper
 from danswer.background.task_utils import name_cc_cleanup_task
 from danswer.background.task_utils import name_document_set_sync_task
+from danswer.configs.app_configs import DOCUMENT_SET_SYNC_SWEEP_INTERVAL_SECONDS
 from danswer.configs.app_configs import FILE_CONNECTOR_TMP_STORAGE_PATH
 from danswer.configs.app_configs import JOB_TIMEOUT
 from danswer.connectors.file.utils import file_age_in_hours
@@ -17,17 +19,16 @@ from danswer.db.connector_credential_pair import get_connector_credential_pair
 from danswer.db.deletion_attempt import check_deletion_attempt_is_allowed
 from danswer.db.document import prepare_to_modify_documents
 from danswer.db.document_set import delete_document_set
+from danswer.db.document_set import fetch_changed_cc_pair_ids_for_document_set
+from danswer.db.document_set import fetch_document_ids_for_cc_pairs
 from danswer.db.document_set import fetch_document_sets
 from danswer.db.document_set import fetch_document_sets_for_documents
-from danswer.db.document_set import fetch_documents_for_document_set
 from danswer.db.document_set import get_document_set_by_id
 from danswer.db.document_set import mark_document_set_as_synced
 from danswer.db.engine import build_connection_string
 from danswer.db.engine import get_sqlalchemy_engine
 from danswer.db.engine import SYNC_DB_API
 from danswer.db.models import DocumentSet
-from danswer.db.tasks import check_live_task_not_timed_out
-from danswer.db.tasks import get_latest_task
 from danswer.document_index.factory import get_default_document_index
 from danswer.document_index.interfaces import DocumentIndex
 from danswer.document_index.interfaces import UpdateRequest
@@ -50,7 +51,11 @@ _SYNC_BATCH_SIZE = 1000
 # If imports from this module are needed, use local imports to avoid circular importing
 #####
 @build_celery_task_wrapper(name_cc_cleanup_task)
-@celery_app.task(soft_time_limit=JOB_TIMEOUT)
+# re-delivered if the worker dies mid deletion, the deletion then resumes from the
+# documents that are left
+@celery_app.task(
+    soft_time_limit=JOB_TIMEOUT, acks_late=True, reject_on_worker_lost=True
+)
 def cleanup_connector_credential_pair_task(
     connector_id: int,
     credential_id: int,
@@ -91,7 +96,11 @@ def cleanup_connector_credential_pair_task(
 @celery_app.task(soft_time_limit=JOB_TIMEOUT)
 def sync_document_set_task(document_set_id: int) -> None:
     """For document sets marked as not up to date, sync the state from postgres
-    into the datastore. Also handles deletions."""
+    into the datastore. Also handles deletions.
+
+    Only the documents of CC pairs which were added to / removed from the document set
+    since the last sync are touched, all other documents already have the correct
+    document sets in the datastore."""
 
     def _sync_document_batch(
         document_ids: list[str], document_index: DocumentIndex
@@ -101,7 +110,9 @@ def sync_document_set_task(document_set_id: int) -> None:
         with Session(get_sqlalchemy_engine()) as db_session:
             # acquires a lock on the documents so that no other process can modify them
             prepare_to_modify_documents(
-                db_session=db_session, document_ids=document_ids
+                db_session=db_session,
+                document_ids=document_ids,
+                caller="document_set_sync",
             )
 
             # get current state of document sets for these documents
@@ -112,30 +123,44 @@ def sync_document_set_task(document_set_id: int) -> None:
                 )
             }
 
+            # documents which end up with the same document sets are sent as a single
+            # update request
+            document_ids_by_document_sets: dict[frozenset[str], list[str]] = {}
+            for document_id in document_ids:
+                document_ids_by_document_sets.setdefault(
+                    frozenset(document_set_map.get(document_id, [])), []
+                ).append(document_id)
+
             # update Vespa
             document_index.update(
                 update_requests=[
                     UpdateRequest(
-                        document_ids=[document_id],
-                        document_sets=set(document_set_map.get(document_id, [])),
+                        document_ids=document_ids_with_same_sets,
+                        document_sets=set(document_sets),
                     )
-                    for document_id in document_ids
+                    for document_sets, document_ids_with_same_sets in document_ids_by_document_sets.items()
                 ]
             )
 
     with Session(get_sqlalchemy_engine()) as db_session:
         try:
             document_index = get_default_document_index()
-            documents_to_update = fetch_documents_for_document_set(
-                document_set_id=document_set_id,
-                db_session=db_session,
-                current_only=False,
+            changed_cc_pair_ids = fetch_changed_cc_pair_ids_for_document_set(
+                document_set_id=document_set_id, db_session=db_session
+            )
+            document_ids_to_update = fetch_document_ids_for_cc_pairs(
+                cc_pair_ids=changed_cc_pair_ids, db_session=db_session
+            )
+            logger.info(
+                f"Syncing {len(document_ids_to_update)} documents from "
+                f"{len(changed_cc_pair_ids)} changed connector / credential pairs for "
+                f"document set '{document_set_id}'"
             )
-            for document_batch in batch_generator(
-                documents_to_update, _SYNC_BATCH_SIZE
+            for document_id_batch in batch_generator(
+                document_ids_to_update, _SYNC_BATCH_SIZE
             ):
                 _sync_document_batch(
-                    document_ids=[document.id for document in document_batch],
+                    document_ids=document_id_batch,
                     document_index=document_index,
                 )
 
@@ -174,7 +199,8 @@ def sync_document_set_task(document_set_id: int) -> None:
 )
 def check_for_document_sets_sync_task() -> None:
     """Runs periodically to check if any document sets are out of sync
-    Creates a task to sync the set if needed"""
+    Creates a task to sync the set if needed. Changes to document sets enqueue the
+    sync themselves, so this is only a reconciliation sweep for missed syncs"""
     with Session(get_sqlalchemy_engine()) as db_session:
         # check if any document sets are not synced
         document_set_info = fetch_document_sets(
@@ -182,21 +208,7 @@ def check_for_document_sets_sync_task() -> None:
         )
         for document_set, _ in document_set_info:
             if not document_set.is_up_to_date:
-                task_name = name_document_set_sync_task(document_set.id)
-                latest_sync = get_latest_task(task_name, db_session)
-
-                if latest_sync and check_live_task_not_timed_out(
-                    latest_sync, db_session
-                ):
-                    logger.info(
-                        f"Document set '{document_set.id}' is already syncing. Skipping."
-                    )
-                    continue
-
-                logger.info(f"Document set {document_set.id} syncing now!")
-                sync_document_set_task.apply_async(
-                    kwargs=dict(document_set_id=document_set.id),
-                )
+                enqueue_document_set_sync(document_set.id)
 
 
 @celery_app.task(name="clean_old_temp_files_task", soft_time_limit=JOB_TIMEOUT)
@@ -220,7 +232,7 @@ def clean_old_temp_files_task(
 celery_app.conf.beat_schedule = {
     "check-for-document-set-sync": {
         "task": "check_for_document_sets_sync_task",
-        "schedule": timedelta(seconds=5),
+        "schedule": timedelta(seconds=DOCUMENT_SET_SYNC_SWEEP_INTERVAL_SECONDS),
     },
     "clean-old-temp-files": {
         "task": "clean_old_temp_files_task",
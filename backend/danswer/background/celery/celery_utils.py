@@ -1,8 +1,16 @@
+from sqlalchemy import func
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from danswer.background.task_utils import name_cc_cleanup_task
+from danswer.background.task_utils import name_document_set_sync_task
+from danswer.db.engine import get_sqlalchemy_engine
+from danswer.db.tasks import check_live_task_not_timed_out
 from danswer.db.tasks import get_latest_task
 from danswer.server.documents.models import DeletionAttemptSnapshot
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
 
 
 def get_deletion_status(
@@ -16,8 +24,48 @@ def get_deletion_status(
     if not task_state:
         return None
 
+    progress = task_state.progress or {}
     return DeletionAttemptSnapshot(
         connector_id=connector_id,
         credential_id=credential_id,
         status=task_state.status,
+        num_docs_deleted=progress.get("num_docs_deleted"),
+        num_docs_updated=progress.get("num_docs_updated"),
+        num_docs_remaining=progress.get("num_docs_remaining"),
+        eta_seconds=progress.get("eta_seconds"),
     )
+
+
+def enqueue_document_set_sync(document_set_id: int) -> bool:
+    """Kicks off the sync of the document set to the document index, unless a sync for
+    it is already queued / running. Returns whether a new sync task was created.
+
+    Failures are only logged, the periodic sweep will pick up the document set."""
+    from danswer.background.celery.celery import sync_document_set_task
+
+    task_name = name_document_set_sync_task(document_set_id)
+    try:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            # serializes concurrent edits of the same document set so that they
+            # coalesce into a single sync, the lock is released on commit
+            db_session.execute(
+                select(func.pg_advisory_xact_lock(func.hashtext(task_name)))
+            )
+            latest_sync = get_latest_task(task_name, db_session)
+            if latest_sync and check_live_task_not_timed_out(latest_sync, db_session):
+                logger.info(
+                    f"Document set '{document_set_id}' is already syncing. Skipping."
+                )
+                return False
+
+            logger.info(f"Document set {document_set_id} syncing now!")
+            # the task is registered in a separate session, so it is visible to
+            # anyone waiting on the lock
+            sync_document_set_task.apply_async(
+                kwargs=dict(document_set_id=document_set_id),
+            )
+            db_session.commit()
+            return True
+    except Exception:
+        logger.exception(f"Failed to enqueue sync for document set {document_set_id}")
+        return False
@@ -10,19 +10,27 @@ are multiple connector / credential pairs that have indexed it
 connector / credential pair from the access list
 (6) delete all relevant entries from postgres
 """
+import concurrent.futures
 import time
+from typing import cast
 
 from sqlalchemy.orm import Session
 
 from danswer.access.access import get_access_for_documents
+from danswer.background.celery.celery_utils import enqueue_document_set_sync
+from danswer.background.task_utils import name_cc_cleanup_task
+from danswer.configs.app_configs import CONNECTOR_DELETION_NUM_WORKERS
 from danswer.db.connector import fetch_connector_by_id
 from danswer.db.connector_credential_pair import (
     delete_connector_credential_pair__no_commit,
 )
+from danswer.db.connector_state import delete_connector_state__no_commit
 from danswer.db.document import delete_document_by_connector_credential_pair
 from danswer.db.document import delete_documents_complete
+from danswer.db.document import get_document_cnts_for_cc_pairs
 from danswer.db.document import get_document_connector_cnts
-from danswer.db.document import get_documents_for_connector_credential_pair
+from danswer.db.document import get_document_ids_for_connector_credential_pair
+from danswer.db.document import get_document_ids_page_for_connector_credential_pair
 from danswer.db.document import prepare_to_modify_documents
 from danswer.db.document_set import get_document_sets_by_ids
 from danswer.db.document_set import (
@@ -31,6 +39,8 @@ from danswer.db.document_set import (
 from danswer.db.engine import get_sqlalchemy_engine
 from danswer.db.index_attempt import delete_index_attempts
 from danswer.db.models import ConnectorCredentialPair
+from danswer.db.tasks import get_latest_task
+from danswer.db.tasks import update_task_progress
 from danswer.document_index.interfaces import DocumentIndex
 from danswer.document_index.interfaces import UpdateRequest
 from danswer.server.documents.models import ConnectorCredentialPairIdentifier
@@ -46,11 +56,16 @@ def _delete_connector_credential_pair_batch(
     connector_id: int,
     credential_id: int,
     document_index: DocumentIndex,
-) -> None:
+) -> tuple[int, int]:
+    """Returns the number of documents deleted and updated"""
     with Session(get_sqlalchemy_engine()) as db_session:
         # acquire lock for all documents in this batch so that indexing can't
         # override the deletion
-        prepare_to_modify_documents(db_session=db_session, document_ids=document_ids)
+        prepare_to_modify_documents(
+            db_session=db_session,
+            document_ids=document_ids,
+            caller="connector_deletion",
+        )
 
         document_connector_cnts = get_document_connector_cnts(
             db_session=db_session, document_ids=document_ids
@@ -98,13 +113,48 @@ def _delete_connector_credential_pair_batch(
         )
         db_session.commit()
 
+    return len(document_ids_to_delete), len(document_ids_to_update)
+
+
+def delete_documents_removed_from_source(
+    document_ids: list[str],
+    connector_id: int,
+    credential_id: int,
+    document_index: DocumentIndex,
+) -> tuple[int, int]:
+    """For documents which were deleted in the source of the connector. Same as
+    deleting the connector / credential pair, but only for these documents. Returns the
+    number of documents deleted and updated"""
+    with Session(get_sqlalchemy_engine()) as db_session:
+        # documents never indexed by this connector / credential pair are left alone
+        document_ids_to_remove = get_document_ids_for_connector_credential_pair(
+            db_session=db_session,
+            document_ids=document_ids,
+            connector_id=connector_id,
+            credential_id=credential_id,
+        )
+    if not document_ids_to_remove:
+        return 0, 0
+
+    num_deleted, num_updated = 0, 0
+    sorted_document_ids = sorted(document_ids_to_remove)
+    for ind in range(0, len(sorted_document_ids), _DELETION_BATCH_SIZE):
+        batch_deleted, batch_updated = _delete_connector_credential_pair_batch(
+            document_ids=sorted_document_ids[ind : ind + _DELETION_BATCH_SIZE],
+            connector_id=connector_id,
+            credential_id=credential_id,
+            document_index=document_index,
+        )
+        num_deleted += batch_deleted
+        num_updated += batch_updated
+    return num_deleted, num_updated
+
 
 def cleanup_synced_entities(
     cc_pair: ConnectorCredentialPair, db_session: Session
 ) -> None:
     """Updates the document sets associated with the connector / credential pair,
-    then relies on the document set sync script to kick off Celery jobs which will
-    sync these updates to Vespa.
+    then kicks off the Celery jobs which will sync these updates to Vespa.
 
     Waits until the document sets are synced before returning."""
     logger.info(f"Cleaning up Document Sets for CC Pair with ID: '{cc_pair.id}'")
@@ -115,6 +165,8 @@ def cleanup_synced_entities(
         )
     )
     db_session.commit()
+    for document_set_id in document_sets_ids_to_sync:
+        enqueue_document_set_sync(document_set_id)
 
     # wait till all document sets are synced before continuing
     while True:
@@ -141,32 +193,137 @@ def cleanup_synced_entities(
     )
 
 
-def delete_connector_credential_pair(
+def _delete_documents_for_connector_credential_pair(
     db_session: Session,
     document_index: DocumentIndex,
-    cc_pair: ConnectorCredentialPair,
+    connector_id: int,
+    credential_id: int,
+    num_workers: int = CONNECTOR_DELETION_NUM_WORKERS,
 ) -> int:
-    connector_id = cc_pair.connector_id
-    credential_id = cc_pair.credential_id
+    """Processes the documents of the connector / credential pair in batches of
+    `_DELETION_BATCH_SIZE`, up to `num_workers` batches at a time. The batches are
+    disjoint, so they never wait on each other's document locks.
 
-    num_docs_deleted = 0
-    while True:
-        documents = get_documents_for_connector_credential_pair(
+    Returns the number of documents removed from the connector / credential pair (either
+    deleted or updated). Progress is recorded on the deletion task after every batch. Documents are removed
+    from Postgres as their batch completes, so a deletion that was interrupted (e.g.
+    the worker restarted) picks up where it stopped when the task is run again."""
+    task_name = name_cc_cleanup_task(
+        connector_id=connector_id, credential_id=credential_id
+    )
+    latest_task = get_latest_task(task_name=task_name, db_session=db_session)
+    # counts from a previous, interrupted run of this task
+    prior_progress = (latest_task.progress if latest_task else None) or {}
+    num_docs_deleted = cast(int, prior_progress.get("num_docs_deleted", 0))
+    num_docs_updated = cast(int, prior_progress.get("num_docs_updated", 0))
+
+    num_docs_remaining = sum(
+        cnt
+        for _, _, cnt in get_document_cnts_for_cc_pairs(
             db_session=db_session,
-            connector_id=connector_id,
-            credential_id=credential_id,
-            limit=_DELETION_BATCH_SIZE,
+            cc_pair_identifiers=[
+                ConnectorCredentialPairIdentifier(
+                    connector_id=connector_id, credential_id=credential_id
+                )
+            ],
         )
-        if not documents:
-            break
+    )
+    logger.info(
+        f"Deleting {num_docs_remaining} documents with {num_workers} workers"
+        + (
+            f", resuming after {num_docs_deleted + num_docs_updated} documents"
+            if prior_progress
+            else ""
+        )
+    )
 
-        _delete_connector_credential_pair_batch(
-            document_ids=[document.id for document in documents],
-            connector_id=connector_id,
-            credential_id=credential_id,
-            document_index=document_index,
+    start_time = time.monotonic()
+    num_docs_processed_this_run = 0
+
+    def _record_progress() -> None:
+        eta_seconds = None
+        if num_docs_processed_this_run:
+            eta_seconds = (
+                (time.monotonic() - start_time)
+                / num_docs_processed_this_run
+                * max(num_docs_remaining, 0)
+            )
+        update_task_progress(
+            task_name=task_name,
+            progress={
+                "num_docs_deleted": num_docs_deleted,
+                "num_docs_updated": num_docs_updated,
+                "num_docs_remaining": max(num_docs_remaining, 0),
+                "eta_seconds": eta_seconds,
+            },
+            db_session=db_session,
         )
-        num_docs_deleted += len(documents)
+
+    _record_progress()
+
+    last_document_id: str | None = None
+    no_more_documents = False
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        batches_in_progress: set[concurrent.futures.Future[tuple[int, int]]] = set()
+        while True:
+            if not no_more_documents and len(batches_in_progress) < num_workers:
+                document_ids = get_document_ids_page_for_connector_credential_pair(
+                    db_session=db_session,
+                    connector_id=connector_id,
+                    credential_id=credential_id,
+                    limit=_DELETION_BATCH_SIZE,
+                    after_document_id=last_document_id,
+                )
+                # end the read transaction, batches commit in their own sessions
+                db_session.commit()
+                if document_ids:
+                    last_document_id = document_ids[-1]
+                    batches_in_progress.add(
+                        executor.submit(
+                            _delete_connector_credential_pair_batch,
+                            document_ids=document_ids,
+                            connector_id=connector_id,
+                            credential_id=credential_id,
+                            document_index=document_index,
+                        )
+                    )
+                    continue
+                no_more_documents = True
+
+            if not batches_in_progress:
+                break
+
+            completed_batches, batches_in_progress = concurrent.futures.wait(
+                batches_in_progress,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for completed_batch in completed_batches:
+                # raises if the batch failed, the remaining batches are still
+                # finished before the executor shuts down
+                batch_num_deleted, batch_num_updated = completed_batch.result()
+                num_docs_deleted += batch_num_deleted
+                num_docs_updated += batch_num_updated
+                num_docs_processed_this_run += batch_num_deleted + batch_num_updated
+                num_docs_remaining -= batch_num_deleted + batch_num_updated
+            _record_progress()
+
+    return num_docs_deleted + num_docs_updated
+
+
+def delete_connector_credential_pair(
+    db_session: Session,
+    document_index: DocumentIndex,
+    cc_pair: ConnectorCredentialPair,
+) -> int:
+    connector_id = cc_pair.connector_id
+    credential_id = cc_pair.credential_id
+
+    num_docs_deleted = _delete_documents_for_connector_credential_pair(
+        db_session=db_session,
+        document_index=document_index,
+        connector_id=connector_id,
+        credential_id=credential_id,
+    )
 
     # Clean up document sets / access information from Postgres
     # and sync these updates to Vespa
@@ -179,6 +336,11 @@ def delete_connector_credential_pair(
         connector_id=connector_id,
         credential_id=credential_id,
     )
+    delete_connector_state__no_commit(
+        db_session=db_session,
+        connector_id=connector_id,
+        credential_id=credential_id,
+    )
     delete_connector_credential_pair__no_commit(
         db_session=db_session,
         connector_id=connector_id,
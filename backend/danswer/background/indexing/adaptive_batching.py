@@ -0,0 +1,173 @@
+"""Re-groups the document batches produced by a connector into batches sized by
+estimated token volume rather than by a fixed number of documents. The target volume
+is adjusted after every batch based on how long the indexing pipeline took to embed and
+write it, and is cut back whenever the memory usage of the process is too high.
+
+This allows a single indexing job to use large batches for sources with many small
+documents (e.g. Slack messages) while keeping batches of very large documents
+(e.g. long PDFs) small enough to not run the job out of memory."""
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterable
+from typing import Any
+
+import psutil
+
+from danswer.configs.app_configs import INDEX_BATCH_INITIAL_TOKENS
+from danswer.configs.app_configs import INDEX_BATCH_MAX_DOCS
+from danswer.configs.app_configs import INDEX_BATCH_MAX_RSS_MB
+from danswer.configs.app_configs import INDEX_BATCH_MAX_TOKENS
+from danswer.configs.app_configs import INDEX_BATCH_MIN_TOKENS
+from danswer.configs.app_configs import INDEX_BATCH_TARGET_SECONDS
+from danswer.connectors.interfaces import ConnectorCheckpoint
+from danswer.connectors.models import Document
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Rough average for English text, exact counts are not needed to size batches and
+# running the tokenizer here would duplicate the work done by the chunker
+_CHARS_PER_TOKEN_ESTIMATE = 4
+# Limits how quickly the target can grow after a single fast batch
+_MAX_GROWTH_FACTOR = 2.0
+
+
+def estimate_document_tokens(document: Document) -> int:
+    num_chars = len(document.get_title_for_document_index()) + sum(
+        len(section.text) for section in document.sections
+    )
+    return num_chars // _CHARS_PER_TOKEN_ESTIMATE + 1
+
+
+def _get_process_rss_bytes() -> int:
+    return psutil.Process().memory_info().rss
+
+
+class AdaptiveDocumentBatcher:
+    def __init__(
+        self,
+        initial_batch_tokens: int = INDEX_BATCH_INITIAL_TOKENS,
+        min_batch_tokens: int = INDEX_BATCH_MIN_TOKENS,
+        max_batch_tokens: int = INDEX_BATCH_MAX_TOKENS,
+        max_batch_docs: int = INDEX_BATCH_MAX_DOCS,
+        target_batch_seconds: float = INDEX_BATCH_TARGET_SECONDS,
+        max_rss_bytes: int | None = INDEX_BATCH_MAX_RSS_MB * 1024 * 1024 or None,
+        get_rss_bytes: Callable[[], int] = _get_process_rss_bytes,
+    ) -> None:
+        self.min_batch_tokens = min_batch_tokens
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_docs = max_batch_docs
+        self.target_batch_seconds = target_batch_seconds
+        self.max_rss_bytes = max_rss_bytes
+        self.get_rss_bytes = get_rss_bytes
+
+        self.target_batch_tokens = self._clamp(initial_batch_tokens)
+
+        # stats recorded on the index attempt
+        self.num_batches = 0
+        self.batch_doc_counts: list[int] = []
+        self.batch_token_counts: list[int] = []
+        self.peak_rss_bytes = 0
+
+    def _clamp(self, batch_tokens: float) -> int:
+        return int(min(max(batch_tokens, self.min_batch_tokens), self.max_batch_tokens))
+
+    def rebatch(
+        self, doc_batches: Iterable[list[Document]]
+    ) -> Generator[list[Document], None, None]:
+        for doc_batch, _ in self.rebatch_with_checkpoints(
+            (doc_batch, None) for doc_batch in doc_batches
+        ):
+            yield doc_batch
+
+    def rebatch_with_checkpoints(
+        self,
+        doc_batches: Iterable[tuple[list[Document], ConnectorCheckpoint | None]],
+        merge_batches: bool = True,
+    ) -> Generator[tuple[list[Document], ConnectorCheckpoint | None], None, None]:
+        """Each output batch comes with the checkpoint of the last connector batch
+        whose documents have all been output by then (None if there is none yet).
+
+        If not `merge_batches`, connector batches are only split up, so the next
+        connector batch is only requested once all documents of the previous one have
+        been output (and processed by the caller). Needed for connectors which act on
+        a batch having been indexed when the next one is requested.
+
+        The target size is re-read for every document so that adjustments from
+        `record_batch` apply to the very next batch"""
+        buffer: dict[str, Document] = {}
+        buffer_tokens = 0
+        # checkpoint of the last connector batch that has been fully added to the buffer
+        completed_checkpoint: ConnectorCheckpoint | None = None
+        for doc_batch, checkpoint in doc_batches:
+            for doc in doc_batch:
+                # keep only the latest version of a doc so that a doc is never
+                # spread across or duplicated within a batch
+                if doc.id in buffer:
+                    buffer_tokens -= estimate_document_tokens(buffer.pop(doc.id))
+                buffer[doc.id] = doc
+                buffer_tokens += estimate_document_tokens(doc)
+
+                if (
+                    buffer_tokens >= self.target_batch_tokens
+                    or len(buffer) >= self.max_batch_docs
+                ):
+                    yield list(buffer.values()), completed_checkpoint
+                    buffer = {}
+                    buffer_tokens = 0
+
+            completed_checkpoint = checkpoint
+            if buffer and not merge_batches:
+                yield list(buffer.values()), completed_checkpoint
+                buffer = {}
+                buffer_tokens = 0
+
+        if buffer:
+            yield list(buffer.values()), completed_checkpoint
+
+    def record_batch(self, documents: list[Document], elapsed_seconds: float) -> None:
+        """Adjusts the target batch size based on the observed embed / write latency
+        of the batch and the current memory usage of the process"""
+        batch_tokens = sum(estimate_document_tokens(doc) for doc in documents)
+        rss_bytes = self.get_rss_bytes()
+
+        self.num_batches += 1
+        self.batch_doc_counts.append(len(documents))
+        self.batch_token_counts.append(batch_tokens)
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+
+        previous_target = self.target_batch_tokens
+        if self.max_rss_bytes and rss_bytes > self.max_rss_bytes:
+            self.target_batch_tokens = self._clamp(previous_target / 2)
+        elif elapsed_seconds > 0 and batch_tokens > 0:
+            # size that would have hit the target latency at the observed throughput,
+            # averaged with the previous target to smooth out noisy batches
+            throughput = batch_tokens / elapsed_seconds
+            ideal_target = throughput * self.target_batch_seconds
+            self.target_batch_tokens = self._clamp(
+                min(
+                    (previous_target + ideal_target) / 2,
+                    previous_target * _MAX_GROWTH_FACTOR,
+                )
+            )
+
+        if self.target_batch_tokens != previous_target:
+            logger.debug(
+                f"Adjusted target indexing batch size from {previous_target} to "
+                f"{self.target_batch_tokens} tokens. Last batch: {len(documents)} docs, "
+                f"~{batch_tokens} tokens, {elapsed_seconds:.1f}s, "
+                f"RSS {rss_bytes // (1024 * 1024)}MB"
+            )
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "num_batches": self.num_batches,
+            "min_batch_docs": min(self.batch_doc_counts, default=0),
+            "max_batch_docs": max(self.batch_doc_counts, default=0),
+            "avg_batch_docs": (
+                sum(self.batch_doc_counts) / self.num_batches if self.num_batches else 0
+            ),
+            "max_batch_tokens": max(self.batch_token_counts, default=0),
+            "final_target_batch_tokens": self.target_batch_tokens,
+            "peak_rss_mb": self.peak_rss_bytes // (1024 * 1024),
+        }
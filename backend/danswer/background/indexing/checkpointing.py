@@ -43,6 +43,11 @@ def find_end_time_for_indexing_attempt(
     last_successful_run: datetime.datetime | None, source_type: DocumentSource
 ) -> datetime.datetime | None:
     # NOTE: source_type can be used to override the default for certain connectors
+    if source_type == DocumentSource.WEB:
+        # every window is a crawl of the whole site, the web connector only uses the
+        # start of the window to decide which pages may have changed
+        return None
+
     end_of_window = _default_end_time(last_successful_run)
     now = datetime.datetime.now(tz=datetime.timezone.utc)
     if end_of_window < now:
@@ -0,0 +1,204 @@
+"""Watches the memory / CPU usage of an indexing job from inside the job's process.
+
+A background thread samples the RSS of the process (plus its children, e.g. headless
+browsers started by the web connector) and its CPU usage. Once the soft memory limit is
+hit, the job splits its document batches into smaller and smaller pieces. If the hard
+limit is hit, the job is aborted at its next batch with a clear failure reason before it
+can OOM the container and take every other parallel job down with it. If it doesn't get
+to the next batch in time, its process is killed. The peaks are recorded on the index
+attempt and the usage is logged periodically at debug level.
+
+The sampling runs in a thread of the job's own process (rather than e.g. as a Dask
+worker plugin) since it has to work the same for every job client and has to be able to
+act on the job while the job is busy."""
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import TypeVar
+
+import psutil
+
+from danswer.configs.app_configs import INDEXING_JOB_HARD_LIMIT_KILL_GRACE_SECONDS
+from danswer.configs.app_configs import INDEXING_JOB_HARD_MEMORY_LIMIT_MB
+from danswer.configs.app_configs import INDEXING_JOB_SOFT_MEMORY_LIMIT_MB
+from danswer.configs.app_configs import INDEXING_RESOURCE_SAMPLE_INTERVAL_SECONDS
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+T = TypeVar("T")
+
+_BYTES_PER_MB = 1024 * 1024
+
+
+class IndexingMemoryLimitExceededError(Exception):
+    """Raised by the indexing job at the first batch boundary after the hard memory
+    limit was exceeded"""
+
+    def __init__(
+        self,
+        message: str = (
+            "Indexing job aborted: memory usage exceeded the hard limit of "
+            f"{INDEXING_JOB_HARD_MEMORY_LIMIT_MB}MB (INDEXING_JOB_HARD_MEMORY_LIMIT_MB). "
+            "This is usually caused by very large documents."
+        ),
+    ) -> None:
+        super().__init__(message)
+
+
+def get_process_tree_rss_bytes(process: psutil.Process) -> int:
+    rss_bytes = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss_bytes += child.memory_info().rss
+        except psutil.Error:
+            # child exited between listing and sampling
+            pass
+    return rss_bytes
+
+
+def _kill_process_tree(process: psutil.Process) -> None:
+    for child in process.children(recursive=True):
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+    process.kill()
+
+
+class ResourceGovernor:
+    def __init__(
+        self,
+        soft_limit_mb: int = INDEXING_JOB_SOFT_MEMORY_LIMIT_MB,
+        hard_limit_mb: int = INDEXING_JOB_HARD_MEMORY_LIMIT_MB,
+        sample_interval: float = INDEXING_RESOURCE_SAMPLE_INTERVAL_SECONDS,
+        kill_grace_seconds: float = INDEXING_JOB_HARD_LIMIT_KILL_GRACE_SECONDS,
+        on_kill: Callable[[], None] | None = None,
+        log_interval: float = 60 * 5,
+    ) -> None:
+        """A limit of 0 means no limit. `on_kill` is called (from the sampling thread)
+        right before the process is killed, e.g. to record why"""
+        self.soft_limit_bytes = soft_limit_mb * _BYTES_PER_MB
+        self.hard_limit_bytes = hard_limit_mb * _BYTES_PER_MB
+        self.sample_interval = sample_interval
+        self.kill_grace_seconds = kill_grace_seconds
+        self.on_kill = on_kill
+        self.log_interval = log_interval
+
+        self.peak_rss_bytes = 0
+        self.peak_cpu_percent = 0.0
+        self._last_logged_at = time.monotonic()
+        self.hard_limit_exceeded = False
+        self._hard_limit_exceeded_at: float | None = None
+        # set by the sampling thread, cleared whenever the batch size is reduced
+        self._soft_limit_exceeded = False
+        # None = batches are not split
+        self.max_batch_docs: int | None = None
+
+        self._process = psutil.Process()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def sample(self) -> int:
+        rss_bytes = get_process_tree_rss_bytes(self._process)
+        cpu_percent = self._process.cpu_percent(interval=None)
+
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+        self.peak_cpu_percent = max(self.peak_cpu_percent, cpu_percent)
+        if time.monotonic() - self._last_logged_at >= self.log_interval:
+            self._last_logged_at = time.monotonic()
+            memory_available_gb = psutil.virtual_memory().available / (1024.0**3)
+            logger.debug(
+                f"Indexing job: CPU usage {cpu_percent}%, memory usage "
+                f"{rss_bytes // _BYTES_PER_MB}MB, memory available "
+                f"{memory_available_gb:.1f}GB"
+            )
+        if self.soft_limit_bytes and rss_bytes > self.soft_limit_bytes:
+            self._soft_limit_exceeded = True
+        if (
+            self.hard_limit_bytes
+            and rss_bytes > self.hard_limit_bytes
+            and not self.hard_limit_exceeded
+        ):
+            self.hard_limit_exceeded = True
+            self._hard_limit_exceeded_at = time.monotonic()
+            logger.error(
+                f"Indexing job memory usage of {rss_bytes // _BYTES_PER_MB}MB is over "
+                f"the hard limit of {self.hard_limit_bytes // _BYTES_PER_MB}MB, "
+                "aborting at the next batch"
+            )
+        return rss_bytes
+
+    def _should_kill(self, rss_bytes: int) -> bool:
+        return (
+            self._hard_limit_exceeded_at is not None
+            and rss_bytes > self.hard_limit_bytes
+            and time.monotonic() - self._hard_limit_exceeded_at
+            > self.kill_grace_seconds
+        )
+
+    def _kill(self) -> None:
+        logger.error(
+            f"Indexing job did not stop within {self.kill_grace_seconds} seconds of "
+            "exceeding the hard memory limit, killing it"
+        )
+        if self.on_kill is not None:
+            try:
+                self.on_kill()
+            except Exception as e:
+                logger.exception(f"Failed to handle the indexing job being killed: {e}")
+        _kill_process_tree(self._process)
+
+    def _sample_loop(self) -> None:
+        while not self._stop_event.wait(self.sample_interval):
+            try:
+                rss_bytes = self.sample()
+            except psutil.Error as e:
+                logger.warning(f"Failed to sample indexing job resources: {e}")
+                continue
+
+            if self._should_kill(rss_bytes):
+                self._kill()
+                return
+
+    def raise_if_hard_limit_exceeded(self) -> None:
+        """Called by the job between batches, where it can be stopped cleanly"""
+        if self.hard_limit_exceeded:
+            raise IndexingMemoryLimitExceededError()
+
+    def start(self) -> None:
+        # first call to `cpu_percent` only sets the baseline
+        self.sample()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def split_batch(self, batch: list[T]) -> Iterator[list[T]]:
+        """Halves the max batch size every time the soft limit was exceeded since the
+        last call, yields the batch in pieces of at most that size"""
+        if self._soft_limit_exceeded:
+            self._soft_limit_exceeded = False
+            current_max = self.max_batch_docs or len(batch)
+            self.max_batch_docs = max(current_max // 2, 1)
+            logger.warning(
+                f"Indexing job memory usage is over the soft limit of "
+                f"{self.soft_limit_bytes // _BYTES_PER_MB}MB, reducing the max batch "
+                f"size to {self.max_batch_docs} documents"
+            )
+
+        if self.max_batch_docs is None:
+            yield batch
+            return
+
+        for ind in range(0, len(batch), self.max_batch_docs):
+            yield batch[ind : ind + self.max_batch_docs]
+
+    @property
+    def peak_rss_mb(self) -> int:
+        return self.peak_rss_bytes // _BYTES_PER_MB
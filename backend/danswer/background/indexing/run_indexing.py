@@ -1,29 +1,51 @@
 import time
+from collections.abc import Iterator
 from datetime import datetime
 from datetime import timezone
+from functools import partial
 
 import torch
 from sqlalchemy.orm import Session
 
+from danswer.background.connector_deletion import delete_documents_removed_from_source
+from danswer.background.indexing.adaptive_batching import AdaptiveDocumentBatcher
 from danswer.background.indexing.checkpointing import get_time_windows_for_index_attempt
+from danswer.background.indexing.resource_governor import (
+    IndexingMemoryLimitExceededError,
+)
+from danswer.background.indexing.resource_governor import ResourceGovernor
+from danswer.configs.app_configs import ADAPTIVE_INDEX_BATCHING_ENABLED
 from danswer.connectors.factory import instantiate_connector
-from danswer.connectors.interfaces import GenerateDocumentsOutput
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import CheckpointPollConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
+from danswer.connectors.interfaces import DeletionTrackingConnector
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
+from danswer.connectors.interfaces import StatefulConnector
+from danswer.connectors.models import Document
 from danswer.connectors.models import IndexAttemptMetadata
 from danswer.connectors.models import InputType
 from danswer.db.connector import disable_connector
 from danswer.db.connector_credential_pair import get_last_successful_attempt_time
 from danswer.db.connector_credential_pair import update_connector_credential_pair
 from danswer.db.credentials import backend_update_credential_json
+from danswer.db.document import get_document_lock_stats
 from danswer.db.engine import get_sqlalchemy_engine
+from danswer.db.index_attempt import get_checkpoint_to_resume_from
 from danswer.db.index_attempt import get_index_attempt
 from danswer.db.index_attempt import mark_attempt_failed
 from danswer.db.index_attempt import mark_attempt_in_progress
 from danswer.db.index_attempt import mark_attempt_succeeded
+from danswer.db.index_attempt import update_batch_size_stats
 from danswer.db.index_attempt import update_docs_indexed
+from danswer.db.index_attempt import update_index_attempt_checkpoint
+from danswer.db.index_attempt import update_peak_resource_usage
 from danswer.db.models import IndexAttempt
 from danswer.db.models import IndexingStatus
+from danswer.document_index.factory import get_default_document_index
+from danswer.indexing.embedder import DefaultEmbedder
+from danswer.indexing.embedding_pool import LocalEmbeddingPoolClient
 from danswer.indexing.indexing_pipeline import build_indexing_pipeline
 from danswer.utils.logger import IndexAttemptSingleton
 from danswer.utils.logger import setup_logger
@@ -31,13 +53,50 @@ from danswer.utils.logger import setup_logger
 logger = setup_logger()
 
 
+def _delete_removed_documents(
+    connector: DeletionTrackingConnector, attempt: IndexAttempt
+) -> None:
+    deleted_document_ids = connector.pop_deleted_document_ids()
+    if not deleted_document_ids:
+        return
+
+    num_deleted, num_updated = delete_documents_removed_from_source(
+        document_ids=deleted_document_ids,
+        connector_id=attempt.connector.id,
+        credential_id=attempt.credential.id,
+        document_index=get_default_document_index(),
+    )
+    logger.info(
+        f"Removed documents which were deleted in the source: {num_deleted} deleted, "
+        f"{num_updated} still indexed by other connectors"
+    )
+
+
+def _with_deletions(
+    connector: DeletionTrackingConnector,
+    attempt: IndexAttempt,
+    doc_batch_generator: Iterator[tuple[list[Document], ConnectorCheckpoint | None]],
+) -> Iterator[tuple[list[Document], ConnectorCheckpoint | None]]:
+    """Processes the deletions found by the connector whenever the next batch is
+    requested from it, i.e. after the previous batch has been indexed"""
+    for doc_batch, checkpoint in doc_batch_generator:
+        yield doc_batch, checkpoint
+        _delete_removed_documents(connector, attempt)
+    _delete_removed_documents(connector, attempt)
+
+
 def _get_document_generator(
     db_session: Session,
     attempt: IndexAttempt,
     start_time: datetime,
     end_time: datetime,
-) -> GenerateDocumentsOutput:
-    """NOTE: `start_time` and `end_time` are only used for poll connectors"""
+    checkpoint: ConnectorCheckpoint | None = None,
+    adaptive_batcher: AdaptiveDocumentBatcher | None = None,
+) -> Iterator[tuple[list[Document], ConnectorCheckpoint | None]]:
+    """NOTE: `start_time` and `end_time` are only used for poll connectors,
+    `checkpoint` is only used for connectors which support checkpoints (for the type of
+    run). The checkpoint yielded with each batch is None for connectors which don't.
+    If `adaptive_batcher` is given, the connector's batches are re-grouped with it."""
     task = attempt.connector.input_type
 
     try:
@@ -51,14 +110,40 @@ def _get_document_generator(
             backend_update_credential_json(
                 attempt.credential, new_credential_json, db_session
             )
+        if isinstance(runnable_connector, StatefulConnector):
+            runnable_connector.set_cc_pair_id(
+                connector_id=attempt.connector.id, credential_id=attempt.credential.id
+            )
     except Exception as e:
         logger.exception(f"Unable to instantiate connector due to {e}")
         disable_connector(attempt.connector.id, db_session)
         raise e
 
-    if task == InputType.LOAD_STATE:
+    batch_generator: Iterator[tuple[list[Document], ConnectorCheckpoint | None]]
+    if task == InputType.LOAD_STATE and isinstance(
+        runnable_connector, CheckpointConnector
+    ):
+        if checkpoint is not None:
+            logger.info(f"Resuming load from checkpoint: {checkpoint}")
+        batch_generator = runnable_connector.load_from_checkpoint(checkpoint=checkpoint)
+
+    elif task == InputType.POLL and isinstance(
+        runnable_connector, CheckpointPollConnector
+    ):
+        logger.info(f"Polling for updates between {start_time} and {end_time}")
+        if checkpoint is not None:
+            logger.info(f"Resuming poll from checkpoint: {checkpoint}")
+        batch_generator = runnable_connector.poll_source_from_checkpoint(
+            start=start_time.timestamp(),
+            end=end_time.timestamp(),
+            checkpoint=checkpoint,
+        )
+
+    elif task == InputType.LOAD_STATE:
         assert isinstance(runnable_connector, LoadConnector)
-        doc_batch_generator = runnable_connector.load_from_state()
+        batch_generator = (
+            (doc_batch, None) for doc_batch in runnable_connector.load_from_state()
+        )
 
     elif task == InputType.POLL:
         assert isinstance(runnable_connector, PollConnector)
@@ -69,20 +154,36 @@ def _get_document_generator(
             )
 
         logger.info(f"Polling for updates between {start_time} and {end_time}")
-        doc_batch_generator = runnable_connector.poll_source(
-            start=start_time.timestamp(), end=end_time.timestamp()
+        batch_generator = (
+            (doc_batch, None)
+            for doc_batch in runnable_connector.poll_source(
+                start=start_time.timestamp(), end=end_time.timestamp()
+            )
         )
 
     else:
         # Event types cannot be handled by a background type
         raise RuntimeError(f"Invalid task type: {task}")
 
-    return doc_batch_generator
+    if isinstance(runnable_connector, DeletionTrackingConnector):
+        batch_generator = _with_deletions(runnable_connector, attempt, batch_generator)
+    if adaptive_batcher:
+        # these connectors save their state / process deletions when the next batch is
+        # requested, which must only happen once the previous batch is fully indexed
+        batch_generator = adaptive_batcher.rebatch_with_checkpoints(
+            batch_generator,
+            merge_batches=not isinstance(
+                runnable_connector, (StatefulConnector, DeletionTrackingConnector)
+            ),
+        )
+    return batch_generator
 
 
 def _run_indexing(
     db_session: Session,
     index_attempt: IndexAttempt,
+    embedding_pool_client: LocalEmbeddingPoolClient | None = None,
+    resource_governor: ResourceGovernor | None = None,
 ) -> None:
     """
     1. Get documents which are either new or updated from specified application
@@ -100,7 +201,9 @@ def _run_indexing(
         attempt_status=IndexingStatus.IN_PROGRESS,
     )
 
-    indexing_pipeline = build_indexing_pipeline()
+    indexing_pipeline = build_indexing_pipeline(
+        embedder=DefaultEmbedder(embedding_model=embedding_pool_client)
+    )
     db_connector = index_attempt.connector
     db_credential = index_attempt.credential
     last_successful_index_time = get_last_successful_attempt_time(
@@ -109,6 +212,18 @@ def _run_indexing(
         db_session=db_session,
     )
 
+    adaptive_batcher = (
+        AdaptiveDocumentBatcher() if ADAPTIVE_INDEX_BATCHING_ENABLED else None
+    )
+
+    # carried over right away so that the next attempt can still resume from it if
+    # this one fails before committing any batch
+    checkpoint = get_checkpoint_to_resume_from(index_attempt, db_session)
+    if checkpoint is not None:
+        update_index_attempt_checkpoint(
+            db_session=db_session, index_attempt=index_attempt, checkpoint=checkpoint
+        )
+
     net_doc_change = 0
     document_count = 0
     chunk_count = 0
@@ -126,10 +241,15 @@ def _run_indexing(
             attempt=index_attempt,
             start_time=window_start,
             end_time=window_end,
+            checkpoint=checkpoint,
+            adaptive_batcher=adaptive_batcher,
         )
 
         try:
-            for doc_batch in doc_batch_generator:
+            for doc_batch, batch_checkpoint in doc_batch_generator:
+                if resource_governor:
+                    resource_governor.raise_if_hard_limit_exceeded()
+
                 # check if connector is disabled mid run and stop if so
                 db_session.refresh(db_connector)
                 if db_connector.disabled:
@@ -140,13 +260,30 @@ def _run_indexing(
                     f"Indexing batch of documents: {[doc.to_short_descriptor() for doc in doc_batch]}"
                 )
 
-                new_docs, total_batch_chunks = indexing_pipeline(
-                    documents=doc_batch,
-                    index_attempt_metadata=IndexAttemptMetadata(
-                        connector_id=db_connector.id,
-                        credential_id=db_credential.id,
-                    ),
-                )
+                batch_start = time.monotonic()
+                new_docs, total_batch_chunks = 0, 0
+                # split up into smaller pieces if the job is running low on memory
+                for sub_batch in (
+                    resource_governor.split_batch(doc_batch)
+                    if resource_governor
+                    else [doc_batch]
+                ):
+                    if resource_governor:
+                        resource_governor.raise_if_hard_limit_exceeded()
+                    sub_batch_new_docs, sub_batch_chunks = indexing_pipeline(
+                        documents=sub_batch,
+                        index_attempt_metadata=IndexAttemptMetadata(
+                            connector_id=db_connector.id,
+                            credential_id=db_credential.id,
+                        ),
+                    )
+                    new_docs += sub_batch_new_docs
+                    total_batch_chunks += sub_batch_chunks
+                if adaptive_batcher:
+                    adaptive_batcher.record_batch(
+                        documents=doc_batch,
+                        elapsed_seconds=time.monotonic() - batch_start,
+                    )
                 net_doc_change += new_docs
                 chunk_count += total_batch_chunks
                 document_count += len(doc_batch)
@@ -165,7 +302,31 @@ def _run_indexing(
                     total_docs_indexed=document_count,
                     new_docs_indexed=net_doc_change,
                 )
-
+                if adaptive_batcher:
+                    update_batch_size_stats(
+                        db_session=db_session,
+                        index_attempt=index_attempt,
+                        batch_size_stats=adaptive_batcher.get_stats(),
+                    )
+                if resource_governor:
+                    update_peak_resource_usage(
+                        db_session=db_session,
+                        index_attempt=index_attempt,
+                        peak_rss_mb=resource_governor.peak_rss_mb,
+                        peak_cpu_percent=resource_governor.peak_cpu_percent,
+                    )
+                # only recorded once the batch is committed, so a resumed run never
+                # skips documents which were not indexed
+                if batch_checkpoint is not None:
+                    checkpoint = batch_checkpoint
+                    update_index_attempt_checkpoint(
+                        db_session=db_session,
+                        index_attempt=index_attempt,
+                        checkpoint=checkpoint,
+                    )
+
+            # the next window is a new load, so starts from the beginning
+            checkpoint = None
             run_end_dt = window_end
             update_connector_credential_pair(
                 db_session=db_session,
@@ -186,7 +347,14 @@ def _run_indexing(
             #
             # NOTE: if the connector is manually disabled, we should mark it as a failure regardless
             # to give better clarity in the UI, as the next run will never happen.
-            if ind == 0 or db_connector.disabled:
+            #
+            # Jobs aborted for using too much memory are always marked as failed so
+            # that the reason is visible
+            if (
+                ind == 0
+                or db_connector.disabled
+                or isinstance(e, IndexingMemoryLimitExceededError)
+            ):
                 mark_attempt_failed(index_attempt, db_session, failure_reason=str(e))
                 update_connector_credential_pair(
                     db_session=db_session,
@@ -219,10 +387,31 @@ def _run_indexing(
     )
 
 
-def run_indexing_entrypoint(index_attempt_id: int, num_threads: int) -> None:
+def _mark_attempt_killed(index_attempt_id: int) -> None:
+    """Runs in the resource governor's thread, so uses its own session"""
+    with Session(get_sqlalchemy_engine()) as db_session:
+        attempt = get_index_attempt(
+            db_session=db_session, index_attempt_id=index_attempt_id
+        )
+        if attempt is not None:
+            mark_attempt_failed(
+                attempt,
+                db_session,
+                failure_reason=str(IndexingMemoryLimitExceededError()),
+            )
+
+
+def run_indexing_entrypoint(
+    index_attempt_id: int,
+    num_threads: int,
+    embedding_pool_client: LocalEmbeddingPoolClient | None = None,
+) -> None:
     """Entrypoint for indexing run when using dask distributed.
     Wraps the actual logic in a `try` block so that we can catch any exceptions
-    and mark the attempt as failed."""
+    and mark the attempt as failed.
+
+    If `embedding_pool_client` is provided, embedding is offloaded to the shared
+    local embedding workers instead of running the model in this process."""
     try:
         # set the indexing attempt ID so that all log messages from this process
         # will have it added as a prefix
@@ -246,10 +435,33 @@ def run_indexing_entrypoint(index_attempt_id: int, num_threads: int) -> None:
                 f"with credentials: '{attempt.credential_id}'"
             )
 
-            _run_indexing(
-                db_session=db_session,
-                index_attempt=attempt,
+            resource_governor = ResourceGovernor(
+                on_kill=partial(_mark_attempt_killed, index_attempt_id)
             )
+            resource_governor.start()
+            try:
+                _run_indexing(
+                    db_session=db_session,
+                    index_attempt=attempt,
+                    embedding_pool_client=embedding_pool_client,
+                    resource_governor=resource_governor,
+                )
+            finally:
+                resource_governor.stop()
+                # failed / aborted attempts are the ones where the peaks matter most
+                try:
+                    update_peak_resource_usage(
+                        db_session=db_session,
+                        index_attempt=attempt,
+                        peak_rss_mb=resource_governor.peak_rss_mb,
+                        peak_cpu_percent=resource_governor.peak_cpu_percent,
+                    )
+                except Exception as e:
+                    logger.exception(f"Failed to record peak resource usage: {e}")
+
+            indexing_lock_stats = get_document_lock_stats().get("indexing")
+            if indexing_lock_stats and indexing_lock_stats.num_contended_attempts:
+                logger.info(f"Document lock contention: {indexing_lock_stats}")
 
             logger.info(
                 f"Completed indexing attempt for connector: '{attempt.connector.name}', "
@@ -0,0 +1,130 @@
+"""Decides which of the waiting (NOT_STARTED) index attempts to start next.
+
+Attempts are ordered by priority class (manual "run once" > incremental poll of an
+already indexed pair > full index of a new pair) and then by age. Every
+`INDEXING_PRIORITY_AGING_SECONDS` spent waiting promotes an attempt by one class so that
+a steady stream of higher priority attempts can never starve the rest. Attempts are then
+started in that order as long as doing so doesn't exceed the per source / per connector
+concurrency limits, e.g. so that a large Google Drive backfill can't occupy every worker
+while the frequently refreshed Slack connectors wait."""
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+
+from danswer.configs.app_configs import INDEXING_MAX_JOBS_PER_CONNECTOR
+from danswer.configs.app_configs import INDEXING_MAX_JOBS_PER_SOURCE
+from danswer.configs.app_configs import INDEXING_PRIORITY_AGING_SECONDS
+from danswer.configs.constants import DocumentSource
+from danswer.db.models import IndexAttempt
+from danswer.db.models import IndexingPriority
+
+_PRIORITY_RANK = {
+    IndexingPriority.MANUAL: 0,
+    IndexingPriority.INCREMENTAL: 1,
+    IndexingPriority.FULL_REINDEX: 2,
+}
+
+
+@dataclass(frozen=True)
+class QueuedAttempt:
+    attempt_id: int
+    connector_id: int
+    source: DocumentSource
+    priority: IndexingPriority
+    time_created: datetime
+
+    @classmethod
+    def from_index_attempt_db_model(
+        cls, index_attempt: IndexAttempt
+    ) -> "QueuedAttempt":
+        """Connector must be loaded / not deleted"""
+        return cls(
+            attempt_id=index_attempt.id,
+            connector_id=index_attempt.connector.id,
+            source=index_attempt.connector.source,
+            priority=index_attempt.priority or IndexingPriority.INCREMENTAL,
+            time_created=index_attempt.time_created,
+        )
+
+
+def get_effective_priority(
+    attempt: QueuedAttempt,
+    now: datetime,
+    aging_seconds: float = INDEXING_PRIORITY_AGING_SECONDS,
+) -> float:
+    """Lower is more urgent"""
+    rank = _PRIORITY_RANK[attempt.priority]
+    if aging_seconds <= 0:
+        return rank
+
+    seconds_waited = max((now - attempt.time_created).total_seconds(), 0)
+    return rank - seconds_waited / aging_seconds
+
+
+def order_attempt_queue(
+    attempts: Iterable[QueuedAttempt],
+    now: datetime,
+    aging_seconds: float = INDEXING_PRIORITY_AGING_SECONDS,
+) -> list[QueuedAttempt]:
+    return sorted(
+        attempts,
+        key=lambda attempt: (
+            get_effective_priority(attempt, now, aging_seconds),
+            attempt.time_created,
+            attempt.attempt_id,
+        ),
+    )
+
+
+def get_queue_positions(
+    attempts: Iterable[QueuedAttempt],
+    now: datetime,
+    aging_seconds: float = INDEXING_PRIORITY_AGING_SECONDS,
+) -> dict[int, int]:
+    """Maps attempt id to its 1-based position in the queue"""
+    return {
+        attempt.attempt_id: position
+        for position, attempt in enumerate(
+            order_attempt_queue(attempts, now, aging_seconds), start=1
+        )
+    }
+
+
+def select_attempts_to_start(
+    queued_attempts: Iterable[QueuedAttempt],
+    running: Iterable[tuple[int, DocumentSource]],
+    num_available_slots: int,
+    now: datetime,
+    max_jobs_per_source: dict[str, int] = INDEXING_MAX_JOBS_PER_SOURCE,
+    max_jobs_per_connector: int = INDEXING_MAX_JOBS_PER_CONNECTOR,
+    aging_seconds: float = INDEXING_PRIORITY_AGING_SECONDS,
+) -> list[QueuedAttempt]:
+    """`running` holds the (connector_id, source) of every already started job.
+    A limit of 0 means no limit."""
+    jobs_per_connector: Counter[int] = Counter()
+    jobs_per_source: Counter[DocumentSource] = Counter()
+    for connector_id, source in running:
+        jobs_per_connector[connector_id] += 1
+        jobs_per_source[source] += 1
+
+    to_start: list[QueuedAttempt] = []
+    for attempt in order_attempt_queue(queued_attempts, now, aging_seconds):
+        if len(to_start) >= num_available_slots:
+            break
+
+        if (
+            max_jobs_per_connector > 0
+            and jobs_per_connector[attempt.connector_id] >= max_jobs_per_connector
+        ):
+            continue
+
+        source_limit = max_jobs_per_source.get(attempt.source.value, 0)
+        if source_limit > 0 and jobs_per_source[attempt.source] >= source_limit:
+            continue
+
+        to_start.append(attempt)
+        jobs_per_connector[attempt.connector_id] += 1
+        jobs_per_source[attempt.source] += 1
+
+    return to_start
@@ -0,0 +1,385 @@
+"""Pool of long-lived indexing worker processes, an alternative to `SimpleJobClient`
+(which spawns a brand new process per index attempt).
+
+Each worker imports the codebase and loads the models once and then pulls jobs off a
+shared queue, so frequently refreshed connectors don't spend most of every run on
+process startup. To keep jobs isolated:
+- the index attempt logging context is reset after every job
+- a worker exits after a job if its memory has grown too much since startup (or it has
+  run too many jobs) and is replaced by a fresh one
+- cancelling a job interrupts it (raising `KeyboardInterrupt` inside the job) rather
+  than killing the worker, the worker is only terminated if the job doesn't stop within
+  a grace period
+
+Job args are sent to the workers over a queue, so they must be picklable outside of
+process startup. Objects which can only be shared via inheritance (e.g. the task queue
+of the local embedding pool) are handed to the workers through `initializer` instead.
+
+Exposes the same interface as `SimpleJobClient` / `dask.distributed.Client` so it can be
+used by the update loop in their place."""
+import _thread
+import queue
+import signal
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from multiprocessing.reduction import ForkingPickler
+from typing import Any
+
+import psutil
+from torch import multiprocessing
+
+from danswer.background.indexing.job_client import JobStatusType
+from danswer.configs.app_configs import INDEXING_WORKER_MAX_JOBS
+from danswer.configs.app_configs import INDEXING_WORKER_MAX_RSS_GROWTH_MB
+from danswer.search.search_nlp_models import warm_up_models
+from danswer.utils.logger import IndexAttemptSingleton
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# how long a cancelled job has to stop before its worker is terminated
+_CANCEL_GRACE_PERIOD_SECONDS = 60
+# how often the worker checks if its current job has been cancelled
+_CANCEL_POLL_INTERVAL_SECONDS = 1
+# placeholder for "no job" in the shared job id values
+_NO_JOB_ID = -1
+
+_EVENT_STARTED = "started"
+_EVENT_FINISHED = "finished"
+_EVENT_FAILED = "failed"
+_EVENT_CANCELLED = "cancelled"
+
+
+@dataclass
+class _WorkItem:
+    job_id: int
+    func: Callable
+    args: tuple[Any, ...]
+
+
+def _watch_for_cancellation(
+    current_job_id: Any, cancel_job_id: Any, job_lock: threading.Lock
+) -> None:
+    while True:
+        time.sleep(_CANCEL_POLL_INTERVAL_SECONDS)
+        # the job can't finish (and the next one can't start) while we check it
+        with job_lock:
+            job_id = current_job_id.value
+            if job_id != _NO_JOB_ID and cancel_job_id.value == job_id:
+                cancel_job_id.value = _NO_JOB_ID
+                _thread.interrupt_main()
+
+
+def _build_interrupt_handler(current_job_id: Any) -> Callable[..., None]:
+    def handle_interrupt(signum: int, frame: Any) -> None:
+        # the interrupt is only handled once the main thread gets to it, by which
+        # point the job may have finished. It must not kill the worker between jobs
+        if current_job_id.value != _NO_JOB_ID:
+            raise KeyboardInterrupt
+
+    return handle_interrupt
+
+
+def _worker_loop(
+    worker_index: int,
+    task_queue: multiprocessing.Queue,
+    event_queue: multiprocessing.Queue,
+    current_job_id: Any,
+    cancel_job_id: Any,
+    warm_up: bool,
+    max_rss_growth_bytes: int,
+    max_jobs: int,
+    initializer: Callable[..., None] | None,
+    initargs: tuple[Any, ...],
+) -> None:
+    if initializer is not None:
+        initializer(*initargs)
+
+    if warm_up:
+        try:
+            warm_up_models(indexer_only=True, skip_cross_encoders=True)
+        except Exception as e:
+            logger.warning(f"Failed to warm up models in indexing worker: {e}")
+
+    baseline_rss = psutil.Process().memory_info().rss
+    job_lock = threading.Lock()
+    signal.signal(signal.SIGINT, _build_interrupt_handler(current_job_id))
+    threading.Thread(
+        target=_watch_for_cancellation,
+        args=(current_job_id, cancel_job_id, job_lock),
+        daemon=True,
+    ).start()
+
+    num_jobs_run = 0
+    while True:
+        work_item: _WorkItem | None = task_queue.get()
+        if work_item is None:
+            return
+
+        with job_lock:
+            current_job_id.value = work_item.job_id
+        event_queue.put((_EVENT_STARTED, worker_index, work_item.job_id, None))
+        try:
+            try:
+                work_item.func(*work_item.args)
+            finally:
+                # an interrupt handled after this point is ignored, one handled
+                # before it is raised inside of this `try`
+                with job_lock:
+                    current_job_id.value = _NO_JOB_ID
+            event: tuple = (_EVENT_FINISHED, worker_index, work_item.job_id, None)
+        except KeyboardInterrupt:
+            event = (_EVENT_CANCELLED, worker_index, work_item.job_id, None)
+        except Exception as e:
+            logger.exception(f"Indexing job '{work_item.job_id}' failed: {e}")
+            event = (_EVENT_FAILED, worker_index, work_item.job_id, str(e))
+        finally:
+            current_job_id.value = _NO_JOB_ID
+            IndexAttemptSingleton.clear_index_attempt_id()
+        event_queue.put(event)
+
+        num_jobs_run += 1
+        rss_growth = psutil.Process().memory_info().rss - baseline_rss
+        if max_rss_growth_bytes > 0 and rss_growth > max_rss_growth_bytes:
+            logger.info(
+                f"Recycling indexing worker after memory grew by "
+                f"{rss_growth // (1024 * 1024)}MB"
+            )
+            return
+        if max_jobs > 0 and num_jobs_run >= max_jobs:
+            logger.info(f"Recycling indexing worker after {num_jobs_run} jobs")
+            return
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    current_job_id: Any
+    cancel_job_id: Any
+
+
+class PersistentJob:
+    """Drop in replacement for `dask.distributed.Future`"""
+
+    def __init__(self, id: int, client: "PersistentJobClient") -> None:
+        self.id = id
+        self._client = client
+
+    def cancel(self) -> bool:
+        return self._client.cancel_job(self.id)
+
+    def release(self) -> bool:
+        # same as `SimpleJob`, a released job should no longer be running
+        if not self.done():
+            return self.cancel()
+        self._client.forget_job(self.id)
+        return False
+
+    @property
+    def status(self) -> JobStatusType:
+        return self._client.get_job_status(self.id)
+
+    def done(self) -> bool:
+        return (
+            self.status == "finished"
+            or self.status == "cancelled"
+            or self.status == "error"
+        )
+
+    def exception(self) -> str:
+        error = self._client.get_job_error(self.id)
+        return f"Job with ID '{self.id}' failed: {error or 'worker was killed'}"
+
+
+class PersistentJobClient:
+    """Drop in replacement for `dask.distributed.Client`"""
+
+    def __init__(
+        self,
+        n_workers: int = 1,
+        warm_up: bool = True,
+        max_rss_growth_mb: int = INDEXING_WORKER_MAX_RSS_GROWTH_MB,
+        max_jobs_per_worker: int = INDEXING_WORKER_MAX_JOBS,
+        initializer: Callable[..., None] | None = None,
+        initargs: tuple[Any, ...] = (),
+    ) -> None:
+        """`initializer(*initargs)` is called by each worker when it is started, same
+        as for `multiprocessing.Pool`"""
+        self.n_workers = n_workers
+        self.warm_up = warm_up
+        self.max_rss_growth_bytes = max_rss_growth_mb * 1024 * 1024
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self.job_id_counter = 0
+        self.job_statuses: dict[int, JobStatusType] = {}
+        self.job_errors: dict[int, str] = {}
+        # job id -> index of the worker running it
+        self.job_workers: dict[int, int] = {}
+        # job id -> time that the cancellation was requested
+        self.cancel_requests: dict[int, float] = {}
+
+        self._task_queue: multiprocessing.Queue = multiprocessing.Queue()
+        self._event_queue: multiprocessing.Queue = multiprocessing.Queue()
+        self._workers: list[_Worker] = [
+            self._start_worker(ind) for ind in range(n_workers)
+        ]
+
+    def _start_worker(self, worker_index: int) -> _Worker:
+        current_job_id = multiprocessing.Value("i", _NO_JOB_ID)
+        cancel_job_id = multiprocessing.Value("i", _NO_JOB_ID)
+        process = multiprocessing.Process(
+            target=_worker_loop,
+            args=(
+                worker_index,
+                self._task_queue,
+                self._event_queue,
+                current_job_id,
+                cancel_job_id,
+                self.warm_up,
+                self.max_rss_growth_bytes,
+                self.max_jobs_per_worker,
+                self.initializer,
+                self.initargs,
+            ),
+            daemon=True,
+        )
+        process.start()
+        return _Worker(
+            process=process, current_job_id=current_job_id, cancel_job_id=cancel_job_id
+        )
+
+    def _process_events(self) -> None:
+        while True:
+            try:
+                event, worker_index, job_id, error = self._event_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if event == _EVENT_STARTED:
+                self.job_workers[job_id] = worker_index
+                if job_id in self.cancel_requests:
+                    # cancelled while waiting in the queue
+                    self._workers[worker_index].cancel_job_id.value = job_id
+                elif self.job_statuses.get(job_id) == "pending":
+                    self.job_statuses[job_id] = "running"
+                continue
+
+            self.job_workers.pop(job_id, None)
+            self.cancel_requests.pop(job_id, None)
+            if event == _EVENT_FINISHED:
+                self.job_statuses[job_id] = "finished"
+            elif event == _EVENT_CANCELLED:
+                self.job_statuses[job_id] = "cancelled"
+            else:
+                self.job_statuses[job_id] = "error"
+                self.job_errors[job_id] = error
+
+    def _maintain_workers(self) -> None:
+        """Replaces workers which have exited (recycled, crashed or OOM killed) and
+        terminates workers whose cancelled jobs did not stop within the grace period"""
+        for job_id, requested_at in list(self.cancel_requests.items()):
+            worker_index = self.job_workers.get(job_id)
+            if (
+                worker_index is None
+                or time.monotonic() - requested_at < _CANCEL_GRACE_PERIOD_SECONDS
+            ):
+                continue
+            logger.warning(
+                f"Indexing job '{job_id}' did not stop after being cancelled, "
+                "terminating its worker"
+            )
+            self._workers[worker_index].process.terminate()
+            self._workers[worker_index].process.join()
+
+        for worker_index, worker in enumerate(self._workers):
+            if worker.process.is_alive():
+                continue
+
+            for job_id, job_worker_index in list(self.job_workers.items()):
+                if job_worker_index != worker_index:
+                    continue
+                del self.job_workers[job_id]
+                if self.cancel_requests.pop(job_id, None) is not None:
+                    self.job_statuses[job_id] = "cancelled"
+                else:
+                    self.job_statuses[job_id] = "error"
+
+            if worker.process.exitcode != 0:
+                logger.warning(
+                    f"Indexing worker exited with code {worker.process.exitcode}, "
+                    "restarting"
+                )
+            self._workers[worker_index] = self._start_worker(worker_index)
+
+    def _refresh(self) -> None:
+        self._process_events()
+        self._maintain_workers()
+        # events from workers that died before the above check may have arrived since
+        self._process_events()
+
+    def get_job_status(self, job_id: int) -> JobStatusType:
+        self._refresh()
+        return self.job_statuses.get(job_id, "cancelled")
+
+    def get_job_error(self, job_id: int) -> str | None:
+        return self.job_errors.get(job_id)
+
+    def forget_job(self, job_id: int) -> None:
+        """Only called for completed jobs"""
+        self.job_statuses.pop(job_id, None)
+        self.job_errors.pop(job_id, None)
+
+    def cancel_job(self, job_id: int) -> bool:
+        self._refresh()
+        status = self.job_statuses.get(job_id)
+        if status not in ("pending", "running") or job_id in self.cancel_requests:
+            return False
+
+        self.cancel_requests[job_id] = time.monotonic()
+        worker_index = self.job_workers.get(job_id)
+        if worker_index is not None:
+            self._workers[worker_index].cancel_job_id.value = job_id
+        return True
+
+    def submit(
+        self, func: Callable, *args: Any, pure: bool = True
+    ) -> PersistentJob | None:
+        """NOTE: `pure` arg is needed so this can be a drop in replacement for Dask"""
+        self._refresh()
+        num_active_jobs = sum(
+            status in ("pending", "running") for status in self.job_statuses.values()
+        )
+        if num_active_jobs >= self.n_workers:
+            logger.debug("No available workers to run job")
+            return None
+
+        job_id = self.job_id_counter
+        self.job_id_counter += 1
+        work_item = _WorkItem(job_id=job_id, func=func, args=args)
+        # the queue pickles the item in a background thread, which only logs errors
+        # and drops the item, leaving the job pending forever
+        try:
+            ForkingPickler.dumps(work_item)
+        except Exception as e:
+            logger.exception(f"Unable to send indexing job '{job_id}' to a worker")
+            self.job_statuses[job_id] = "error"
+            self.job_errors[job_id] = f"Job args can't be sent to a worker: {e}"
+            return PersistentJob(id=job_id, client=self)
+
+        self.job_statuses[job_id] = "pending"
+        self._task_queue.put(work_item)
+
+        return PersistentJob(id=job_id, client=self)
+
+    def close(self) -> None:
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers = []
@@ -9,29 +9,42 @@ from dask.distributed import Future
 from distributed import LocalCluster
 from sqlalchemy.orm import Session
 
-from danswer.background.indexing.dask_utils import ResourceLogger
 from danswer.background.indexing.job_client import SimpleJob
 from danswer.background.indexing.job_client import SimpleJobClient
 from danswer.background.indexing.run_indexing import run_indexing_entrypoint
+from danswer.background.indexing.scheduling import QueuedAttempt
+from danswer.background.indexing.scheduling import select_attempts_to_start
+from danswer.background.indexing.worker_pool import PersistentJob
+from danswer.background.indexing.worker_pool import PersistentJobClient
+from danswer.configs.app_configs import BACKGROUND_JOB_EMBEDDING_MODEL_SERVER_HOST
 from danswer.configs.app_configs import DASK_JOB_CLIENT_ENABLED
-from danswer.configs.app_configs import LOG_LEVEL
+from danswer.configs.app_configs import DISABLE_INDEXING_SCHEDULER_NOTIFICATIONS
+from danswer.configs.app_configs import INDEXING_SCHEDULER_SWEEP_INTERVAL
+from danswer.configs.app_configs import INDEXING_WORKER_POOL_ENABLED
 from danswer.configs.app_configs import MODEL_SERVER_HOST
 from danswer.configs.app_configs import NUM_INDEXING_WORKERS
+from danswer.configs.app_configs import NUM_LOCAL_EMBEDDING_WORKERS
 from danswer.configs.model_configs import MIN_THREADS_ML_MODELS
-from danswer.db.connector import fetch_connectors
 from danswer.db.connector_credential_pair import mark_all_in_progress_cc_pairs_failed
 from danswer.db.connector_credential_pair import update_connector_credential_pair
+from danswer.db.connector_credential_pair import (
+    update_connector_credential_pairs_attempt_status,
+)
 from danswer.db.engine import get_db_current_time
 from danswer.db.engine import get_sqlalchemy_engine
-from danswer.db.index_attempt import create_index_attempt
-from danswer.db.index_attempt import get_index_attempt
+from danswer.db.index_attempt import create_index_attempts
+from danswer.db.index_attempt import get_cc_pairs_due_for_indexing
+from danswer.db.index_attempt import get_index_attempts
 from danswer.db.index_attempt import get_inprogress_index_attempts
-from danswer.db.index_attempt import get_last_attempt
 from danswer.db.index_attempt import get_not_started_index_attempts
 from danswer.db.index_attempt import mark_attempt_failed
-from danswer.db.models import Connector
 from danswer.db.models import IndexAttempt
+from danswer.db.models import IndexingPriority
 from danswer.db.models import IndexingStatus
+from danswer.db.notifications import NotificationChannel
+from danswer.db.notifications import PostgresListener
+from danswer.indexing.embedding_pool import LocalEmbeddingPool
+from danswer.indexing.embedding_pool import set_inherited_task_queue
 from danswer.search.search_nlp_models import warm_up_models
 from danswer.utils.logger import setup_logger
 
@@ -44,6 +57,9 @@ dask.config.set({"distributed.scheduler.allowed-failures": 0})
 _UNEXPECTED_STATE_FAILURE_REASON = (
     "Stopped mid run, likely due to the background process being killed"
 )
+# After being woken up, wait this long for related notifications (e.g. a burst of
+# attempts being created) so they are all handled by a single scheduling pass
+_NOTIFICATION_DEBOUNCE_SECONDS = 0.5
 
 
 """Util funcs"""
@@ -56,23 +72,6 @@ def _get_num_threads() -> int:
     return max(MIN_THREADS_ML_MODELS, torch.get_num_threads())
 
 
-def _should_create_new_indexing(
-    connector: Connector, last_index: IndexAttempt | None, db_session: Session
-) -> bool:
-    if connector.refresh_freq is None:
-        return False
-    if not last_index:
-        return True
-
-    # only one scheduled job per connector at a time
-    if last_index.status == IndexingStatus.NOT_STARTED:
-        return False
-
-    current_db_time = get_db_current_time(db_session)
-    time_since_index = current_db_time - last_index.time_updated
-    return time_since_index.total_seconds() >= connector.refresh_freq
-
-
 def _is_indexing_job_marked_as_finished(index_attempt: IndexAttempt | None) -> bool:
     if index_attempt is None:
         return False
@@ -112,59 +111,86 @@ def _mark_run_failed(
 """Main funcs"""
 
 
-def create_indexing_jobs(existing_jobs: dict[int, Future | SimpleJob]) -> None:
+def create_indexing_jobs(
+    existing_jobs: dict[int, Future | SimpleJob | PersistentJob]
+) -> None:
     """Creates new indexing jobs for each connector / credential pair which is:
     1. Enabled
     2. `refresh_frequency` time has passed since the last indexing run for this pair
     3. There is not already an ongoing indexing attempt for this pair
     """
     with Session(get_sqlalchemy_engine()) as db_session:
-        ongoing_pairs: set[tuple[int | None, int | None]] = set()
-        for attempt_id in existing_jobs:
-            attempt = get_index_attempt(
-                db_session=db_session, index_attempt_id=attempt_id
+        ongoing_attempts = get_index_attempts(
+            db_session=db_session, index_attempt_ids=list(existing_jobs.keys())
+        )
+        if len(ongoing_attempts) != len(existing_jobs):
+            missing_attempt_ids = set(existing_jobs.keys()) - {
+                attempt.id for attempt in ongoing_attempts
+            }
+            logger.error(
+                f"Unable to find IndexAttempts for IDs '{missing_attempt_ids}' when "
+                "creating indexing jobs"
+            )
+        ongoing_pairs: set[tuple[int, int]] = {
+            (attempt.connector_id, attempt.credential_id)
+            for attempt in ongoing_attempts
+            if attempt.connector_id is not None and attempt.credential_id is not None
+        }
+
+        due_pairs = get_cc_pairs_due_for_indexing(
+            db_session=db_session, exclude_cc_pair_ids=ongoing_pairs
+        )
+        if not due_pairs:
+            return
+
+        # pairs which have never been successfully indexed need a full (and
+        # potentially very long) index run, so are started after regular refreshes
+        for priority, cc_pair_ids in [
+            (
+                IndexingPriority.INCREMENTAL,
+                [
+                    (cc_pair.connector_id, cc_pair.credential_id)
+                    for cc_pair in due_pairs
+                    if cc_pair.last_successful_index_time is not None
+                ],
+            ),
+            (
+                IndexingPriority.FULL_REINDEX,
+                [
+                    (cc_pair.connector_id, cc_pair.credential_id)
+                    for cc_pair in due_pairs
+                    if cc_pair.last_successful_index_time is None
+                ],
+            ),
+        ]:
+            create_index_attempts(
+                cc_pair_ids=cc_pair_ids, db_session=db_session, priority=priority
             )
-            if attempt is None:
-                logger.error(
-                    f"Unable to find IndexAttempt for ID '{attempt_id}' when creating "
-                    "indexing jobs"
-                )
-                continue
-            ongoing_pairs.add((attempt.connector_id, attempt.credential_id))
-
-        enabled_connectors = fetch_connectors(db_session, disabled_status=False)
-        for connector in enabled_connectors:
-            for association in connector.credentials:
-                credential = association.credential
-
-                # check if there is an ongoing indexing attempt for this connector + credential pair
-                if (connector.id, credential.id) in ongoing_pairs:
-                    continue
-
-                last_attempt = get_last_attempt(connector.id, credential.id, db_session)
-                if not _should_create_new_indexing(connector, last_attempt, db_session):
-                    continue
-                create_index_attempt(connector.id, credential.id, db_session)
 
-                update_connector_credential_pair(
-                    db_session=db_session,
-                    connector_id=connector.id,
-                    credential_id=credential.id,
-                    attempt_status=IndexingStatus.NOT_STARTED,
-                )
+        update_connector_credential_pairs_attempt_status(
+            db_session=db_session,
+            cc_pair_ids=[
+                (cc_pair.connector_id, cc_pair.credential_id) for cc_pair in due_pairs
+            ],
+            attempt_status=IndexingStatus.NOT_STARTED,
+        )
 
 
 def cleanup_indexing_jobs(
-    existing_jobs: dict[int, Future | SimpleJob]
-) -> dict[int, Future | SimpleJob]:
+    existing_jobs: dict[int, Future | SimpleJob | PersistentJob]
+) -> dict[int, Future | SimpleJob | PersistentJob]:
     existing_jobs_copy = existing_jobs.copy()
 
     # clean up completed jobs
     with Session(get_sqlalchemy_engine()) as db_session:
-        for attempt_id, job in existing_jobs.items():
-            index_attempt = get_index_attempt(
-                db_session=db_session, index_attempt_id=attempt_id
+        index_attempts_by_id = {
+            index_attempt.id: index_attempt
+            for index_attempt in get_index_attempts(
+                db_session=db_session, index_attempt_ids=list(existing_jobs.keys())
             )
+        }
+        for attempt_id, job in existing_jobs.items():
+            index_attempt = index_attempts_by_id.get(attempt_id)
 
             # do nothing for ongoing jobs that haven't been stopped
             if not job.done() and not _is_indexing_job_marked_as_finished(
@@ -192,46 +218,51 @@ def cleanup_indexing_jobs(
                 _mark_run_failed(
                     db_session=db_session,
                     index_attempt=index_attempt,
-                    failure_reason=_UNEXPECTED_STATE_FAILURE_REASON,
+                    # e.g. a job killed for using too much memory records why
+                    failure_reason=index_attempt.error_msg
+                    if index_attempt.status == IndexingStatus.FAILED
+                    and index_attempt.error_msg
+                    else _UNEXPECTED_STATE_FAILURE_REASON,
                 )
 
-        # clean up in-progress jobs that were never completed
-        connectors = fetch_connectors(db_session)
-        for connector in connectors:
-            in_progress_indexing_attempts = get_inprogress_index_attempts(
-                connector.id, db_session
-            )
-            for index_attempt in in_progress_indexing_attempts:
-                if index_attempt.id in existing_jobs:
-                    # check to see if the job has been updated in last hour, if not
-                    # assume it to frozen in some bad state and just mark it as failed. Note: this relies
-                    # on the fact that the `time_updated` field is constantly updated every
-                    # batch of documents indexed
-                    current_db_time = get_db_current_time(db_session=db_session)
-                    time_since_update = current_db_time - index_attempt.time_updated
-                    if time_since_update.total_seconds() > 60 * 60:
-                        existing_jobs[index_attempt.id].cancel()
-                        _mark_run_failed(
-                            db_session=db_session,
-                            index_attempt=index_attempt,
-                            failure_reason="Indexing run frozen - no updates in an hour. "
-                            "The run will be re-attempted at next scheduled indexing time.",
-                        )
-                else:
-                    # If job isn't known, simply mark it as failed
+        # clean up in-progress jobs that were never completed, fetched for all
+        # connectors at once
+        in_progress_indexing_attempts = get_inprogress_index_attempts(
+            connector_id=None, db_session=db_session
+        )
+        current_db_time = get_db_current_time(db_session=db_session)
+        for index_attempt in in_progress_indexing_attempts:
+            if index_attempt.id in existing_jobs:
+                # check to see if the job has been updated in last hour, if not
+                # assume it to frozen in some bad state and just mark it as failed. Note: this relies
+                # on the fact that the `time_updated` field is constantly updated every
+                # batch of documents indexed
+                time_since_update = current_db_time - index_attempt.time_updated
+                if time_since_update.total_seconds() > 60 * 60:
+                    existing_jobs[index_attempt.id].cancel()
                     _mark_run_failed(
                         db_session=db_session,
                         index_attempt=index_attempt,
-                        failure_reason=_UNEXPECTED_STATE_FAILURE_REASON,
+                        failure_reason="Indexing run frozen - no updates in an hour. "
+                        "The run will be re-attempted at next scheduled indexing time.",
                     )
+            else:
+                # If job isn't known, simply mark it as failed
+                _mark_run_failed(
+                    db_session=db_session,
+                    index_attempt=index_attempt,
+                    failure_reason=_UNEXPECTED_STATE_FAILURE_REASON,
+                )
 
     return existing_jobs_copy
 
 
 def kickoff_indexing_jobs(
-    existing_jobs: dict[int, Future | SimpleJob],
-    client: Client | SimpleJobClient,
-) -> dict[int, Future | SimpleJob]:
+    existing_jobs: dict[int, Future | SimpleJob | PersistentJob],
+    client: Client | SimpleJobClient | PersistentJobClient,
+    embedding_pool: LocalEmbeddingPool | None = None,
+    num_workers: int = NUM_INDEXING_WORKERS,
+) -> dict[int, Future | SimpleJob | PersistentJob]:
     existing_jobs_copy = existing_jobs.copy()
     engine = get_sqlalchemy_engine()
 
@@ -243,12 +274,21 @@ def kickoff_indexing_jobs(
             for attempt in get_not_started_index_attempts(db_session)
             if attempt.id not in existing_jobs
         ]
+        running_jobs = [
+            (attempt.connector.id, attempt.connector.source)
+            for attempt in get_index_attempts(
+                db_session=db_session, index_attempt_ids=list(existing_jobs.keys())
+            )
+            if attempt.connector is not None
+        ]
+        current_db_time = get_db_current_time(db_session=db_session)
 
     logger.info(f"Found {len(new_indexing_attempts)} new indexing tasks.")
 
     if not new_indexing_attempts:
         return existing_jobs
 
+    valid_attempts: dict[int, IndexAttempt] = {}
     for attempt in new_indexing_attempts:
         if attempt.connector is None:
             logger.warning(
@@ -268,13 +308,45 @@ def kickoff_indexing_jobs(
                     attempt, db_session, failure_reason="Credential is null"
                 )
             continue
+        valid_attempts[attempt.id] = attempt
+
+    # only submit as many jobs as there are free workers (Dask would otherwise queue
+    # them up in submission order) so that the next ones are picked by priority
+    attempts_to_start = select_attempts_to_start(
+        queued_attempts=[
+            QueuedAttempt.from_index_attempt_db_model(attempt)
+            for attempt in valid_attempts.values()
+        ],
+        running=running_jobs,
+        num_available_slots=max(num_workers - len(existing_jobs), 0),
+        now=current_db_time,
+    )
+    if len(attempts_to_start) < len(valid_attempts):
+        logger.info(
+            f"Starting {len(attempts_to_start)} of {len(valid_attempts)} waiting "
+            "indexing tasks, the rest are waiting on workers / concurrency limits."
+        )
 
+    for queued_attempt in attempts_to_start:
+        attempt = valid_attempts[queued_attempt.attempt_id]
         run = client.submit(
-            run_indexing_entrypoint, attempt.id, _get_num_threads(), pure=False
+            run_indexing_entrypoint,
+            attempt.id,
+            _get_num_threads(),
+            embedding_pool.get_client(
+                attempt.id,
+                include_task_queue=not isinstance(client, PersistentJobClient),
+            )
+            if embedding_pool
+            else None,
+            pure=False,
         )
+        if not run and embedding_pool:
+            embedding_pool.release_client(attempt.id)
         if run:
             logger.info(
-                f"Kicked off indexing attempt for connector: '{attempt.connector.name}', "
+                f"Kicked off {queued_attempt.priority} indexing attempt for connector: "
+                f"'{attempt.connector.name}', "
                 f"with config: '{attempt.connector.connector_specific_config}', and "
                 f"with credentials: '{attempt.credential_id}'"
             )
@@ -283,8 +355,51 @@ def kickoff_indexing_jobs(
     return existing_jobs_copy
 
 
-def update_loop(delay: int = 10, num_workers: int = NUM_INDEXING_WORKERS) -> None:
-    client: Client | SimpleJobClient
+def _wait_for_next_update(
+    listener: PostgresListener | None, delay: float, sweep_interval: float
+) -> None:
+    """Returns as soon as there is an indexing related notification or once
+    `sweep_interval` seconds have passed. If notifications are not available, just
+    sleeps for `delay` seconds."""
+    if listener is not None:
+        try:
+            events = listener.wait(timeout=sweep_interval)
+            if events:
+                events.extend(listener.wait(timeout=_NOTIFICATION_DEBOUNCE_SECONDS))
+                logger.debug(f"Woken up by indexing events: {set(events)}")
+            return
+        except Exception as e:
+            logger.warning(
+                f"Failed to listen for indexing notifications, falling back to "
+                f"polling: {e}"
+            )
+
+    time.sleep(delay)
+
+
+def update_loop(
+    delay: int = 10,
+    num_workers: int = NUM_INDEXING_WORKERS,
+    num_embedding_workers: int = NUM_LOCAL_EMBEDDING_WORKERS,
+    sweep_interval: int = INDEXING_SCHEDULER_SWEEP_INTERVAL,
+) -> None:
+    embedding_pool: LocalEmbeddingPool | None = None
+    if num_embedding_workers > 0 and not BACKGROUND_JOB_EMBEDDING_MODEL_SERVER_HOST:
+        if DASK_JOB_CLIENT_ENABLED:
+            logger.warning(
+                "Local embedding workers are not supported with the Dask job client, "
+                "embedding will be run inline in each indexing job"
+            )
+        else:
+            embedding_pool = LocalEmbeddingPool(
+                num_workers=num_embedding_workers,
+                num_threads_per_worker=max(
+                    1, _get_num_threads() // num_embedding_workers
+                ),
+            )
+            embedding_pool.start()
+
+    client: Client | SimpleJobClient | PersistentJobClient
     if DASK_JOB_CLIENT_ENABLED:
         cluster = LocalCluster(
             n_workers=num_workers,
@@ -296,12 +411,32 @@ def update_loop(delay: int = 10, num_workers: int = NUM_INDEXING_WORKERS) -> Non
             silence_logs=logging.ERROR,
         )
         client = Client(cluster)
-        if LOG_LEVEL.lower() == "debug":
-            client.register_worker_plugin(ResourceLogger())
+    elif INDEXING_WORKER_POOL_ENABLED:
+        client = PersistentJobClient(
+            n_workers=num_workers,
+            # models only need to be loaded by the workers if they embed themselves
+            warm_up=not BACKGROUND_JOB_EMBEDDING_MODEL_SERVER_HOST
+            and embedding_pool is None,
+            # the embedding pool's task queue can't be sent along with each job
+            initializer=set_inherited_task_queue if embedding_pool else None,
+            initargs=(embedding_pool.task_queue,) if embedding_pool else (),
+        )
     else:
         client = SimpleJobClient(n_workers=num_workers)
 
-    existing_jobs: dict[int, Future | SimpleJob] = {}
+    listener: PostgresListener | None = None
+    if not DISABLE_INDEXING_SCHEDULER_NOTIFICATIONS:
+        listener = PostgresListener(channels=[NotificationChannel.INDEXING])
+        try:
+            listener.connect()
+        except Exception as e:
+            # will be retried before each wait
+            logger.warning(f"Failed to listen for indexing notifications: {e}")
+
+    existing_jobs: dict[int, Future | SimpleJob | PersistentJob] = {}
+    # jobs that were handed a client of the embedding pool, kept until they have
+    # stopped (even if already cleaned up) so that the client can be released
+    embedding_pool_jobs: dict[int, Future | SimpleJob | PersistentJob] = {}
     engine = get_sqlalchemy_engine()
 
     with Session(engine) as db_session:
@@ -322,16 +457,42 @@ def update_loop(delay: int = 10, num_workers: int = NUM_INDEXING_WORKERS) -> Non
             )
 
         try:
+            if embedding_pool:
+                embedding_pool.ensure_workers_alive()
             existing_jobs = cleanup_indexing_jobs(existing_jobs=existing_jobs)
+            if embedding_pool:
+                for attempt_id, job in list(embedding_pool_jobs.items()):
+                    if job.done():
+                        embedding_pool.release_client(attempt_id)
+                        del embedding_pool_jobs[attempt_id]
             create_indexing_jobs(existing_jobs=existing_jobs)
             existing_jobs = kickoff_indexing_jobs(
-                existing_jobs=existing_jobs, client=client
+                existing_jobs=existing_jobs,
+                client=client,
+                embedding_pool=embedding_pool,
+                num_workers=num_workers,
             )
+            if embedding_pool:
+                embedding_pool_jobs.update(
+                    {
+                        attempt_id: job
+                        for attempt_id, job in existing_jobs.items()
+                        if attempt_id not in embedding_pool_jobs
+                    }
+                )
         except Exception as e:
             logger.exception(f"Failed to run update due to {e}")
-        sleep_time = delay - (time.time() - start)
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+
+        if listener is not None:
+            # notifications sent while the pass above was running are still queued
+            # on the connection, so nothing is missed between passes
+            _wait_for_next_update(
+                listener=listener, delay=delay, sweep_interval=sweep_interval
+            )
+        else:
+            sleep_time = delay - (time.time() - start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
 
 
 def update__main() -> None:
@@ -15,7 +15,7 @@ from danswer.db.chat import get_chat_messages_by_session
 from danswer.db.models import ChatMessage
 from danswer.db.models import Prompt
 from danswer.indexing.models import InferenceChunk
-from danswer.llm.utils import check_number_of_tokens
+from danswer.llm.utils import get_chunk_llm_token_count
 from danswer.prompts.chat_prompts import CHAT_USER_CONTEXT_FREE_PROMPT
 from danswer.prompts.chat_prompts import CHAT_USER_PROMPT
 from danswer.prompts.chat_prompts import CITATION_REMINDER
@@ -179,7 +179,7 @@ def _get_usable_chunks(
     total_token_count = 0
     usable_chunks = []
     for chunk in chunks:
-        chunk_token_count = check_number_of_tokens(chunk.content)
+        chunk_token_count = get_chunk_llm_token_count(chunk)
         if total_token_count + chunk_token_count > token_limit:
             break
 
@@ -232,7 +232,7 @@ def get_chunks_for_qa(
 
     Note, the batch_offset calculation has to count the batches from the beginning each time as
     there's no way to know which chunks were included in the prior batches without recounting atm,
-    this is somewhat slow as it requires tokenizing all the chunks again
+    this is cheap as long as the chunks have token counts precomputed at indexing time
     """
     batch_index = 0
     latest_batch_indices: list[int] = []
@@ -246,8 +246,9 @@ def get_chunks_for_qa(
             ):
                 continue
 
-            # We calculate it live in case the user uses a different LLM + tokenizer
-            chunk_token = check_number_of_tokens(chunk.content)
+            # Precomputed at indexing time, only recalculated live in case the user
+            # uses a different LLM + tokenizer
+            chunk_token = get_chunk_llm_token_count(chunk)
             # 50 for an approximate/slight overestimate for # tokens for metadata for the chunk
             token_count += chunk_token + 50
 
@@ -1,3 +1,4 @@
+import json
 import os
 
 from danswer.configs.constants import AuthType
@@ -113,6 +114,13 @@ POSTGRES_DB = os.environ.get("POSTGRES_DB") or "postgres"
 #####
 GOOGLE_DRIVE_INCLUDE_SHARED = False
 GOOGLE_DRIVE_FOLLOW_SHORTCUTS = False
+# polls only fetch the files reported as changed by the Drive changes feed, instead of
+# listing all files modified since the last poll
+GOOGLE_DRIVE_USE_CHANGES_FEED = (
+    os.environ.get("GOOGLE_DRIVE_USE_CHANGES_FEED", "true").lower() == "true"
+)
+# number of files downloaded / exported and parsed in parallel
+GOOGLE_DRIVE_NUM_THREADS = int(os.environ.get("GOOGLE_DRIVE_NUM_THREADS") or 8)
 
 FILE_CONNECTOR_TMP_STORAGE_PATH = os.environ.get(
     "FILE_CONNECTOR_TMP_STORAGE_PATH", "/home/file_connector_storage"
@@ -128,6 +136,22 @@ WEB_CONNECTOR_IGNORED_ELEMENTS = os.environ.get(
 WEB_CONNECTOR_OAUTH_CLIENT_ID = os.environ.get("WEB_CONNECTOR_OAUTH_CLIENT_ID")
 WEB_CONNECTOR_OAUTH_CLIENT_SECRET = os.environ.get("WEB_CONNECTOR_OAUTH_CLIENT_SECRET")
 WEB_CONNECTOR_OAUTH_TOKEN_URL = os.environ.get("WEB_CONNECTOR_OAUTH_TOKEN_URL")
+# Number of pages crawled at the same time (sharing a single headless browser)
+WEB_CONNECTOR_NUM_CONCURRENT_PAGES = int(
+    os.environ.get("WEB_CONNECTOR_NUM_CONCURRENT_PAGES") or 4
+)
+# Pages are first fetched with a plain HTTP request and only rendered in the headless
+# browser if they look like they need JavaScript. Set to "true" to always use the browser
+WEB_CONNECTOR_ALWAYS_RENDER_JAVASCRIPT = (
+    os.environ.get("WEB_CONNECTOR_ALWAYS_RENDER_JAVASCRIPT", "").lower() == "true"
+)
+# Politeness limits, per host
+WEB_CONNECTOR_MAX_CONCURRENT_REQUESTS_PER_HOST = int(
+    os.environ.get("WEB_CONNECTOR_MAX_CONCURRENT_REQUESTS_PER_HOST") or 2
+)
+WEB_CONNECTOR_MIN_REQUEST_INTERVAL_SECONDS = float(
+    os.environ.get("WEB_CONNECTOR_MIN_REQUEST_INTERVAL_SECONDS") or 0
+)
 
 NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP = (
     os.environ.get("NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP", "").lower()
@@ -141,6 +165,25 @@ CONFLUENCE_CONNECTOR_LABELS_TO_SKIP = [
     )
     if ignored_tag
 ]
+CONFLUENCE_CONNECTOR_MAX_REQUESTS_PER_MINUTE = int(
+    os.environ.get("CONFLUENCE_CONNECTOR_MAX_REQUESTS_PER_MINUTE") or 600
+)
+# number of pages whose comments / labels are fetched in parallel
+CONFLUENCE_CONNECTOR_NUM_THREADS = int(
+    os.environ.get("CONFLUENCE_CONNECTOR_NUM_THREADS") or 4
+)
+
+# number of Slack channels read in parallel, and of threads fetched in parallel
+SLACK_CONNECTOR_NUM_CHANNEL_WORKERS = int(
+    os.environ.get("SLACK_CONNECTOR_NUM_CHANNEL_WORKERS") or 4
+)
+SLACK_CONNECTOR_NUM_THREAD_WORKERS = int(
+    os.environ.get("SLACK_CONNECTOR_NUM_THREAD_WORKERS") or 8
+)
+
+# if set, the rate limits for external APIs are shared by all processes on the host
+# (e.g. parallel indexing jobs using the same Slack workspace) via files in this dir
+RATE_LIMIT_STATE_DIR = os.environ.get("RATE_LIMIT_STATE_DIR") or None
 
 GONG_CONNECTOR_START_TIME = os.environ.get("GONG_CONNECTOR_START_TIME")
 
@@ -166,6 +209,81 @@ CONTINUE_ON_CONNECTOR_FAILURE = os.environ.get(
 # fairly large amount of memory in order to increase substantially, since
 # each worker loads the embedding models into memory.
 NUM_INDEXING_WORKERS = int(os.environ.get("NUM_INDEXING_WORKERS") or 1)
+# If enabled, indexing attempts are run by NUM_INDEXING_WORKERS long-lived processes
+# (with the models already loaded) instead of a new process per attempt. A worker is
+# replaced once its memory has grown by more than INDEXING_WORKER_MAX_RSS_GROWTH_MB
+# since startup or after INDEXING_WORKER_MAX_JOBS attempts (0 = no limit).
+# Not supported with DASK_JOB_CLIENT_ENABLED.
+INDEXING_WORKER_POOL_ENABLED = (
+    os.environ.get("INDEXING_WORKER_POOL_ENABLED", "").lower() == "true"
+)
+INDEXING_WORKER_MAX_RSS_GROWTH_MB = int(
+    os.environ.get("INDEXING_WORKER_MAX_RSS_GROWTH_MB") or 2048
+)
+INDEXING_WORKER_MAX_JOBS = int(os.environ.get("INDEXING_WORKER_MAX_JOBS") or 0)
+# If there is no model server, this many local processes each load the embedding model
+# and are shared by all of the indexing workers. Useful for using all of the cores of a
+# large machine for embedding during backfills. 0 means that each indexing job instead
+# runs the embedding model inline. Not supported with DASK_JOB_CLIENT_ENABLED.
+NUM_LOCAL_EMBEDDING_WORKERS = int(os.environ.get("NUM_LOCAL_EMBEDDING_WORKERS") or 0)
+# The indexing scheduler is woken up via Postgres LISTEN / NOTIFY whenever an index
+# attempt is created / finishes or a connector is changed. A full scheduling pass is
+# still run at least this often (in seconds) to pick up connectors which are due for
+# a refresh and jobs which died without updating their index attempt.
+INDEXING_SCHEDULER_SWEEP_INTERVAL = int(
+    os.environ.get("INDEXING_SCHEDULER_SWEEP_INTERVAL") or 60
+)
+# Set to "true" to fall back to polling Postgres every 10 seconds
+DISABLE_INDEXING_SCHEDULER_NOTIFICATIONS = (
+    os.environ.get("DISABLE_INDEXING_SCHEDULER_NOTIFICATIONS", "").lower() == "true"
+)
+# Limits on the number of indexing jobs run at the same time. Per source limits are given
+# as a JSON mapping of source to limit, e.g. '{"google_drive": 1}', 0 / missing = no limit
+INDEXING_MAX_JOBS_PER_SOURCE: dict[str, int] = json.loads(
+    os.environ.get("INDEXING_MAX_JOBS_PER_SOURCE") or "{}"
+)
+INDEXING_MAX_JOBS_PER_CONNECTOR = int(
+    os.environ.get("INDEXING_MAX_JOBS_PER_CONNECTOR") or 1
+)
+# Waiting index attempts are promoted by one priority class (full reindex -> incremental
+# -> manual) for every this many seconds spent in the queue, so nothing is starved
+INDEXING_PRIORITY_AGING_SECONDS = int(
+    os.environ.get("INDEXING_PRIORITY_AGING_SECONDS") or 60 * 60
+)
+# If enabled, the document batches from the connectors are re-grouped by estimated token
+# volume, with the target volume adjusted based on the observed embed / write latency of
+# each batch and the memory usage of the indexing job. The chosen sizes are recorded on
+# the index attempt.
+ADAPTIVE_INDEX_BATCHING_ENABLED = (
+    os.environ.get("ADAPTIVE_INDEX_BATCHING_ENABLED", "").lower() == "true"
+)
+INDEX_BATCH_INITIAL_TOKENS = int(os.environ.get("INDEX_BATCH_INITIAL_TOKENS") or 16_000)
+INDEX_BATCH_MIN_TOKENS = int(os.environ.get("INDEX_BATCH_MIN_TOKENS") or 1_000)
+INDEX_BATCH_MAX_TOKENS = int(os.environ.get("INDEX_BATCH_MAX_TOKENS") or 256_000)
+# Caps the number of documents (and so the number of document locks held) per batch
+INDEX_BATCH_MAX_DOCS = int(os.environ.get("INDEX_BATCH_MAX_DOCS") or 512)
+# Desired time for the indexing pipeline to process a single batch
+INDEX_BATCH_TARGET_SECONDS = float(os.environ.get("INDEX_BATCH_TARGET_SECONDS") or 30)
+# If the indexing job's memory usage goes above this, the batch size is halved. 0 = no limit
+INDEX_BATCH_MAX_RSS_MB = int(os.environ.get("INDEX_BATCH_MAX_RSS_MB") or 0)
+# Memory limits for a single indexing job (including any processes it starts), 0 = no
+# limit. Over the soft limit the job splits its document batches into smaller pieces,
+# over the hard limit the job is aborted and the attempt marked as failed.
+INDEXING_JOB_SOFT_MEMORY_LIMIT_MB = int(
+    os.environ.get("INDEXING_JOB_SOFT_MEMORY_LIMIT_MB") or 0
+)
+INDEXING_JOB_HARD_MEMORY_LIMIT_MB = int(
+    os.environ.get("INDEXING_JOB_HARD_MEMORY_LIMIT_MB") or 0
+)
+INDEXING_RESOURCE_SAMPLE_INTERVAL_SECONDS = float(
+    os.environ.get("INDEXING_RESOURCE_SAMPLE_INTERVAL_SECONDS") or 5
+)
+# Jobs over the hard limit stop at their next batch. If one hasn't stopped after this
+# long (e.g. it is stuck in a single huge document) and is still over the limit, its
+# process is killed
+INDEXING_JOB_HARD_LIMIT_KILL_GRACE_SECONDS = float(
+    os.environ.get("INDEXING_JOB_HARD_LIMIT_KILL_GRACE_SECONDS") or 60
+)
 CHUNK_OVERLAP = 0
 # More accurate results at the expense of indexing speed and index size (stores additional 4 MINI_CHUNK vectors)
 ENABLE_MINI_CHUNK = os.environ.get("ENABLE_MINI_CHUNK", "").lower() == "true"
@@ -211,6 +329,28 @@ DYNAMIC_CONFIG_STORE = os.environ.get(
 )
 DYNAMIC_CONFIG_DIR_PATH = os.environ.get("DYNAMIC_CONFIG_DIR_PATH", "/home/storage")
 JOB_TIMEOUT = 60 * 60 * 6  # 6 hours default
+# Document set changes enqueue their sync right away, this periodic sweep (in seconds)
+# only catches syncs that were missed, e.g. because the broker was unavailable
+DOCUMENT_SET_SYNC_SWEEP_INTERVAL_SECONDS = int(
+    os.environ.get("DOCUMENT_SET_SYNC_SWEEP_INTERVAL_SECONDS") or 300
+)
+# Documents are locked while they are being modified (indexing, document set syncs,
+# connector deletion). Each attempt blocks for at most DOCUMENT_LOCK_TIMEOUT_MS on
+# documents locked by another job, attempts are retried with backoff for up to
+# DOCUMENT_LOCK_MAX_WAIT_SECONDS before giving up.
+DOCUMENT_LOCK_TIMEOUT_MS = int(os.environ.get("DOCUMENT_LOCK_TIMEOUT_MS") or 10_000)
+DOCUMENT_LOCK_MAX_WAIT_SECONDS = float(
+    os.environ.get("DOCUMENT_LOCK_MAX_WAIT_SECONDS") or 300
+)
+# Attempts whose locking query waited longer than this on other transactions are
+# counted as contended in the document lock stats
+DOCUMENT_LOCK_CONTENDED_THRESHOLD_MS = int(
+    os.environ.get("DOCUMENT_LOCK_CONTENDED_THRESHOLD_MS") or 100
+)
+# Number of document batches processed at the same time when deleting a connector
+CONNECTOR_DELETION_NUM_WORKERS = int(
+    os.environ.get("CONNECTOR_DELETION_NUM_WORKERS") or 4
+)
 # used to allow the background indexing jobs to use a different embedding
 # model server than the API server
 CURRENT_PROCESS_IS_AN_INDEXING_JOB = (
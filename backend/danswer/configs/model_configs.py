@@ -28,6 +28,18 @@ ASYM_QUERY_PREFIX = os.environ.get("ASYM_QUERY_PREFIX", "")
 ASYM_PASSAGE_PREFIX = os.environ.get("ASYM_PASSAGE_PREFIX", "")
 # Purely an optimization, memory limitation consideration
 BATCH_SIZE_ENCODE_CHUNKS = 8
+# Texts are grouped into embedding batches by similar token length so that short texts
+# (e.g. mini-chunks) are not padded out to the longest text of the batch. This is the max
+# padded token volume (num texts * longest text) of a batch, set to 0 to instead batch
+# by the fixed count of BATCH_SIZE_ENCODE_CHUNKS in document order
+EMBEDDING_BATCH_TOKEN_BUDGET = int(
+    os.environ.get("EMBEDDING_BATCH_TOKEN_BUDGET")
+    or BATCH_SIZE_ENCODE_CHUNKS * DOC_EMBEDDING_CONTEXT_SIZE
+)
+# Upper bound on the number of texts in a single length bucketed batch
+MAX_BATCH_SIZE_ENCODE_CHUNKS = int(
+    os.environ.get("MAX_BATCH_SIZE_ENCODE_CHUNKS") or 128
+)
 # This controls the minimum number of pytorch "threads" to allocate to the embedding
 # model. If torch finds more threads on its own, this value is not used.
 MIN_THREADS_ML_MODELS = int(os.environ.get("MIN_THREADS_ML_MODELS") or 1)
@@ -101,3 +113,7 @@ GEN_AI_MAX_INPUT_TOKENS = int(os.environ.get("GEN_AI_MAX_INPUT_TOKENS") or 3000)
 # include as much as possible as this just bumps up the cost unnecessarily
 GEN_AI_HISTORY_CUTOFF = int(0.5 * GEN_AI_MAX_INPUT_TOKENS)
 GEN_AI_TEMPERATURE = float(os.environ.get("GEN_AI_TEMPERATURE") or 0)
+# The LLM token count of each chunk is precomputed at indexing time with this tiktoken
+# encoding and stored in the document index. If the tokenizer of the configured LLM is
+# different, the chunks are re-tokenized at query time instead
+INDEXING_LLM_TOKENIZER_ENCODING = "cl100k_base"
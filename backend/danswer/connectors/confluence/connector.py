@@ -1,6 +1,9 @@
+import math
 from collections.abc import Callable
 from collections.abc import Collection
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 from typing import Any
 from typing import cast
@@ -10,11 +13,23 @@ from atlassian import Confluence  # type:ignore
 from requests import HTTPError
 
 from danswer.configs.app_configs import CONFLUENCE_CONNECTOR_LABELS_TO_SKIP
+from danswer.configs.app_configs import CONFLUENCE_CONNECTOR_MAX_REQUESTS_PER_MINUTE
+from danswer.configs.app_configs import CONFLUENCE_CONNECTOR_NUM_THREADS
 from danswer.configs.app_configs import CONTINUE_ON_CONNECTOR_FAILURE
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.cross_connector_utils.html_utils import parse_html_page_basic
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
+    get_rate_limiter,
+)
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
+    TokenBucketRateLimiter,
+)
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import CheckpointPollConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
 from danswer.connectors.interfaces import GenerateDocumentsOutput
+from danswer.connectors.interfaces import GenerateDocumentsWithCheckpointOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
 from danswer.connectors.interfaces import SecondsSinceUnixEpoch
@@ -26,6 +41,7 @@ from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
+
 # Potential Improvements
 # 1. If wiki page instead of space, do a search of all the children of the page instead of index all in the space
 # 2. Include attachments, etc
@@ -89,11 +105,13 @@ def _comment_dfs(
     comments_str: str,
     comment_pages: Collection[dict[str, Any]],
     confluence_client: Confluence,
+    rate_limiter: TokenBucketRateLimiter,
 ) -> str:
     for comment_page in comment_pages:
         comment_html = comment_page["body"]["storage"]["value"]
         comments_str += "\nComment:\n" + parse_html_page_basic(comment_html)
-        child_comment_pages = confluence_client.get_page_child_by_type(
+        child_comment_pages = rate_limiter.call(
+            confluence_client.get_page_child_by_type,
             comment_page["id"],
             type="comment",
             start=None,
@@ -101,12 +119,59 @@ def _comment_dfs(
             expand="body.storage.value",
         )
         comments_str = _comment_dfs(
-            comments_str, child_comment_pages, confluence_client
+            comments_str, child_comment_pages, confluence_client, rate_limiter
         )
     return comments_str
 
 
-class ConfluenceConnector(LoadConnector, PollConnector):
+# how far before the requested start time a CQL time filter can reach due to rounding
+_CQL_TIME_OVERLAP = timedelta(minutes=3)
+
+
+def _build_modified_pages_cql(
+    space: str, start_time: datetime | None, end_time: datetime | None
+) -> str:
+    """CQL for the pages in the space last modified between the two times (if given),
+    oldest first.
+
+    Absolute dates in CQL are interpreted in the timezone of the Confluence user, so the
+    window is expressed relative to now (in whole minutes, rounded outwards)."""
+    now = datetime.now(tz=timezone.utc)
+    escaped_space = space.replace("\\", "\\\\").replace('"', '\\"')
+    cql = f'type = page and space = "{escaped_space}"'
+    if start_time is not None:
+        start_offset_minutes = math.ceil((now - start_time).total_seconds() / 60) + 1
+        cql += f' and lastmodified >= now("-{start_offset_minutes}m")'
+    if end_time is not None:
+        end_offset_minutes = math.floor((now - end_time).total_seconds() / 60) - 1
+        if end_offset_minutes > 0:
+            cql += f' and lastmodified <= now("-{end_offset_minutes}m")'
+    return cql + " order by lastmodified asc"
+
+
+def _parse_checkpoint(checkpoint: ConnectorCheckpoint | None) -> datetime | None:
+    if checkpoint is None:
+        return None
+    try:
+        return datetime.fromisoformat(checkpoint)
+    except ValueError:
+        # e.g. a page offset, which older versions used
+        logger.warning(f"Ignoring invalid Confluence checkpoint: {checkpoint}")
+        return None
+
+
+def _get_page_last_modified(page: dict[str, Any]) -> datetime:
+    last_modified = datetime.fromisoformat(page["version"]["when"])
+    if last_modified.tzinfo is None:
+        # If no timezone info, assume it is UTC
+        return last_modified.replace(tzinfo=timezone.utc)
+    # If not in UTC, translate it
+    return last_modified.astimezone(timezone.utc)
+
+
+class ConfluenceConnector(
+    LoadConnector, PollConnector, CheckpointConnector, CheckpointPollConnector
+):
     def __init__(
         self,
         wiki_page_url: str,
@@ -116,13 +181,21 @@ class ConfluenceConnector(LoadConnector, PollConnector):
         # skip it. This is generally used to avoid indexing extra sensitive
         # pages.
         labels_to_skip: list[str] = CONFLUENCE_CONNECTOR_LABELS_TO_SKIP,
+        num_threads: int = CONFLUENCE_CONNECTOR_NUM_THREADS,
     ) -> None:
         self.batch_size = batch_size
         self.continue_on_failure = continue_on_failure
         self.labels_to_skip = set(labels_to_skip)
+        self.num_threads = num_threads
         self.wiki_base, self.space, self.is_cloud = extract_confluence_keys_from_url(
             wiki_page_url
         )
+        # shared by all threads / connectors calling the same Confluence instance
+        self.rate_limiter = get_rate_limiter(
+            f"confluence:{self.wiki_base}",
+            max_calls=CONFLUENCE_CONNECTOR_MAX_REQUESTS_PER_MINUTE,
+            period=60,
+        )
         self.confluence_client: Confluence | None = None
 
     def load_credentials(self, credentials: dict[str, Any]) -> dict[str, Any] | None:
@@ -138,18 +211,40 @@ class ConfluenceConnector(LoadConnector, PollConnector):
         )
         return None
 
+    def _page_expansions(self, body_expansion: str) -> str:
+        # labels are only needed to skip pages, getting them along with the page
+        # saves a request per page
+        if self.labels_to_skip:
+            return f"{body_expansion},version,metadata.labels"
+        return f"{body_expansion},version"
+
     def _fetch_pages(
         self,
         confluence_client: Confluence,
         start_ind: int,
+        cql: str,
+        limit: int | None = None,
     ) -> Collection[dict[str, Any]]:
+        """Fetches up to `limit` (the batch size by default) of the pages matching
+        `cql`, in the order specified by the query"""
+        batch_size = limit or self.batch_size
+
+        def _get_pages(
+            start: int, limit: int, expand: str
+        ) -> Collection[dict[str, Any]]:
+            response = self.rate_limiter.call(
+                confluence_client.get,
+                "rest/api/content/search",
+                params={"cql": cql, "start": start, "limit": limit, "expand": expand},
+            )
+            return response.get("results", [])
+
         def _fetch(start_ind: int, batch_size: int) -> Collection[dict[str, Any]]:
             try:
-                return confluence_client.get_all_pages_from_space(
-                    self.space,
+                return _get_pages(
                     start=start_ind,
                     limit=batch_size,
-                    expand="body.storage.value,version",
+                    expand=self._page_expansions("body.storage.value"),
                 )
             except Exception:
                 logger.warning(
@@ -158,16 +253,15 @@ class ConfluenceConnector(LoadConnector, PollConnector):
                 )
 
                 view_pages: list[dict[str, Any]] = []
-                for i in range(self.batch_size):
+                for i in range(batch_size):
                     try:
                         # Could be that one of the pages here failed due to this bug:
                         # https://jira.atlassian.com/browse/CONFCLOUD-76433
                         view_pages.extend(
-                            confluence_client.get_all_pages_from_space(
-                                self.space,
+                            _get_pages(
                                 start=start_ind + i,
                                 limit=1,
-                                expand="body.storage.value,version",
+                                expand=self._page_expansions("body.storage.value"),
                             )
                         )
                     except HTTPError as e:
@@ -177,25 +271,24 @@ class ConfluenceConnector(LoadConnector, PollConnector):
                         )
                         # Use view instead, which captures most info but is less complete
                         view_pages.extend(
-                            confluence_client.get_all_pages_from_space(
-                                self.space,
+                            _get_pages(
                                 start=start_ind + i,
                                 limit=1,
-                                expand="body.view.value,version",
+                                expand=self._page_expansions("body.view.value"),
                             )
                         )
 
                 return view_pages
 
         try:
-            return _fetch(start_ind, self.batch_size)
+            return _fetch(start_ind, batch_size)
         except Exception as e:
             if not self.continue_on_failure:
                 raise e
 
         # error checking phase, only reachable if `self.continue_on_failure=True`
         pages: list[dict[str, Any]] = []
-        for i in range(self.batch_size):
+        for i in range(batch_size):
             try:
                 pages.extend(_fetch(start_ind + i, 1))
             except Exception:
@@ -209,7 +302,8 @@ class ConfluenceConnector(LoadConnector, PollConnector):
         try:
             comment_pages = cast(
                 Collection[dict[str, Any]],
-                confluence_client.get_page_child_by_type(
+                self.rate_limiter.call(
+                    confluence_client.get_page_child_by_type,
                     page_id,
                     type="comment",
                     start=None,
@@ -217,7 +311,7 @@ class ConfluenceConnector(LoadConnector, PollConnector):
                     expand="body.storage.value",
                 ),
             )
-            return _comment_dfs("", comment_pages, confluence_client)
+            return _comment_dfs("", comment_pages, confluence_client, self.rate_limiter)
         except Exception as e:
             if not self.continue_on_failure:
                 raise e
@@ -229,7 +323,9 @@ class ConfluenceConnector(LoadConnector, PollConnector):
 
     def _fetch_labels(self, confluence_client: Confluence, page_id: str) -> list[str]:
         try:
-            labels_response = confluence_client.get_page_labels(page_id)
+            labels_response = self.rate_limiter.call(
+                confluence_client.get_page_labels, page_id
+            )
             return [label["name"] for label in labels_response["results"]]
         except Exception as e:
             if not self.continue_on_failure:
@@ -238,107 +334,193 @@ class ConfluenceConnector(LoadConnector, PollConnector):
             logger.exception("Ran into exception when fetching labels from Confluence")
             return []
 
-    def _get_doc_batch(
-        self, start_ind: int, time_filter: Callable[[datetime], bool] | None = None
-    ) -> tuple[list[Document], int]:
-        doc_batch: list[Document] = []
+    def _get_page_labels(
+        self, confluence_client: Confluence, page: dict[str, Any]
+    ) -> list[str]:
+        labels = page.get("metadata", {}).get("labels")
+        # the expansion only includes the first page of labels
+        if labels is not None and "next" not in labels.get("_links", {}):
+            return [label["name"] for label in labels["results"]]
+        return self._fetch_labels(confluence_client, page["id"])
+
+    def _page_to_document(
+        self,
+        confluence_client: Confluence,
+        page: dict[str, Any],
+        last_modified: datetime,
+    ) -> Document | None:
+        page_id = page["id"]
+
+        # check disallowed labels
+        if self.labels_to_skip:
+            page_labels = self._get_page_labels(confluence_client, page)
+            label_intersection = self.labels_to_skip.intersection(page_labels)
+            if label_intersection:
+                logger.info(
+                    f"Page with ID '{page_id}' has a label which has been "
+                    f"designated as disallowed: {label_intersection}. Skipping."
+                )
+                return None
 
+        page_html = (
+            page["body"].get("storage", page["body"].get("view", {})).get("value")
+        )
+        page_url = self.wiki_base + page["_links"]["webui"]
+        if not page_html:
+            logger.debug("Page is empty, skipping: %s", page_url)
+            return None
+        page_text = page.get("title", "") + "\n" + parse_html_page_basic(page_html)
+        comments_text = self._fetch_comments(confluence_client, page_id)
+        page_text += comments_text
+
+        author = cast(str | None, page["version"].get("by", {}).get("email"))
+        return Document(
+            id=page_url,
+            sections=[Section(link=page_url, text=page_text)],
+            source=DocumentSource.CONFLUENCE,
+            semantic_identifier=page["title"],
+            doc_updated_at=last_modified,
+            primary_owners=[BasicExpertInfo(email=author)] if author else None,
+            metadata={
+                "Wiki Space Name": self.space,
+            },
+        )
+
+    def _get_doc_batch(
+        self,
+        start_ind: int,
+        cql: str,
+        page_filter: Callable[[str, datetime], bool] | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[Document], list[tuple[str, datetime]]]:
+        """Returns the documents and the ID / last modified time of every page that was
+        fetched (including the ones filtered out), in order. `page_filter` is given the
+        ID and last modified time of each page"""
         if self.confluence_client is None:
             raise ConnectorMissingCredentialError("Confluence")
+        confluence_client = self.confluence_client
 
-        batch = self._fetch_pages(self.confluence_client, start_ind)
+        batch = self._fetch_pages(confluence_client, start_ind, cql=cql, limit=limit)
+        fetched_pages: list[tuple[str, datetime]] = []
+        pages_to_index: list[tuple[dict[str, Any], datetime]] = []
         for page in batch:
-            last_modified_str = page["version"]["when"]
-            author = cast(str | None, page["version"].get("by", {}).get("email"))
-            last_modified = datetime.fromisoformat(last_modified_str)
-
-            if last_modified.tzinfo is None:
-                # If no timezone info, assume it is UTC
-                last_modified = last_modified.replace(tzinfo=timezone.utc)
-            else:
-                # If not in UTC, translate it
-                last_modified = last_modified.astimezone(timezone.utc)
-
-            if time_filter is None or time_filter(last_modified):
-                page_id = page["id"]
-
-                # check disallowed labels
-                if self.labels_to_skip:
-                    page_labels = self._fetch_labels(self.confluence_client, page_id)
-                    label_intersection = self.labels_to_skip.intersection(page_labels)
-                    if label_intersection:
-                        logger.info(
-                            f"Page with ID '{page_id}' has a label which has been "
-                            f"designated as disallowed: {label_intersection}. Skipping."
-                        )
-                        continue
+            last_modified = _get_page_last_modified(page)
+            fetched_pages.append((page["id"], last_modified))
+            if page_filter is None or page_filter(page["id"], last_modified):
+                pages_to_index.append((page, last_modified))
+
+        # the comments (and labels, if not part of the page) need separate requests
+        # for every page, these are made in parallel. Results stay in page order
+        with ThreadPoolExecutor(max_workers=max(self.num_threads, 1)) as executor:
+            docs = executor.map(
+                lambda page_info: self._page_to_document(confluence_client, *page_info),
+                pages_to_index,
+            )
+            doc_batch = [doc for doc in docs if doc is not None]
 
-                page_html = (
-                    page["body"]
-                    .get("storage", page["body"].get("view", {}))
-                    .get("value")
-                )
-                page_url = self.wiki_base + page["_links"]["webui"]
-                if not page_html:
-                    logger.debug("Page is empty, skipping: %s", page_url)
-                    continue
-                page_text = (
-                    page.get("title", "") + "\n" + parse_html_page_basic(page_html)
-                )
-                comments_text = self._fetch_comments(self.confluence_client, page_id)
-                page_text += comments_text
-
-                doc_batch.append(
-                    Document(
-                        id=page_url,
-                        sections=[Section(link=page_url, text=page_text)],
-                        source=DocumentSource.CONFLUENCE,
-                        semantic_identifier=page["title"],
-                        doc_updated_at=last_modified,
-                        primary_owners=[BasicExpertInfo(email=author)]
-                        if author
-                        else None,
-                        metadata={
-                            "Wiki Space Name": self.space,
-                        },
-                    )
-                )
-        return doc_batch, len(batch)
+        return doc_batch, fetched_pages
 
-    def load_from_state(self) -> GenerateDocumentsOutput:
+    def _fetch_docs_by_last_modified(
+        self, start_time: datetime | None, end_time: datetime | None
+    ) -> GenerateDocumentsWithCheckpointOutput:
+        """Documents for the pages of the space modified in between the two times (if
+        given), oldest first. The checkpoint yielded with each batch is the last
+        modified time up to which all pages have been yielded."""
         if self.confluence_client is None:
             raise ConnectorMissingCredentialError("Confluence")
 
+        def _in_time_range(t: datetime) -> bool:
+            return (start_time is None or start_time <= t) and (
+                end_time is None or t <= end_time
+            )
+
+        # the CQL filter is at minute granularity so pages are still filtered
+        # precisely afterwards.
+        # Pages are fetched by offset, but rows can shift while paging: a page edited
+        # in the meantime moves to the end of the results and the start of the window
+        # (relative to now) moves along with time, so a page could be skipped. The last
+        # page of each batch is fetched again with the next one to detect this, in
+        # which case the query is started again from the last page seen. Pages already
+        # seen in the overlap (the CQL filter is rounded) are skipped.
+        cursor = start_time
+        cql = _build_modified_pages_cql(self.space, cursor, end_time)
         start_ind = 0
+        last_page: tuple[str, datetime] | None = None
+        seen_pages: dict[str, datetime] = {}
         while True:
-            doc_batch, num_pages = self._get_doc_batch(start_ind)
-            start_ind += num_pages
-            if doc_batch:
-                yield doc_batch
-
-            if num_pages < self.batch_size:
+            overlap = 0 if last_page is None else 1
+            doc_batch, fetched_pages = self._get_doc_batch(
+                start_ind - overlap,
+                page_filter=lambda page_id, t: _in_time_range(t)
+                and seen_pages.get(page_id) != t,
+                cql=cql,
+                limit=self.batch_size + overlap,
+            )
+            seen_pages.update(fetched_pages)
+            shifted = last_page is not None and fetched_pages[:1] != [last_page]
+            # pages before a shift may not have been fetched yet
+            if not shifted and fetched_pages:
+                cursor = fetched_pages[-1][1]
+            if doc_batch and cursor is not None:
+                yield doc_batch, cursor.isoformat()
+
+            if shifted:
+                logger.info(
+                    f"Confluence results shifted while paging space {self.space}, "
+                    f"continuing from the last page seen"
+                )
+                cql = _build_modified_pages_cql(self.space, cursor, end_time)
+                start_ind = 0
+                last_page = None
+                # only pages this close to the cursor can be returned again
+                if cursor is not None:
+                    min_time = cursor - _CQL_TIME_OVERLAP
+                    seen_pages = {
+                        page_id: t for page_id, t in seen_pages.items() if t >= min_time
+                    }
+                continue
+
+            if len(fetched_pages) < self.batch_size + overlap:
                 break
+            last_page = fetched_pages[-1]
+            start_ind += len(fetched_pages) - overlap
+
+    def load_from_checkpoint(
+        self, checkpoint: ConnectorCheckpoint | None
+    ) -> GenerateDocumentsWithCheckpointOutput:
+        """The checkpoint is the last modified time of the pages loaded so far, pages
+        modified at or after it are loaded"""
+        yield from self._fetch_docs_by_last_modified(
+            start_time=_parse_checkpoint(checkpoint), end_time=None
+        )
 
-    def poll_source(
-        self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
-    ) -> GenerateDocumentsOutput:
-        if self.confluence_client is None:
-            raise ConnectorMissingCredentialError("Confluence")
+    def load_from_state(self) -> GenerateDocumentsOutput:
+        for doc_batch, _ in self.load_from_checkpoint(checkpoint=None):
+            yield doc_batch
 
+    def poll_source_from_checkpoint(
+        self,
+        start: SecondsSinceUnixEpoch,
+        end: SecondsSinceUnixEpoch,
+        checkpoint: ConnectorCheckpoint | None,
+    ) -> GenerateDocumentsWithCheckpointOutput:
+        """Same checkpoint as `load_from_checkpoint`"""
         start_time = datetime.fromtimestamp(start, tz=timezone.utc)
-        end_time = datetime.fromtimestamp(end, tz=timezone.utc)
-
-        start_ind = 0
-        while True:
-            doc_batch, num_pages = self._get_doc_batch(
-                start_ind, time_filter=lambda t: start_time <= t <= end_time
-            )
-            start_ind += num_pages
-            if doc_batch:
-                yield doc_batch
+        checkpoint_time = _parse_checkpoint(checkpoint)
+        if checkpoint_time is not None:
+            start_time = max(start_time, checkpoint_time)
+        yield from self._fetch_docs_by_last_modified(
+            start_time=start_time,
+            end_time=datetime.fromtimestamp(end, tz=timezone.utc),
+        )
 
-            if num_pages < self.batch_size:
-                break
+    def poll_source(
+        self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
+    ) -> GenerateDocumentsOutput:
+        for doc_batch, _ in self.poll_source_from_checkpoint(
+            start, end, checkpoint=None
+        ):
+            yield doc_batch
 
 
 if __name__ == "__main__":
@@ -16,6 +16,9 @@ from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
+_JSON_READ_CHUNK_SIZE = 64 * 1024
+_NON_WHITESPACE_PATTERN = re.compile(r"\S")
+
 
 def extract_metadata(line: str) -> dict | None:
     html_comment_pattern = r"<!--\s*DANSWER_METADATA=\{(.*?)\}\s*-->"
@@ -68,6 +71,70 @@ def read_pdf_file(file: IO[Any], file_name: str, pdf_pass: str | None = None) ->
     return ""
 
 
+def iter_json_array(
+    file: IO[str], chunk_size: int = _JSON_READ_CHUNK_SIZE
+) -> Generator[Any, None, None]:
+    """Yields the elements of the JSON array making up the file one by one, without
+    loading the whole file. Only the current element (and a chunk of the file) is held
+    in memory at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def _read_more(min_size: int) -> None:
+        nonlocal buffer, pos, eof
+        chunk = file.read(min_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def _skip_whitespace() -> str:
+        """Returns the next non whitespace character, empty at the end of the file"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ""
+            _read_more(chunk_size)
+
+    if _skip_whitespace() != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if _skip_whitespace() == "]":
+        return
+
+    while True:
+        _skip_whitespace()
+        # the element may continue past the end of the buffer, read more (doubling
+        # the amount each time so that large elements are not re-parsed too often)
+        # until it can be decoded. The element is only complete once followed by a
+        # separator, otherwise it may have been cut off (e.g. "1" of "1.5")
+        read_size = chunk_size
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                following = _NON_WHITESPACE_PATTERN.search(buffer, end)
+                if eof or (following and following.group() in ",]"):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            _read_more(read_size)
+            read_size = max(read_size, len(buffer))
+        pos = end
+        yield element
+
+        separator = _skip_whitespace()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got '{separator}'")
+
+
 def is_macos_resource_fork_file(file_name: str) -> bool:
     return os.path.basename(file_name).startswith("._") and file_name.startswith(
         "__MACOSX"
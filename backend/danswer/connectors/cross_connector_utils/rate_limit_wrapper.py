@@ -1,86 +1,290 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
 import time
 from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
 from functools import wraps
 from typing import Any
 from typing import cast
 from typing import TypeVar
 
+from danswer.configs.app_configs import RATE_LIMIT_STATE_DIR
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
 
 F = TypeVar("F", bound=Callable[..., Any])
+T = TypeVar("T")
+
+# used if a rate limited response doesn't say how long to wait
+_DEFAULT_RETRY_AFTER_SECONDS = 10
+_DEFAULT_MAX_RATE_LIMITED_RETRIES = 5
 
 
 class RateLimitTriedTooManyTimesError(Exception):
     pass
 
 
-class _RateLimitDecorator:
-    """Builds a generic wrapper/decorator for calls to external APIs that
-    prevents making more than `max_calls` requests per `period`
+@dataclass
+class RateLimiterStats:
+    """Stats about a rate limiter (for this process)"""
+
+    num_calls: int = 0
+    # calls which had to wait for the rate limit
+    num_waits: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    # responses from the API saying that we are being rate limited
+    num_rate_limited_responses: int = 0
+
+
+@dataclass
+class _BucketState:
+    # times at which the last `max_calls` calls were (or are scheduled to be) made,
+    # in ascending order. A call's token is only available again `period` after it
+    call_times: list[float] = field(default_factory=list)
+    # set from `Retry-After`, no calls are made before this
+    blocked_until: float = 0.0
+
 
-    Implementation inspired by the `ratelimit` library:
-    https://github.com/tomasbasham/ratelimit.
+class _InProcessBucketStore:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state = _BucketState()
+
+    @contextmanager
+    def locked_state(self) -> Iterator[_BucketState]:
+        with self._lock:
+            yield self._state
+
+
+class _FileBucketStore:
+    """Keeps the bucket in a file so that it is shared by all processes on the host
+    (e.g. parallel indexing jobs for the same workspace)"""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        # `flock` only excludes other processes, not other threads of this one
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked_state(self) -> Iterator[_BucketState]:
+        with self._lock, open(self._path, "a+") as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                contents = state_file.read()
+                state = (
+                    _BucketState(**json.loads(contents)) if contents else _BucketState()
+                )
 
-    NOTE: is not thread safe.
-    """
+                yield state
+
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(
+                    json.dumps(
+                        {
+                            "call_times": state.call_times,
+                            "blocked_until": state.blocked_until,
+                        }
+                    )
+                )
+                state_file.flush()
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+
+def _get_retry_after_seconds(error: Exception) -> float | None:
+    """How long the API asked us to wait, None if the error isn't due to rate limiting.
+    Works for the errors of `requests`, `httpx` and `slack_sdk`, which all carry the
+    response."""
+    response = getattr(error, "response", None)
+    if response is None or getattr(response, "status_code", None) != 429:
+        return None
+
+    retry_after = (getattr(response, "headers", None) or {}).get("Retry-After")
+    if retry_after is None:
+        return _DEFAULT_RETRY_AFTER_SECONDS
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        # an HTTP date
+        return _DEFAULT_RETRY_AFTER_SECONDS
+
+
+class TokenBucketRateLimiter:
+    """Prevents making more than `max_calls` requests per `period` (in seconds).
+
+    The bucket holds `max_calls` tokens, each call takes one and the token is returned
+    `period` after the call. Callers reserve their token (which may only be available
+    in the future) while holding the lock and then sleep outside of it, so the limiter
+    is thread safe and waiting callers are served in order.
+
+    If `state_path` is given, the bucket is kept in that file and shared with all other
+    processes using it."""
 
     def __init__(
         self,
         max_calls: int,
-        period: float,  # in seconds
-        sleep_time: float = 2,  # in seconds
-        sleep_backoff: float = 2,  # applies exponential backoff
-        max_num_sleep: int = 0,
-    ):
+        period: float,
+        state_path: str | None = None,
+        max_rate_limited_retries: int = _DEFAULT_MAX_RATE_LIMITED_RETRIES,
+        max_wait_seconds: float | None = None,
+    ) -> None:
         self.max_calls = max_calls
         self.period = period
-        self.sleep_time = sleep_time
-        self.sleep_backoff = sleep_backoff
-        self.max_num_sleep = max_num_sleep
+        self.max_rate_limited_retries = max_rate_limited_retries
+        self.max_wait_seconds = max_wait_seconds
+        self._store: _InProcessBucketStore | _FileBucketStore = (
+            _FileBucketStore(state_path) if state_path else _InProcessBucketStore()
+        )
 
-        self.call_history: list[float] = []
-        self.curr_calls = 0
+        self._stats = RateLimiterStats()
+        self._stats_lock = threading.Lock()
 
-    def __call__(self, func: F) -> F:
-        @wraps(func)
-        def wrapped_func(*args: list, **kwargs: dict[str, Any]) -> Any:
-            # cleanup calls which are no longer relevant
-            self._cleanup()
-
-            # check if we've exceeded the rate limit
-            sleep_cnt = 0
-            while len(self.call_history) == self.max_calls:
-                sleep_time = self.sleep_time * (self.sleep_backoff**sleep_cnt)
-                logger.info(
-                    f"Rate limit exceeded for function {func.__name__}. "
-                    f"Waiting {sleep_time} seconds before retrying."
+    def _reserve(self) -> float:
+        """Returns the time at which the caller may make its call"""
+        with self._store.locked_state() as state:
+            now = time.time()
+            call_time = max(now, state.blocked_until)
+            if len(state.call_times) >= self.max_calls:
+                call_time = max(
+                    call_time, state.call_times[-self.max_calls] + self.period
+                )
+            if self.max_wait_seconds is not None and (
+                call_time - now > self.max_wait_seconds
+            ):
+                raise RateLimitTriedTooManyTimesError(
+                    f"Would have to wait {call_time - now:.1f} seconds for the rate "
+                    f"limit, more than the maximum of {self.max_wait_seconds} seconds"
+                )
+
+            state.call_times.append(call_time)
+            del state.call_times[: -self.max_calls]
+            return call_time
+
+    def _get_blocked_seconds(self) -> float:
+        with self._store.locked_state() as state:
+            return state.blocked_until - time.time()
+
+    def acquire(self) -> float:
+        """Blocks until a call can be made, returns the number of seconds waited"""
+        wait_seconds = 0.0
+        while True:
+            reservation_wait_seconds = max(self._reserve() - time.time(), 0)
+            if reservation_wait_seconds <= 0:
+                break
+            logger.debug(
+                f"Waiting {reservation_wait_seconds:.2f} seconds for the rate limit"
+            )
+            time.sleep(reservation_wait_seconds)
+            wait_seconds += reservation_wait_seconds
+            # the token was reserved before we slept, if someone was told to back off
+            # in the meantime the call has to wait until then as well
+            if self._get_blocked_seconds() <= 0:
+                break
+
+        with self._stats_lock:
+            self._stats.num_calls += 1
+            if wait_seconds > 0:
+                self._stats.num_waits += 1
+                self._stats.total_wait_seconds += wait_seconds
+                self._stats.max_wait_seconds = max(
+                    self._stats.max_wait_seconds, wait_seconds
                 )
-                time.sleep(sleep_time)
-                sleep_cnt += 1
-                if self.max_num_sleep != 0 and sleep_cnt >= self.max_num_sleep:
+        return wait_seconds
+
+    def back_off(self, seconds: float) -> None:
+        """Pauses all calls (from every thread / process sharing the limiter) for the
+        given time, e.g. as instructed by a `Retry-After` header"""
+        with self._store.locked_state() as state:
+            state.blocked_until = max(state.blocked_until, time.time() + seconds)
+        with self._stats_lock:
+            self._stats.num_rate_limited_responses += 1
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Makes the call once the rate limit allows it. If the API responds that we
+        are being rate limited, backs off for as long as it says and tries again."""
+        for attempt in range(self.max_rate_limited_retries + 1):
+            self.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                retry_after = _get_retry_after_seconds(e)
+                if retry_after is None:
+                    raise
+                if attempt == self.max_rate_limited_retries:
                     raise RateLimitTriedTooManyTimesError(
-                        f"Exceeded '{self.max_num_sleep}' retries for function '{func.__name__}'"
-                    )
+                        f"Exceeded '{self.max_rate_limited_retries}' retries for "
+                        f"function '{getattr(func, '__name__', func)}'"
+                    ) from e
 
-                self._cleanup()
+                logger.info(
+                    f"Rate limited calling '{getattr(func, '__name__', func)}', "
+                    f"retrying after {retry_after} seconds"
+                )
+                self.back_off(retry_after)
+
+        raise RuntimeError("Unreachable")
 
-            # add the current call to the call history
-            self.call_history.append(time.monotonic())
-            return func(*args, **kwargs)
+    def __call__(self, func: F) -> F:
+        @wraps(func)
+        def wrapped_func(*args: Any, **kwargs: Any) -> Any:
+            return self.call(func, *args, **kwargs)
 
         return cast(F, wrapped_func)
 
-    def _cleanup(self) -> None:
-        curr_time = time.monotonic()
-        time_to_expire_before = curr_time - self.period
-        self.call_history = [
-            call_time
-            for call_time in self.call_history
-            if call_time > time_to_expire_before
-        ]
+    def get_stats(self) -> RateLimiterStats:
+        with self._stats_lock:
+            return replace(self._stats)
+
+
+_rate_limiters: dict[str, TokenBucketRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
 
 
-rate_limit_builder = _RateLimitDecorator
+def get_rate_limiter(
+    name: str, max_calls: int, period: float
+) -> TokenBucketRateLimiter:
+    """Limiter shared by everything in the process using the same `name` (e.g. all
+    threads calling the same API with the same credentials). If `RATE_LIMIT_STATE_DIR`
+    is set, it is also shared with the other processes on the host."""
+    with _rate_limiters_lock:
+        if name not in _rate_limiters:
+            state_path = None
+            if RATE_LIMIT_STATE_DIR:
+                os.makedirs(RATE_LIMIT_STATE_DIR, exist_ok=True)
+                name_hash = hashlib.sha256(
+                    f"{name}:{max_calls}:{period}".encode()
+                ).hexdigest()
+                state_path = os.path.join(RATE_LIMIT_STATE_DIR, f"{name_hash}.json")
+            _rate_limiters[name] = TokenBucketRateLimiter(
+                max_calls=max_calls, period=period, state_path=state_path
+            )
+        return _rate_limiters[name]
+
+
+def get_rate_limiter_stats() -> dict[str, RateLimiterStats]:
+    with _rate_limiters_lock:
+        return {name: limiter.get_stats() for name, limiter in _rate_limiters.items()}
+
+
+def rate_limit_builder(
+    max_calls: int,
+    period: float,  # in seconds
+    name: str | None = None,  # shares the limit with everything using the same name
+) -> Callable[[F], F]:
+    """Builds a generic wrapper/decorator for calls to external APIs that
+    prevents making more than `max_calls` requests per `period`"""
+    if name is not None:
+        return get_rate_limiter(name, max_calls, period)
+    return TokenBucketRateLimiter(max_calls=max_calls, period=period)
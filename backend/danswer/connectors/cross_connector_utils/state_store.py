@@ -0,0 +1,38 @@
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from danswer.db.connector_state import delete_connector_state_values
+from danswer.db.connector_state import get_connector_state_values
+from danswer.db.connector_state import upsert_connector_state_values
+from danswer.db.engine import get_sqlalchemy_engine
+
+
+class ConnectorStateStore:
+    """Values a `StatefulConnector` keeps between runs of its connector / credential
+    pair, removed along with the pair. Every value is its own row, so the state should
+    be split up into many small values rather than kept in a few large ones."""
+
+    def __init__(self, connector_id: int, credential_id: int) -> None:
+        self.connector_id = connector_id
+        self.credential_id = credential_id
+
+    def load(self, keys: Sequence[str]) -> dict[str, Any]:
+        """Keys without a stored value are left out"""
+        with Session(get_sqlalchemy_engine()) as db_session:
+            return get_connector_state_values(
+                db_session, self.connector_id, self.credential_id, keys
+            )
+
+    def store(self, values: dict[str, Any]) -> None:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            upsert_connector_state_values(
+                db_session, self.connector_id, self.credential_id, values
+            )
+
+    def delete(self, keys: Sequence[str]) -> None:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            delete_connector_state_values(
+                db_session, self.connector_id, self.credential_id, keys
+            )
@@ -1,7 +1,8 @@
 import io
-import tempfile
+import threading
 from collections.abc import Iterator
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timezone
 from enum import Enum
@@ -17,11 +18,14 @@ from googleapiclient.errors import HttpError  # type: ignore
 from danswer.configs.app_configs import CONTINUE_ON_CONNECTOR_FAILURE
 from danswer.configs.app_configs import GOOGLE_DRIVE_FOLLOW_SHORTCUTS
 from danswer.configs.app_configs import GOOGLE_DRIVE_INCLUDE_SHARED
+from danswer.configs.app_configs import GOOGLE_DRIVE_NUM_THREADS
+from danswer.configs.app_configs import GOOGLE_DRIVE_USE_CHANGES_FEED
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
 from danswer.configs.constants import DocumentSource
 from danswer.configs.constants import IGNORE_FOR_QA
 from danswer.connectors.cross_connector_utils.file_utils import read_pdf_file
 from danswer.connectors.cross_connector_utils.retry_wrapper import retry_builder
+from danswer.connectors.cross_connector_utils.state_store import ConnectorStateStore
 from danswer.connectors.google_drive.connector_auth import (
     get_google_drive_creds_for_authorized_user,
 )
@@ -35,10 +39,12 @@ from danswer.connectors.google_drive.constants import (
     DB_CREDENTIALS_DICT_SERVICE_ACCOUNT_KEY,
 )
 from danswer.connectors.google_drive.constants import DB_CREDENTIALS_DICT_TOKEN_KEY
+from danswer.connectors.interfaces import DeletionTrackingConnector
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
 from danswer.connectors.interfaces import SecondsSinceUnixEpoch
+from danswer.connectors.interfaces import StatefulConnector
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
 from danswer.utils.batching import batch_generator
@@ -51,6 +57,11 @@ DRIVE_START_TIME_OFFSET = 60 * 10
 DRIVE_FOLDER_TYPE = "application/vnd.google-apps.folder"
 DRIVE_SHORTCUT_TYPE = "application/vnd.google-apps.shortcut"
 UNSUPPORTED_FILE_TYPE_CONTENT = ""  # keep empty for now
+DRIVE_FILE_FIELDS = "mimeType, id, name, modifiedTime, webViewLink, shortcutDetails"
+# connector state keys, the position in the changes feed at the end of the last poll and
+# the document ID of every indexed file
+CHANGES_POSITION_STATE_KEY = "changes_position"
+FILE_DOCUMENT_ID_STATE_KEY_PREFIX = "file_document_id:"
 
 
 class GDriveMimeType(str, Enum):
@@ -103,30 +114,135 @@ def _run_drive_file_query(
         files = results["files"]
         for file in files:
             if follow_shortcuts and "shortcutDetails" in file:
-                try:
-                    file_shortcut_points_to = add_retries(
-                        lambda: (
-                            service.files()
-                            .get(
-                                fileId=file["shortcutDetails"]["targetId"],
-                                supportsAllDrives=include_shared,
-                                fields="mimeType, id, name, modifiedTime, webViewLink, shortcutDetails",
-                            )
-                            .execute()
-                        )
-                    )()
+                file_shortcut_points_to = _get_shortcut_target(
+                    service, file, continue_on_failure, include_shared
+                )
+                if file_shortcut_points_to is not None:
                     yield file_shortcut_points_to
-                except HttpError:
-                    logger.error(
-                        f"Failed to follow shortcut with details: {file['shortcutDetails']}"
-                    )
-                    if continue_on_failure:
-                        continue
-                    raise
             else:
                 yield file
 
 
+def _get_shortcut_target(
+    service: discovery.Resource,
+    shortcut: GoogleDriveFileType,
+    continue_on_failure: bool,
+    include_shared: bool,
+) -> GoogleDriveFileType | None:
+    try:
+        return add_retries(
+            lambda: (
+                service.files()
+                .get(
+                    fileId=shortcut["shortcutDetails"]["targetId"],
+                    supportsAllDrives=include_shared,
+                    fields=DRIVE_FILE_FIELDS,
+                )
+                .execute()
+            )
+        )()
+    except HttpError:
+        logger.error(
+            f"Failed to follow shortcut with details: {shortcut['shortcutDetails']}"
+        )
+        if continue_on_failure:
+            return None
+        raise
+
+
+def _get_start_page_token(service: discovery.Resource, include_shared: bool) -> str:
+    """Position of the changes feed as of now"""
+    return add_retries(
+        lambda: (
+            service.changes()
+            .getStartPageToken(supportsAllDrives=include_shared)
+            .execute()
+        )
+    )()["startPageToken"]
+
+
+def _get_changes(
+    service: discovery.Resource,
+    page_token: str,
+    include_shared: bool,
+    batch_size: int,
+) -> Iterator[dict[str, Any]]:
+    """Pages of the changes feed starting at `page_token`, the last one has the
+    `newStartPageToken` to continue from next time"""
+    next_page_token: str | None = page_token
+    while next_page_token is not None:
+        results = add_retries(
+            lambda: (
+                service.changes()
+                .list(
+                    pageToken=next_page_token,
+                    pageSize=batch_size,
+                    spaces="drive",
+                    includeRemoved=True,
+                    supportsAllDrives=include_shared,
+                    includeItemsFromAllDrives=include_shared,
+                    fields=(
+                        "nextPageToken, newStartPageToken, changes(changeType, "
+                        f"fileId, removed, file({DRIVE_FILE_FIELDS}, trashed, parents))"
+                    ),
+                )
+                .execute()
+            )
+        )()
+        next_page_token = results.get("nextPageToken")
+        yield results
+
+
+class _FolderScope:
+    """Checks whether files are (recursively) within one of the given folders by
+    walking up their parents. Only the folders above changed files are looked up,
+    rather than listing everything below the given folders."""
+
+    def __init__(
+        self, service: discovery.Resource, folder_ids: list[str], include_shared: bool
+    ) -> None:
+        self.service = service
+        self.folder_ids = set(folder_ids)
+        self.include_shared = include_shared
+        self._parents_by_folder_id: dict[str, list[str]] = {}
+
+    def _get_parents(self, folder_id: str) -> list[str]:
+        if folder_id not in self._parents_by_folder_id:
+            try:
+                folder = add_retries(
+                    lambda: (
+                        self.service.files()
+                        .get(
+                            fileId=folder_id,
+                            supportsAllDrives=self.include_shared,
+                            fields="parents",
+                        )
+                        .execute()
+                    )
+                )()
+                parents = folder.get("parents", [])
+            except HttpError as e:
+                # e.g. a folder above the ones shared with the user
+                if e.resp.status != 404:
+                    raise
+                parents = []
+            self._parents_by_folder_id[folder_id] = parents
+        return self._parents_by_folder_id[folder_id]
+
+    def contains(self, file: GoogleDriveFileType) -> bool:
+        to_check = list(file.get("parents", []))
+        checked: set[str] = set()
+        while to_check:
+            folder_id = to_check.pop()
+            if folder_id in self.folder_ids:
+                return True
+            if folder_id in checked:
+                continue
+            checked.add(folder_id)
+            to_check.extend(self._get_parents(folder_id))
+        return False
+
+
 def _get_folder_id(
     service: discovery.Resource,
     parent_id: str,
@@ -322,11 +438,7 @@ def extract_text(file: dict[str, str], service: discovery.Resource) -> str:
         )
     elif mime_type == GDriveMimeType.WORD_DOC.value:
         response = service.files().get_media(fileId=file["id"]).execute()
-        word_stream = io.BytesIO(response)
-        with tempfile.NamedTemporaryFile(delete=False) as temp:
-            temp.write(word_stream.getvalue())
-            temp_path = temp.name
-        return docx2txt.process(temp_path)
+        return docx2txt.process(io.BytesIO(response))
     elif mime_type == GDriveMimeType.PDF.value:
         response = service.files().get_media(fileId=file["id"]).execute()
         file_contents = read_pdf_file(file=io.BytesIO(response), file_name=file["name"])
@@ -335,7 +447,9 @@ def extract_text(file: dict[str, str], service: discovery.Resource) -> str:
     return UNSUPPORTED_FILE_TYPE_CONTENT
 
 
-class GoogleDriveConnector(LoadConnector, PollConnector):
+class GoogleDriveConnector(
+    LoadConnector, PollConnector, DeletionTrackingConnector, StatefulConnector
+):
     def __init__(
         self,
         # optional list of folder paths e.g. "[My Folder/My Subfolder]"
@@ -345,14 +459,27 @@ class GoogleDriveConnector(LoadConnector, PollConnector):
         include_shared: bool = GOOGLE_DRIVE_INCLUDE_SHARED,
         follow_shortcuts: bool = GOOGLE_DRIVE_FOLLOW_SHORTCUTS,
         continue_on_failure: bool = CONTINUE_ON_CONNECTOR_FAILURE,
+        use_changes_feed: bool = GOOGLE_DRIVE_USE_CHANGES_FEED,
+        num_threads: int = GOOGLE_DRIVE_NUM_THREADS,
     ) -> None:
         self.folder_paths = folder_paths or []
         self.batch_size = batch_size
         self.include_shared = include_shared
         self.follow_shortcuts = follow_shortcuts
         self.continue_on_failure = continue_on_failure
+        self.use_changes_feed = use_changes_feed
+        self.num_threads = num_threads
         self.creds: Credentials | None = None
 
+        self._state_store: ConnectorStateStore | None = None
+        # file ID -> document ID of the files indexed / removed since the connector
+        # state was last saved. The document IDs are needed since files removed from
+        # the user's view show up in the changes feed with only their ID
+        self._new_document_ids_by_file_id: dict[str, str] = {}
+        self._removed_file_ids: set[str] = set()
+        self._deleted_document_ids: list[str] = []
+        self._new_start_page_token: str | None = None
+
     @staticmethod
     def _process_folder_paths(
         service: discovery.Resource,
@@ -431,15 +558,70 @@ class GoogleDriveConnector(LoadConnector, PollConnector):
         self.creds = creds
         return new_creds_dict
 
+    def _build_service(self) -> discovery.Resource:
+        if self.creds is None:
+            raise PermissionError("Not logged into Google Drive")
+
+        return discovery.build("drive", "v3", credentials=self.creds)
+
+    def _file_to_document(
+        self, file: GoogleDriveFileType, service: discovery.Resource
+    ) -> Document | None:
+        try:
+            text_contents = extract_text(file, service)
+            if text_contents:
+                full_context = file["name"] + " - " + text_contents
+            else:
+                full_context = file["name"]
+
+            return Document(
+                id=file["webViewLink"],
+                sections=[Section(link=file["webViewLink"], text=full_context)],
+                source=DocumentSource.GOOGLE_DRIVE,
+                semantic_identifier=file["name"],
+                doc_updated_at=datetime.fromisoformat(file["modifiedTime"]).astimezone(
+                    timezone.utc
+                ),
+                metadata={} if text_contents else {IGNORE_FOR_QA: True},
+            )
+        except Exception as e:
+            if not self.continue_on_failure:
+                raise e
+
+            logger.exception("Ran into exception when pulling a file from Google Drive")
+            return None
+
+    def _files_to_documents(
+        self, files_batch: list[GoogleDriveFileType]
+    ) -> list[Document]:
+        """Downloads / exports and parses the files in parallel, the documents are in
+        the same order as the files"""
+        # the Drive client is not thread safe, so every thread gets its own
+        thread_state = threading.local()
+
+        def _convert(file: GoogleDriveFileType) -> Document | None:
+            if not hasattr(thread_state, "service"):
+                thread_state.service = self._build_service()
+            return self._file_to_document(file, thread_state.service)
+
+        with ThreadPoolExecutor(max_workers=max(self.num_threads, 1)) as executor:
+            docs = list(executor.map(_convert, files_batch))
+
+        doc_batch = []
+        for file, doc in zip(files_batch, docs):
+            if doc is not None:
+                doc_batch.append(doc)
+                if self._uses_changes_feed():
+                    self._new_document_ids_by_file_id[file["id"]] = doc.id
+                    self._removed_file_ids.discard(file["id"])
+        return doc_batch
+
     def _fetch_docs_from_drive(
         self,
         start: SecondsSinceUnixEpoch | None = None,
         end: SecondsSinceUnixEpoch | None = None,
     ) -> GenerateDocumentsOutput:
-        if self.creds is None:
-            raise PermissionError("Not logged into Google Drive")
-
-        service = discovery.build("drive", "v3", credentials=self.creds)
+        service = self._build_service()
         folder_ids: Sequence[str | None] = self._process_folder_paths(
             service, self.folder_paths, self.include_shared, self.follow_shortcuts
         )
@@ -463,51 +645,180 @@ class GoogleDriveConnector(LoadConnector, PollConnector):
             ]
         )
         for files_batch in file_batches:
-            doc_batch = []
-            for file in files_batch:
-                try:
-                    text_contents = extract_text(file, service)
-                    if text_contents:
-                        full_context = file["name"] + " - " + text_contents
-                    else:
-                        full_context = file["name"]
-
-                    doc_batch.append(
-                        Document(
-                            id=file["webViewLink"],
-                            sections=[
-                                Section(link=file["webViewLink"], text=full_context)
-                            ],
-                            source=DocumentSource.GOOGLE_DRIVE,
-                            semantic_identifier=file["name"],
-                            doc_updated_at=datetime.fromisoformat(
-                                file["modifiedTime"]
-                            ).astimezone(timezone.utc),
-                            metadata={} if text_contents else {IGNORE_FOR_QA: True},
-                        )
-                    )
-                except Exception as e:
-                    if not self.continue_on_failure:
-                        raise e
+            yield self._files_to_documents(files_batch)
+
+    def _get_changed_files(
+        self, service: discovery.Resource, page_token: str
+    ) -> Iterator[GoogleDriveFileType]:
+        """Files changed since `page_token`, deleted / trashed files are recorded as
+        deletions instead. Sets the token to continue from next time once done."""
+        folder_ids = self._process_folder_paths(
+            service, self.folder_paths, self.include_shared, self.follow_shortcuts
+        )
+        folder_scope = (
+            _FolderScope(service, folder_ids, self.include_shared)
+            if folder_ids
+            else None
+        )
 
-                    logger.exception(
-                        "Ran into exception when pulling a file from Google Drive"
+        for changes_page in _get_changes(
+            service, page_token, self.include_shared, self.batch_size
+        ):
+            for change in changes_page.get("changes", []):
+                if change.get("changeType", "file") != "file":
+                    continue
+
+                file = change.get("file")
+                if change.get("removed") or file is None:
+                    # no longer visible to the user, either deleted or unshared
+                    document_id = self._pop_document_id(change["fileId"])
+                    if document_id:
+                        self._deleted_document_ids.append(document_id)
+                    continue
+
+                if file["mimeType"] == DRIVE_FOLDER_TYPE:
+                    continue
+                if folder_scope is not None and not folder_scope.contains(file):
+                    continue
+
+                if file.get("trashed"):
+                    # a trashed shortcut leaves the file it points to as is
+                    if "shortcutDetails" not in file:
+                        self._pop_document_id(file["id"])
+                        self._deleted_document_ids.append(file["webViewLink"])
+                    continue
+
+                if self.follow_shortcuts and "shortcutDetails" in file:
+                    target = _get_shortcut_target(
+                        service, file, self.continue_on_failure, self.include_shared
                     )
+                    if target is not None:
+                        yield target
+                else:
+                    yield file
 
+            if "newStartPageToken" in changes_page:
+                self._new_start_page_token = changes_page["newStartPageToken"]
+
+    def _fetch_docs_from_changes(
+        self, service: discovery.Resource, page_token: str
+    ) -> GenerateDocumentsOutput:
+        changed_files = self._get_changed_files(service, page_token)
+        for files_batch in batch_generator(
+            items=changed_files,
+            batch_size=self.batch_size,
+            pre_batch_yield=lambda batch_files: logger.info(
+                f"Changed Documents in batch: {[file['name'] for file in batch_files]}"
+            ),
+        ):
+            yield self._files_to_documents(files_batch)
+
+    def set_cc_pair_id(self, connector_id: int, credential_id: int) -> None:
+        self._state_store = ConnectorStateStore(connector_id, credential_id)
+
+    def _uses_changes_feed(self) -> bool:
+        # the changes feed relies on the state kept from the previous runs
+        return self.use_changes_feed and self._state_store is not None
+
+    def _pop_document_id(self, file_id: str) -> str | None:
+        """Document ID of a file that is no longer indexed, None if it never was"""
+        self._removed_file_ids.add(file_id)
+        if file_id in self._new_document_ids_by_file_id:
+            return self._new_document_ids_by_file_id.pop(file_id)
+
+        state_key = FILE_DOCUMENT_ID_STATE_KEY_PREFIX + file_id
+        return (
+            cast(ConnectorStateStore, self._state_store)
+            .load([state_key])
+            .get(state_key)
+        )
+
+    def _save_file_state(self) -> None:
+        state_store = cast(ConnectorStateStore, self._state_store)
+        state_store.delete(
+            [
+                FILE_DOCUMENT_ID_STATE_KEY_PREFIX + file_id
+                for file_id in self._removed_file_ids
+            ]
+        )
+        state_store.store(
+            {
+                FILE_DOCUMENT_ID_STATE_KEY_PREFIX + file_id: document_id
+                for file_id, document_id in self._new_document_ids_by_file_id.items()
+            }
+        )
+        self._new_document_ids_by_file_id = {}
+        self._removed_file_ids = set()
+
+    def _with_saved_file_state(
+        self, doc_batches: GenerateDocumentsOutput
+    ) -> GenerateDocumentsOutput:
+        for doc_batch in doc_batches:
             yield doc_batch
+            # the batch is indexed by now
+            self._save_file_state()
+        self._save_file_state()
+
+    def pop_deleted_document_ids(self) -> list[str]:
+        deleted_document_ids = self._deleted_document_ids
+        self._deleted_document_ids = []
+        return deleted_document_ids
 
     def load_from_state(self) -> GenerateDocumentsOutput:
-        yield from self._fetch_docs_from_drive()
+        if not self._uses_changes_feed():
+            yield from self._fetch_docs_from_drive()
+            return
+
+        # the document IDs are needed by the polls to handle files removed from the
+        # user's view later on
+        yield from self._with_saved_file_state(self._fetch_docs_from_drive())
 
     def poll_source(
         self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
     ) -> GenerateDocumentsOutput:
-        # need to subtract 10 minutes from start time to account for modifiedTime
-        # propogation if a document is modified, it takes some time for the API to
-        # reflect these changes if we do not have an offset, then we may "miss" the
-        # update when polling
-        yield from self._fetch_docs_from_drive(
-            max(start - DRIVE_START_TIME_OFFSET, 0, 0), end
+        if not self._uses_changes_feed():
+            # need to subtract 10 minutes from start time to account for modifiedTime
+            # propogation if a document is modified, it takes some time for the API to
+            # reflect these changes if we do not have an offset, then we may "miss" the
+            # update when polling
+            yield from self._fetch_docs_from_drive(
+                max(start - DRIVE_START_TIME_OFFSET, 0, 0), end
+            )
+            return
+
+        service = self._build_service()
+        state_store = cast(ConnectorStateStore, self._state_store)
+        position = state_store.load([CHANGES_POSITION_STATE_KEY]).get(
+            CHANGES_POSITION_STATE_KEY
+        )
+        # only usable if stored by the poll that ended where this one starts
+        if position is None or abs(position["poll_end"] - start) >= 1:
+            logger.info(
+                "No position in the Google Drive changes feed for this poll, "
+                "listing modified files instead"
+            )
+            # taken before listing so that no changes are missed in between
+            self._new_start_page_token = _get_start_page_token(
+                service, self.include_shared
+            )
+            doc_batches = self._fetch_docs_from_drive(
+                max(start - DRIVE_START_TIME_OFFSET, 0, 0), end
+            )
+        else:
+            doc_batches = self._fetch_docs_from_changes(service, position["page_token"])
+        yield from self._with_saved_file_state(doc_batches)
+
+        if self._new_start_page_token is None:
+            raise RuntimeError(
+                "Google Drive changes feed did not return a new position"
+            )
+        state_store.store(
+            {
+                CHANGES_POSITION_STATE_KEY: {
+                    "poll_end": end,
+                    "page_token": self._new_start_page_token,
+                }
+            }
         )
 
 
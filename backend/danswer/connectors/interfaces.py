@@ -8,6 +8,11 @@ from danswer.connectors.models import Document
 SecondsSinceUnixEpoch = float
 
 GenerateDocumentsOutput = Iterator[list[Document]]
+# Opaque to everything but the connector which produced it, must be JSON serializable
+ConnectorCheckpoint = str
+GenerateDocumentsWithCheckpointOutput = Iterator[
+    tuple[list[Document], ConnectorCheckpoint]
+]
 
 
 class BaseConnector(abc.ABC):
@@ -41,6 +46,19 @@ class LoadConnector(BaseConnector):
         raise NotImplementedError
 
 
+# Large set update / reindex which can be resumed part way through, e.g. after the
+# indexing job was killed
+class CheckpointConnector(BaseConnector):
+    @abc.abstractmethod
+    def load_from_checkpoint(
+        self, checkpoint: ConnectorCheckpoint | None
+    ) -> GenerateDocumentsWithCheckpointOutput:
+        """Same as `load_from_state` but yields a checkpoint alongside each batch.
+        Passing that checkpoint back in continues the load with the batch after it,
+        passing in None starts from the beginning."""
+        raise NotImplementedError
+
+
 # Small set updates by time
 class PollConnector(BaseConnector):
     @abc.abstractmethod
@@ -50,6 +68,42 @@ class PollConnector(BaseConnector):
         raise NotImplementedError
 
 
+# Small set updates by time which can be resumed part way through
+class CheckpointPollConnector(BaseConnector):
+    @abc.abstractmethod
+    def poll_source_from_checkpoint(
+        self,
+        start: SecondsSinceUnixEpoch,
+        end: SecondsSinceUnixEpoch,
+        checkpoint: ConnectorCheckpoint | None,
+    ) -> GenerateDocumentsWithCheckpointOutput:
+        """Same as `poll_source` but yields a checkpoint alongside each batch, see
+        `CheckpointConnector`. Only resumed with the same `start`."""
+        raise NotImplementedError
+
+
+# Connectors which also find out about documents that were removed from the source
+# (e.g. from a changes feed), so that they can be removed from the index
+class DeletionTrackingConnector(BaseConnector):
+    @abc.abstractmethod
+    def pop_deleted_document_ids(self) -> list[str]:
+        """IDs of the documents found to be deleted since the last call. Called after
+        each batch yielded by the connector has been indexed, and once more at the end
+        of the run."""
+        raise NotImplementedError
+
+
+# Connectors which keep their own state in between runs (e.g. what they saw in the
+# source last time). The state must be kept separately for every connector / credential
+# pair, so they are told which one they are running for. The state of a batch is saved
+# when the next batch is requested, which the indexing job only does once the previous
+# batch is indexed
+class StatefulConnector(BaseConnector):
+    @abc.abstractmethod
+    def set_cc_pair_id(self, connector_id: int, credential_id: int) -> None:
+        raise NotImplementedError
+
+
 # Event driven
 class EventConnector(BaseConnector):
     @abc.abstractmethod
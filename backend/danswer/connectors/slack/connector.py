@@ -1,8 +1,16 @@
-import json
+import queue
+import threading
+from collections import deque
 from collections.abc import Callable
 from collections.abc import Generator
+from collections.abc import Iterator
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
+from functools import partial
 from pathlib import Path
 from typing import Any
 from typing import cast
@@ -12,7 +20,10 @@ from slack_sdk.errors import SlackApiError
 from slack_sdk.web import SlackResponse
 
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
+from danswer.configs.app_configs import SLACK_CONNECTOR_NUM_CHANNEL_WORKERS
+from danswer.configs.app_configs import SLACK_CONNECTOR_NUM_THREAD_WORKERS
 from danswer.configs.constants import DocumentSource
+from danswer.connectors.cross_connector_utils.file_utils import iter_json_array
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
@@ -35,6 +46,12 @@ MessageType = dict[str, Any]
 # list of messages in a thread
 ThreadType = list[MessageType]
 
+# threads of a channel being fetched at the same time
+_MAX_PENDING_THREADS_PER_CHANNEL = 50
+# documents buffered for each channel that is ahead of the one being yielded
+_DOC_QUEUE_SIZE = 100
+_END_OF_DOCS = object()
+
 
 def _make_paginated_slack_api_call(
     call: Callable[..., SlackResponse], **kwargs: Any
@@ -218,6 +235,138 @@ def _filter_channels(
     ]
 
 
+def _get_filtered_thread(
+    client: WebClient,
+    channel_id: str,
+    thread_id: str,
+    msg_filter_func: Callable[[MessageType], bool],
+) -> ThreadType:
+    thread = get_thread(client=client, channel_id=channel_id, thread_id=thread_id)
+    return [message for message in thread if not msg_filter_func(message)]
+
+
+def _get_channel_docs(
+    client: WebClient,
+    workspace: str,
+    channel: ChannelType,
+    oldest: str | None,
+    latest: str | None,
+    msg_filter_func: Callable[[MessageType], bool],
+    slack_cleaner: SlackTextCleaner,
+    thread_executor: ThreadPoolExecutor,
+) -> Generator[Document, None, None]:
+    """Documents of the channel in message order. Threads are fetched in parallel,
+    with up to `_MAX_PENDING_THREADS_PER_CHANNEL` in flight."""
+    # threads being fetched and standalone messages, in message order
+    pending: deque[Future[ThreadType] | ThreadType] = deque()
+
+    num_docs = 0
+
+    def _pop_ready(max_pending: int) -> Generator[Document, None, None]:
+        nonlocal num_docs
+        while pending and (
+            len(pending) > max_pending
+            or not isinstance(pending[0], Future)
+            or pending[0].done()
+        ):
+            item = pending.popleft()
+            filtered_thread = item.result() if isinstance(item, Future) else item
+            if filtered_thread:
+                num_docs += 1
+                yield thread_to_doc(
+                    workspace=workspace,
+                    channel=channel,
+                    thread=filtered_thread,
+                    slack_cleaner=slack_cleaner,
+                )
+
+    seen_thread_ts: set[str] = set()
+    for message_batch in get_channel_messages(
+        client=client, channel=channel, oldest=oldest, latest=latest
+    ):
+        for message in message_batch:
+            thread_ts = message.get("thread_ts")
+            if thread_ts:
+                # skip threads we've already seen, since we've already processed all
+                # messages in that thread
+                if thread_ts in seen_thread_ts:
+                    continue
+                seen_thread_ts.add(thread_ts)
+                pending.append(
+                    thread_executor.submit(
+                        _get_filtered_thread,
+                        client,
+                        channel["id"],
+                        thread_ts,
+                        msg_filter_func,
+                    )
+                )
+            elif not msg_filter_func(message):
+                pending.append([message])
+
+            yield from _pop_ready(_MAX_PENDING_THREADS_PER_CHANNEL)
+
+    yield from _pop_ready(0)
+    logger.info(f"Pulled {num_docs} documents from slack channel {channel['name']}")
+
+
+def _produce_docs(
+    doc_queue: queue.Queue,
+    stop_event: threading.Event,
+    doc_generator_func: Callable[[], Iterator[Document]],
+) -> None:
+    """Puts the generated documents on the queue, followed by `_END_OF_DOCS` (or the
+    exception it failed with)"""
+
+    def _put(item: Any) -> bool:
+        while not stop_event.is_set():
+            try:
+                doc_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    if stop_event.is_set():
+        return
+
+    try:
+        for doc in doc_generator_func():
+            if not _put(doc):
+                return
+        _put(_END_OF_DOCS)
+    except Exception as e:
+        _put(e)
+
+
+def _iterate_in_parallel(
+    doc_generator_funcs: list[Callable[[], Iterator[Document]]],
+    num_workers: int,
+) -> Generator[Document, None, None]:
+    """Runs the generators (e.g. one per channel) in parallel, but yields the documents
+    in the same order as running them one after the other. Generators ahead of the one
+    being yielded buffer at most `_DOC_QUEUE_SIZE` documents."""
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as executor:
+        try:
+            doc_queues: list[queue.Queue] = []
+            for doc_generator_func in doc_generator_funcs:
+                doc_queue: queue.Queue = queue.Queue(maxsize=_DOC_QUEUE_SIZE)
+                executor.submit(
+                    _produce_docs, doc_queue, stop_event, doc_generator_func
+                )
+                doc_queues.append(doc_queue)
+
+            for doc_queue in doc_queues:
+                while (item := doc_queue.get()) is not _END_OF_DOCS:
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+        finally:
+            # lets the remaining generators stop if we bail out early
+            stop_event.set()
+
+
 def get_all_docs(
     client: WebClient,
     workspace: str,
@@ -225,51 +374,52 @@ def get_all_docs(
     oldest: str | None = None,
     latest: str | None = None,
     msg_filter_func: Callable[[MessageType], bool] = _default_msg_filter,
+    num_channel_workers: int = SLACK_CONNECTOR_NUM_CHANNEL_WORKERS,
+    num_thread_workers: int = SLACK_CONNECTOR_NUM_THREAD_WORKERS,
 ) -> Generator[Document, None, None]:
-    """Get all documents in the workspace, channel by channel"""
+    """Get all documents in the workspace, channel by channel.
+
+    Channels are read in parallel and so are the threads within them (all bound by the
+    shared Slack rate limits), the documents are still yielded in the same order as if
+    everything was fetched one by one."""
     slack_cleaner = SlackTextCleaner(client=client)
 
     all_channels = get_channels(client)
     filtered_channels = _filter_channels(all_channels, channels)
 
-    for channel in filtered_channels:
-        channel_docs = 0
-        channel_message_batches = get_channel_messages(
-            client=client, channel=channel, oldest=oldest, latest=latest
-        )
-
-        seen_thread_ts: set[str] = set()
-        for message_batch in channel_message_batches:
-            for message in message_batch:
-                filtered_thread: ThreadType | None = None
-                thread_ts = message.get("thread_ts")
-                if thread_ts:
-                    # skip threads we've already seen, since we've already processed all
-                    # messages in that thread
-                    if thread_ts in seen_thread_ts:
-                        continue
-                    seen_thread_ts.add(thread_ts)
-                    thread = get_thread(
-                        client=client, channel_id=channel["id"], thread_id=thread_ts
-                    )
-                    filtered_thread = [
-                        message for message in thread if not msg_filter_func(message)
-                    ]
-                elif not msg_filter_func(message):
-                    filtered_thread = [message]
-
-                if filtered_thread:
-                    channel_docs += 1
-                    yield thread_to_doc(
+    with ThreadPoolExecutor(max_workers=max(num_thread_workers, 1)) as thread_executor:
+        try:
+            yield from _iterate_in_parallel(
+                [
+                    partial(
+                        _get_channel_docs,
+                        client=client,
                         workspace=workspace,
                         channel=channel,
-                        thread=filtered_thread,
+                        oldest=oldest,
+                        latest=latest,
+                        msg_filter_func=msg_filter_func,
                         slack_cleaner=slack_cleaner,
+                        thread_executor=thread_executor,
                     )
+                    for channel in filtered_channels
+                ],
+                num_workers=num_channel_workers,
+            )
+        finally:
+            thread_executor.shutdown(wait=False, cancel_futures=True)
 
-        logger.info(
-            f"Pulled {channel_docs} documents from slack channel {channel['name']}"
-        )
+
+@dataclass
+class _ExportThread:
+    """A thread from a Slack export, collected until all of its replies are found"""
+
+    doc_id: str
+    sections: list[Section]
+    updated_at: datetime | None
+    num_expected_replies: int = 0
+    num_replies: int = 0
+    latest_reply_time: datetime | None = None
 
 
 class SlackLoadConnector(LoadConnector):
@@ -279,11 +429,13 @@ class SlackLoadConnector(LoadConnector):
         export_path_str: str,
         channels: list[str] | None = None,
         batch_size: int = INDEX_BATCH_SIZE,
+        num_workers: int = SLACK_CONNECTOR_NUM_CHANNEL_WORKERS,
     ) -> None:
         self.workspace = workspace
         self.channels = channels
         self.export_path_str = export_path_str
         self.batch_size = batch_size
+        self.num_workers = num_workers
 
     def load_credentials(self, credentials: dict[str, Any]) -> dict[str, Any] | None:
         if credentials:
@@ -291,91 +443,113 @@ class SlackLoadConnector(LoadConnector):
         return None
 
     @staticmethod
-    def _process_batch_event(
-        slack_event: dict[str, Any],
-        channel: dict[str, Any],
-        matching_doc: Document | None,
-        workspace: str,
-    ) -> Document | None:
-        if (
-            slack_event["type"] == "message"
-            and slack_event.get("subtype") != "channel_join"
-        ):
-            if matching_doc:
-                return Document(
-                    id=matching_doc.id,
-                    sections=matching_doc.sections
-                    + [
-                        Section(
-                            link=get_message_link(
-                                event=slack_event,
-                                workspace=workspace,
-                                channel_id=channel["id"],
-                            ),
-                            text=slack_event["text"],
-                        )
-                    ],
-                    source=matching_doc.source,
-                    semantic_identifier=matching_doc.semantic_identifier,
-                    title="",  # slack docs don't really have a "title"
-                    doc_updated_at=get_event_time(slack_event),
-                    metadata=matching_doc.metadata,
-                )
+    def _thread_to_doc(thread: _ExportThread, channel: ChannelType) -> Document:
+        return Document(
+            id=thread.doc_id,
+            sections=thread.sections,
+            source=DocumentSource.SLACK,
+            semantic_identifier=channel["name"],
+            title="",  # slack docs don't really have a "title"
+            doc_updated_at=thread.updated_at,
+            metadata={},
+        )
+
+    def _get_channel_docs(
+        self, export_path: Path, channel: ChannelType
+    ) -> Generator[Document, None, None]:
+        """Streams the events of the channel's day files (in date order) and yields
+        each thread as soon as all of its replies have been seen. Only the threads
+        still waiting for replies are held in memory."""
+        open_threads: dict[str, _ExportThread] = {}
+
+        channel_dir_path = export_path / cast(str, channel["name"])
+        # day files are named after their date, e.g. 2023-06-30.json
+        for path in sorted(channel_dir_path.glob("*.json")):
+            with open(path) as f:
+                for slack_event in iter_json_array(f):
+                    if (
+                        slack_event.get("type") != "message"
+                        or slack_event.get("subtype") == "channel_join"
+                    ):
+                        continue
 
-            return Document(
-                id=slack_event["ts"],
-                sections=[
-                    Section(
+                    section = Section(
                         link=get_message_link(
                             event=slack_event,
-                            workspace=workspace,
+                            workspace=self.workspace,
                             channel_id=channel["id"],
                         ),
                         text=slack_event["text"],
                     )
-                ],
-                source=DocumentSource.SLACK,
-                semantic_identifier=channel["name"],
-                title="",  # slack docs don't really have a "title"
-                doc_updated_at=get_event_time(slack_event),
-                metadata={},
-            )
+                    thread = open_threads.get(slack_event.get("thread_ts", ""))
+                    if thread is not None:
+                        thread.sections.append(section)
+                        thread.updated_at = get_event_time(slack_event)
+                        thread.num_replies += 1
+                        if thread.num_replies >= thread.num_expected_replies:
+                            del open_threads[thread.doc_id]
+                            yield self._thread_to_doc(thread, channel)
+                        continue
 
-        return None
+                    thread = _ExportThread(
+                        doc_id=slack_event["ts"],
+                        sections=[section],
+                        updated_at=get_event_time(slack_event),
+                        num_expected_replies=slack_event.get("reply_count", 0),
+                        latest_reply_time=get_event_time(
+                            {"ts": slack_event.get("latest_reply")}
+                        ),
+                    )
+                    if thread.num_expected_replies > 0:
+                        open_threads[thread.doc_id] = thread
+                    else:
+                        yield self._thread_to_doc(thread, channel)
+
+            # replies missing from the export (e.g. deleted) would otherwise keep
+            # their thread open until the end of the channel, give up on them once the
+            # day files are a day past the thread's latest reply
+            try:
+                day_start = datetime.strptime(path.stem, "%Y-%m-%d").replace(
+                    tzinfo=timezone.utc
+                )
+            except ValueError:
+                continue
+            for thread in list(open_threads.values()):
+                if (
+                    thread.latest_reply_time is not None
+                    and thread.latest_reply_time < day_start - timedelta(days=1)
+                ):
+                    del open_threads[thread.doc_id]
+                    yield self._thread_to_doc(thread, channel)
+
+        for thread in open_threads.values():
+            yield self._thread_to_doc(thread, channel)
 
     def load_from_state(self) -> GenerateDocumentsOutput:
         export_path = Path(self.export_path_str)
 
         with open(export_path / "channels.json") as f:
-            all_channels = json.load(f)
+            all_channels = list(iter_json_array(f))
 
         filtered_channels = _filter_channels(all_channels, self.channels)
 
-        document_batch: dict[str, Document] = {}
-        for channel_info in filtered_channels:
-            channel_dir_path = export_path / cast(str, channel_info["name"])
-            channel_file_paths = [
-                channel_dir_path / file_name
-                for file_name in os.listdir(channel_dir_path)
-            ]
-            for path in channel_file_paths:
-                with open(path) as f:
-                    events = cast(list[dict[str, Any]], json.load(f))
-                for slack_event in events:
-                    doc = self._process_batch_event(
-                        slack_event=slack_event,
-                        channel=channel_info,
-                        matching_doc=document_batch.get(
-                            slack_event.get("thread_ts", "")
-                        ),
-                        workspace=self.workspace,
-                    )
-                    if doc:
-                        document_batch[doc.id] = doc
-                        if len(document_batch) >= self.batch_size:
-                            yield list(document_batch.values())
+        # channel directories are processed in parallel, the documents come out
+        # channel by channel
+        document_batch: list[Document] = []
+        for doc in _iterate_in_parallel(
+            [
+                partial(self._get_channel_docs, export_path, channel_info)
+                for channel_info in filtered_channels
+            ],
+            num_workers=self.num_workers,
+        ):
+            document_batch.append(doc)
+            if len(document_batch) >= self.batch_size:
+                yield document_batch
+                document_batch = []
 
-        yield list(document_batch.values())
+        if document_batch:
+            yield document_batch
 
 
 class SlackPollConnector(PollConnector):
@@ -1,5 +1,6 @@
+import hashlib
+import inspect
 import re
-import time
 from collections.abc import Callable
 from collections.abc import Generator
 from functools import wraps
@@ -10,6 +11,12 @@ from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from slack_sdk.web import SlackResponse
 
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
+    get_rate_limiter,
+)
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
+    TokenBucketRateLimiter,
+)
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
@@ -17,6 +24,16 @@ logger = setup_logger()
 # number of messages we request per page when fetching paginated slack messages
 _SLACK_LIMIT = 900
 
+# calls per minute for the methods we use: https://api.slack.com/docs/rate-limits
+_SLACK_RATE_LIMITS_PER_MINUTE = {
+    "conversations_list": 20,  # Tier 2
+    "conversations_info": 50,  # Tier 3
+    "conversations_history": 50,  # Tier 3
+    "conversations_replies": 50,  # Tier 3
+    "users_info": 100,  # Tier 4
+}
+_DEFAULT_SLACK_RATE_LIMIT_PER_MINUTE = 100
+
 
 def get_message_link(
     event: dict[str, Any], workspace: str, channel_id: str | None = None
@@ -66,37 +83,35 @@ def make_slack_api_call_paginated(
     return paginated_call
 
 
+def get_slack_rate_limiter(
+    call: Callable[..., SlackResponse]
+) -> TokenBucketRateLimiter:
+    """Slack rate limits each method separately, per app and workspace. Limiters are
+    shared by all calls to the same method with the same token."""
+    client = getattr(inspect.unwrap(call), "__self__", None)
+    token = cast(str | None, getattr(client, "token", None)) or ""
+    token_hash = hashlib.sha256(token.encode()).hexdigest()[:16]
+    method_name = call.__name__
+    return get_rate_limiter(
+        f"slack:{token_hash}:{method_name}",
+        max_calls=_SLACK_RATE_LIMITS_PER_MINUTE.get(
+            method_name, _DEFAULT_SLACK_RATE_LIMIT_PER_MINUTE
+        ),
+        period=60,
+    )
+
+
 def make_slack_api_rate_limited(
-    call: Callable[..., SlackResponse], max_retries: int = 3
+    call: Callable[..., SlackResponse],
 ) -> Callable[..., SlackResponse]:
     """Wraps calls to slack API so that they automatically handle rate limiting"""
+    rate_limiter = get_slack_rate_limiter(call)
 
     @wraps(call)
     def rate_limited_call(**kwargs: Any) -> SlackResponse:
-        for _ in range(max_retries):
-            try:
-                # Make the API call
-                response = call(**kwargs)
-
-                # Check for errors in the response, will raise `SlackApiError`
-                # if anything went wrong
-                response.validate()
-                return response
-
-            except SlackApiError as e:
-                if e.response["error"] == "ratelimited":
-                    # Handle rate limiting: get the 'Retry-After' header value and sleep for that duration
-                    retry_after = int(e.response.headers.get("Retry-After", 1))
-                    logger.info(
-                        f"Slack call rate limited, retrying after {retry_after} seconds. Exception: {e}"
-                    )
-                    time.sleep(retry_after)
-                else:
-                    # Raise the error for non-transient errors
-                    raise
-
-        # If the code reaches this point, all retries have been exhausted
-        raise Exception(f"Max retries ({max_retries}) exceeded")
+        # `validate` raises a `SlackApiError` if anything went wrong, rate limited
+        # responses are retried after the time given in their 'Retry-After' header
+        return rate_limiter.call(lambda: call(**kwargs).validate())
 
     return rate_limited_call
 
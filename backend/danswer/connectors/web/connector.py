@@ -1,34 +1,64 @@
+import asyncio
 import io
+from collections import Counter
+from datetime import datetime
+from datetime import timezone
 from enum import Enum
 from typing import Any
 from typing import cast
-from typing import Tuple
 from urllib.parse import urljoin
 from urllib.parse import urlparse
 
+import httpx
 import requests
 from bs4 import BeautifulSoup
 from oauthlib.oauth2 import BackendApplicationClient
-from playwright.sync_api import BrowserContext
-from playwright.sync_api import Playwright
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from playwright.async_api import Browser
+from playwright.async_api import BrowserContext
+from playwright.async_api import Playwright
 from requests_oauthlib import OAuth2Session  # type:ignore
 
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
+from danswer.configs.app_configs import WEB_CONNECTOR_ALWAYS_RENDER_JAVASCRIPT
+from danswer.configs.app_configs import WEB_CONNECTOR_MAX_CONCURRENT_REQUESTS_PER_HOST
+from danswer.configs.app_configs import WEB_CONNECTOR_MIN_REQUEST_INTERVAL_SECONDS
+from danswer.configs.app_configs import WEB_CONNECTOR_NUM_CONCURRENT_PAGES
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_CLIENT_ID
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_CLIENT_SECRET
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_TOKEN_URL
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.cross_connector_utils.file_utils import read_pdf_file
 from danswer.connectors.cross_connector_utils.html_utils import web_html_cleanup
+from danswer.connectors.cross_connector_utils.state_store import ConnectorStateStore
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
+from danswer.connectors.interfaces import PollConnector
+from danswer.connectors.interfaces import SecondsSinceUnixEpoch
+from danswer.connectors.interfaces import StatefulConnector
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
+from danswer.connectors.web.utils import CrawlFrontier
+from danswer.connectors.web.utils import get_content_hash
+from danswer.connectors.web.utils import HostRateLimiter
+from danswer.connectors.web.utils import looks_js_rendered
+from danswer.connectors.web.utils import PageStateStore
+from danswer.connectors.web.utils import parse_sitemap_lastmod
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
+# how often idle crawl workers check for links found by the other workers
+_FRONTIER_POLL_INTERVAL_SECONDS = 0.1
+_HTTP_TIMEOUT_SECONDS = 30
+
+_FETCH_METHOD_HTTP = "http"
+_FETCH_METHOD_BROWSER = "browser"
+
+
+class _NotModified:
+    """Result of a conditional GET for a page that hasn't changed"""
+
 
 class WEB_CONNECTOR_VALID_SETTINGS(str, Enum):
     # Given a base site, index everything under that path
@@ -70,39 +100,61 @@ def get_internal_links(
     return internal_links
 
 
-def start_playwright() -> Tuple[Playwright, BrowserContext]:
-    playwright = sync_playwright().start()
-    browser = playwright.chromium.launch(headless=True)
-
-    context = browser.new_context()
-
-    if (
+def _get_oauth_headers() -> dict[str, str]:
+    if not (
         WEB_CONNECTOR_OAUTH_CLIENT_ID
         and WEB_CONNECTOR_OAUTH_CLIENT_SECRET
         and WEB_CONNECTOR_OAUTH_TOKEN_URL
     ):
-        client = BackendApplicationClient(client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID)
-        oauth = OAuth2Session(client=client)
-        token = oauth.fetch_token(
-            token_url=WEB_CONNECTOR_OAUTH_TOKEN_URL,
-            client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID,
-            client_secret=WEB_CONNECTOR_OAUTH_CLIENT_SECRET,
-        )
-        context.set_extra_http_headers(
-            {"Authorization": "Bearer {}".format(token["access_token"])}
-        )
+        return {}
 
-    return playwright, context
+    client = BackendApplicationClient(client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID)
+    oauth = OAuth2Session(client=client)
+    token = oauth.fetch_token(
+        token_url=WEB_CONNECTOR_OAUTH_TOKEN_URL,
+        client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID,
+        client_secret=WEB_CONNECTOR_OAUTH_CLIENT_SECRET,
+    )
+    return {"Authorization": "Bearer {}".format(token["access_token"])}
 
 
-def extract_urls_from_sitemap(sitemap_url: str) -> list[str]:
+async def start_playwright() -> tuple[Playwright, Browser, BrowserContext]:
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(headless=True)
+
+    context = await browser.new_context()
+    oauth_headers = _get_oauth_headers()
+    if oauth_headers:
+        await context.set_extra_http_headers(oauth_headers)
+
+    return playwright, browser, context
+
+
+def extract_entries_from_sitemap(
+    sitemap_url: str,
+) -> list[tuple[str, datetime | None]]:
+    """Returns the URL of every page in the sitemap, together with the latest time it
+    may have been modified at according to its `<lastmod>` (if it has one)"""
     response = requests.get(sitemap_url)
     response.raise_for_status()
 
     soup = BeautifulSoup(response.content, "html.parser")
-    urls = [loc_tag.text for loc_tag in soup.find_all("loc")]
+    entries: list[tuple[str, datetime | None]] = []
+    for loc_tag in soup.find_all("loc"):
+        lastmod: datetime | None = None
+        lastmod_tag = loc_tag.parent.find("lastmod") if loc_tag.parent else None
+        if lastmod_tag is not None:
+            try:
+                lastmod = parse_sitemap_lastmod(lastmod_tag.text.strip())
+            except (ValueError, OverflowError):
+                logger.debug(f"Invalid sitemap lastmod: '{lastmod_tag.text}'")
+        entries.append((loc_tag.text, lastmod))
 
-    return urls
+    return entries
+
+
+def extract_urls_from_sitemap(sitemap_url: str) -> list[str]:
+    return [url for url, _ in extract_entries_from_sitemap(sitemap_url)]
 
 
 def _ensure_valid_url(url: str) -> str:
@@ -117,17 +169,243 @@ def _read_urls_file(location: str) -> list[str]:
     return urls
 
 
-class WebConnector(LoadConnector):
+class _WebCrawler:
+    """Crawls pages concurrently, with all pages sharing a single headless browser that
+    is kept around for the whole run"""
+
+    def __init__(
+        self,
+        to_visit: list[str],
+        recursive: bool,
+        mintlify_cleanup: bool,
+        num_concurrent_pages: int,
+        host_rate_limiter: HostRateLimiter,
+        always_render_javascript: bool,
+        page_states: PageStateStore,
+        incremental: bool,
+    ) -> None:
+        """`page_states` is updated with what was found on every visited page, but not
+        saved. If `incremental`, pages which haven't changed since they were last
+        visited (based on `page_states`) are not returned as documents."""
+        self.base_url = to_visit[0]  # For the recursive case
+        self.frontier = CrawlFrontier(to_visit)
+        self.recursive = recursive
+        self.mintlify_cleanup = mintlify_cleanup
+        self.num_concurrent_pages = num_concurrent_pages
+        self.host_rate_limiter = host_rate_limiter
+        self.always_render_javascript = always_render_javascript
+        self.num_pages_by_fetch_method: Counter[str] = Counter()
+        self.page_states = page_states
+        self.incremental = incremental
+        self.num_unchanged_pages = 0
+
+        self._http_client: httpx.AsyncClient | None = None
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+        self._context: BrowserContext | None = None
+        self._browser_lock = asyncio.Lock()
+        self._num_visits_in_progress = 0
+
+    async def _get_context(self) -> BrowserContext:
+        async with self._browser_lock:
+            # the browser is only restarted if it crashed
+            if self._browser is None or not self._browser.is_connected():
+                await self.stop()
+                (
+                    self._playwright,
+                    self._browser,
+                    self._context,
+                ) = await start_playwright()
+            return cast(BrowserContext, self._context)
+
+    async def stop(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.warning(f"Failed to close browser: {e}")
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._playwright, self._browser, self._context = None, None, None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            # pooled, shared by all of the crawl workers
+            self._http_client = httpx.AsyncClient(
+                headers=_get_oauth_headers(),
+                follow_redirects=True,
+                timeout=_HTTP_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=self.num_concurrent_pages),
+            )
+        return self._http_client
+
+    async def _visit_pdf(self, url: str) -> Document:
+        # PDF files are not checked for links
+        response = await self._get_http_client().get(url)
+        page_text = read_pdf_file(file=io.BytesIO(response.content), file_name=url)
+        self.num_pages_by_fetch_method[_FETCH_METHOD_HTTP] += 1
+        return Document(
+            id=url,
+            sections=[Section(link=url, text=page_text)],
+            source=DocumentSource.WEB,
+            semantic_identifier=url.split(".")[-1],
+            metadata={},
+        )
+
+    async def _fetch_with_http(
+        self, url: str
+    ) -> tuple[str, BeautifulSoup] | _NotModified | None:
+        """Returns the final URL (after redirects) and the parsed page, or None if the
+        page has to be rendered in the browser instead"""
+        headers: dict[str, str] = {}
+        page_state = self.page_states.get(url)
+        if self.incremental and page_state.get("etag"):
+            headers["If-None-Match"] = page_state["etag"]
+        if self.incremental and page_state.get("last_modified"):
+            headers["If-Modified-Since"] = page_state["last_modified"]
+
+        response = await self._get_http_client().get(url, headers=headers)
+        if response.status_code == 304:
+            return _NotModified()
+        if not response.is_success or "html" not in response.headers.get(
+            "content-type", ""
+        ):
+            return None
+
+        self.page_states.update(
+            url,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+        )
+
+        soup = BeautifulSoup(response.text, "html.parser")
+        if looks_js_rendered(soup):
+            logger.debug(f"'{url}' looks like it needs JavaScript, using the browser")
+            return None
+        return str(response.url), soup
+
+    async def _fetch_with_browser(self, url: str) -> tuple[str, BeautifulSoup]:
+        page = await (await self._get_context()).new_page()
+        try:
+            await page.goto(url)
+            return page.url, BeautifulSoup(await page.content(), "html.parser")
+        finally:
+            await page.close()
+
+    async def _visit(self, url: str) -> Document | None:
+        logger.info(f"Visiting {url}")
+        async with self.host_rate_limiter.limit(url):
+            if url.split(".")[-1] == "pdf":
+                return await self._visit_pdf(url)
+
+            fetch_result = None
+            fetch_method = _FETCH_METHOD_BROWSER
+            if not self.always_render_javascript:
+                fetch_result = await self._fetch_with_http(url)
+                fetch_method = _FETCH_METHOD_HTTP
+            if fetch_result is None:
+                fetch_result = await self._fetch_with_browser(url)
+                fetch_method = _FETCH_METHOD_BROWSER
+            self.num_pages_by_fetch_method[fetch_method] += 1
+
+        requested_url = url
+        if isinstance(fetch_result, _NotModified):
+            logger.debug(f"'{url}' not modified since the last crawl")
+            self.num_unchanged_pages += 1
+            # the page is not re-read, so the links found on it last time are followed
+            for link in self.page_states.get(url).get("links", []):
+                self.frontier.add(link)
+            return None
+
+        final_url, soup = fetch_result
+        if final_url != url:
+            logger.info(f"Redirected to {final_url}")
+            url = final_url
+            if not self.frontier.mark_seen(url):
+                logger.info("Redirected page already indexed")
+                return None
+
+        if self.recursive:
+            internal_links = get_internal_links(self.base_url, url, soup)
+            for link in internal_links:
+                self.frontier.add(link)
+            self.page_states.update(requested_url, links=sorted(internal_links))
+
+        parsed_html = web_html_cleanup(soup, self.mintlify_cleanup)
+        content_hash = get_content_hash(
+            f"{parsed_html.title}\n{parsed_html.cleaned_text}"
+        )
+        previous_content_hash = self.page_states.get(requested_url).get("content_hash")
+        self.page_states.update(requested_url, content_hash=content_hash)
+        if self.incremental and content_hash == previous_content_hash:
+            logger.debug(f"'{url}' content unchanged since the last crawl")
+            self.num_unchanged_pages += 1
+            return None
+
+        return Document(
+            id=url,
+            sections=[Section(link=url, text=parsed_html.cleaned_text)],
+            source=DocumentSource.WEB,
+            semantic_identifier=parsed_html.title or url,
+            metadata={},
+        )
+
+    async def crawl_batch(self, batch_size: int) -> list[Document]:
+        """Crawls until at least `batch_size` documents are found or there is nothing
+        left to visit. Returns an empty list once the crawl is complete."""
+        doc_batch: list[Document] = []
+
+        async def _crawl_worker() -> None:
+            while len(doc_batch) < batch_size:
+                url = self.frontier.pop()
+                if url is None:
+                    if not self._num_visits_in_progress:
+                        return
+                    # pages still being visited may add more links
+                    await asyncio.sleep(_FRONTIER_POLL_INTERVAL_SECONDS)
+                    continue
+
+                self._num_visits_in_progress += 1
+                try:
+                    document = await self._visit(url)
+                    if document:
+                        doc_batch.append(document)
+                except Exception as e:
+                    logger.error(f"Failed to fetch '{url}': {e}")
+                finally:
+                    self._num_visits_in_progress -= 1
+
+        await asyncio.gather(
+            *[_crawl_worker() for _ in range(self.num_concurrent_pages)]
+        )
+        return doc_batch
+
+
+class WebConnector(LoadConnector, PollConnector, StatefulConnector):
     def __init__(
         self,
         base_url: str,  # Can't change this without disrupting existing users
         web_connector_type: str = WEB_CONNECTOR_VALID_SETTINGS.RECURSIVE.value,
         mintlify_cleanup: bool = True,  # Mostly ok to apply to other websites as well
         batch_size: int = INDEX_BATCH_SIZE,
+        num_concurrent_pages: int = WEB_CONNECTOR_NUM_CONCURRENT_PAGES,
+        # skips the plain HTTP fast path, for sites that are known to need JavaScript
+        always_render_javascript: bool = WEB_CONNECTOR_ALWAYS_RENDER_JAVASCRIPT,
     ) -> None:
         self.mintlify_cleanup = mintlify_cleanup
         self.batch_size = batch_size
+        self.num_concurrent_pages = num_concurrent_pages
+        self.always_render_javascript = always_render_javascript
+        self.web_connector_type = web_connector_type
+        self.base_url = base_url
         self.recursive = False
+        # only known for sitemaps
+        self.lastmod_by_url: dict[str, datetime | None] = {}
+        # the crawl state kept across runs, only set when run by the indexing job
+        self._state_store: ConnectorStateStore | None = None
 
         if web_connector_type == WEB_CONNECTOR_VALID_SETTINGS.RECURSIVE.value:
             self.recursive = True
@@ -138,7 +416,9 @@ class WebConnector(LoadConnector):
             self.to_visit_list = [_ensure_valid_url(base_url)]
 
         elif web_connector_type == WEB_CONNECTOR_VALID_SETTINGS.SITEMAP:
-            self.to_visit_list = extract_urls_from_sitemap(_ensure_valid_url(base_url))
+            sitemap_entries = extract_entries_from_sitemap(_ensure_valid_url(base_url))
+            self.to_visit_list = [url for url, _ in sitemap_entries]
+            self.lastmod_by_url = dict(sitemap_entries)
 
         elif web_connector_type == WEB_CONNECTOR_VALID_SETTINGS.UPLOAD:
             self.to_visit_list = _read_urls_file(base_url)
@@ -153,97 +433,82 @@ class WebConnector(LoadConnector):
             logger.warning("Unexpected credentials provided for Web Connector")
         return None
 
-    def load_from_state(self) -> GenerateDocumentsOutput:
-        """Traverses through all pages found on the website
-        and converts them into documents"""
-        visited_links: set[str] = set()
-        to_visit: list[str] = self.to_visit_list
-        base_url = to_visit[0]  # For the recursive case
-        doc_batch: list[Document] = []
-
-        playwright, context = start_playwright()
-        restart_playwright = False
-        while to_visit:
-            current_url = to_visit.pop()
-            if current_url in visited_links:
-                continue
-            visited_links.add(current_url)
-
-            logger.info(f"Visiting {current_url}")
-
-            try:
-                if restart_playwright:
-                    playwright, context = start_playwright()
-                    restart_playwright = False
-
-                if current_url.split(".")[-1] == "pdf":
-                    # PDF files are not checked for links
-                    response = requests.get(current_url)
-                    page_text = read_pdf_file(
-                        file=io.BytesIO(response.content), file_name=current_url
-                    )
-
-                    doc_batch.append(
-                        Document(
-                            id=current_url,
-                            sections=[Section(link=current_url, text=page_text)],
-                            source=DocumentSource.WEB,
-                            semantic_identifier=current_url.split(".")[-1],
-                            metadata={},
-                        )
-                    )
-                    continue
+    def set_cc_pair_id(self, connector_id: int, credential_id: int) -> None:
+        self._state_store = ConnectorStateStore(connector_id, credential_id)
+
+    def _crawl(self, to_visit: list[str], incremental: bool) -> GenerateDocumentsOutput:
+        page_states = PageStateStore(self._state_store)
+        crawler = _WebCrawler(
+            to_visit=to_visit,
+            recursive=self.recursive,
+            mintlify_cleanup=self.mintlify_cleanup,
+            num_concurrent_pages=self.num_concurrent_pages,
+            host_rate_limiter=HostRateLimiter(
+                max_concurrent_per_host=WEB_CONNECTOR_MAX_CONCURRENT_REQUESTS_PER_HOST,
+                min_interval_seconds=WEB_CONNECTOR_MIN_REQUEST_INTERVAL_SECONDS,
+            ),
+            always_render_javascript=self.always_render_javascript,
+            page_states=page_states,
+            incremental=incremental,
+        )
 
-                page = context.new_page()
-                page.goto(current_url)
-                final_page = page.url
-                if final_page != current_url:
-                    logger.info(f"Redirected to {final_page}")
-                    current_url = final_page
-                    if current_url in visited_links:
-                        logger.info("Redirected page already indexed")
-                        continue
-                    visited_links.add(current_url)
-
-                content = page.content()
-                soup = BeautifulSoup(content, "html.parser")
-
-                if self.recursive:
-                    internal_links = get_internal_links(base_url, current_url, soup)
-                    for link in internal_links:
-                        if link not in visited_links:
-                            to_visit.append(link)
-
-                parsed_html = web_html_cleanup(soup, self.mintlify_cleanup)
-
-                doc_batch.append(
-                    Document(
-                        id=current_url,
-                        sections=[
-                            Section(link=current_url, text=parsed_html.cleaned_text)
-                        ],
-                        source=DocumentSource.WEB,
-                        semantic_identifier=parsed_html.title or current_url,
-                        metadata={},
-                    )
+        # the crawl runs on its own event loop, which is only driven while this
+        # generator is asked for the next batch
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                doc_batch = loop.run_until_complete(
+                    crawler.crawl_batch(self.batch_size)
                 )
-
-                page.close()
-            except Exception as e:
-                logger.error(f"Failed to fetch '{current_url}': {e}")
-                playwright.stop()
-                restart_playwright = True
-                continue
-
-            if len(doc_batch) >= self.batch_size:
-                playwright.stop()
-                restart_playwright = True
+                if not doc_batch:
+                    page_states.save()
+                    break
                 yield doc_batch
-                doc_batch = []
+                # the pages' new states (e.g. their content hash) are only saved once
+                # the batch has been indexed, otherwise a failed batch would never be
+                # re-indexed since the pages would look unchanged to the next crawl
+                page_states.save()
+        finally:
+            loop.run_until_complete(crawler.stop())
+            loop.close()
+            logger.info(
+                f"Fetched {crawler.num_pages_by_fetch_method[_FETCH_METHOD_HTTP]} "
+                "pages with plain HTTP requests and "
+                f"{crawler.num_pages_by_fetch_method[_FETCH_METHOD_BROWSER]} pages "
+                f"with the browser, {crawler.num_unchanged_pages} pages were unchanged"
+            )
 
-        if doc_batch:
-            playwright.stop()
-            yield doc_batch
+    def load_from_state(self) -> GenerateDocumentsOutput:
+        """Traverses through all pages found on the website
+        and converts them into documents"""
+        return self._crawl(to_visit=self.to_visit_list, incremental=False)
+
+    def poll_source(
+        self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
+    ) -> GenerateDocumentsOutput:
+        """Still visits the whole site, but only returns the pages which changed since
+        the last crawl. Pages are skipped if their sitemap `<lastmod>` (at the
+        precision it is given) is before `start`, the server responds to a
+        conditional GET with 304 Not Modified or the text is the same as last time.
+        The first poll (`start` of 0) is a full crawl."""
+        if not start:
+            return self._crawl(to_visit=self.to_visit_list, incremental=False)
+
+        start_time = datetime.fromtimestamp(start, tz=timezone.utc)
+        to_visit = [
+            url
+            for url in self.to_visit_list
+            if (lastmod := self.lastmod_by_url.get(url)) is None
+            or lastmod >= start_time
+        ]
+        if len(to_visit) < len(self.to_visit_list):
+            logger.info(
+                f"Skipping {len(self.to_visit_list) - len(to_visit)} sitemap pages "
+                "which have not been modified since the last crawl"
+            )
+        if not to_visit:
+            return iter(())
+        return self._crawl(to_visit=to_visit, incremental=True)
 
 
 if __name__ == "__main__":
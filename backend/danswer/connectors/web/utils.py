@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from urllib.parse import urlparse
+from urllib.parse import urlunparse
+
+from bs4 import BeautifulSoup
+
+from danswer.connectors.cross_connector_utils.miscellaneous_utils import (
+    time_str_to_utc,
+)
+from danswer.connectors.cross_connector_utils.state_store import ConnectorStateStore
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# pages with less visible text than this are assumed to be rendered by JavaScript
+_MIN_STATIC_TEXT_CHARS = 200
+# elements that single page apps render into
+_SPA_ROOT_SELECTORS = [
+    "#root",
+    "#app",
+    "#__next",
+    "#__nuxt",
+    "#___gatsby",
+    "app-root",
+    "[ng-app]",
+]
+_NON_VISIBLE_ELEMENTS = {"script", "style", "noscript", "template"}
+# from midnight UTC to the end of the day in the last timezone (UTC-12)
+_DATE_ONLY_LASTMOD_MARGIN = timedelta(hours=36)
+
+
+def normalize_url(url: str) -> str:
+    """Normalized form of the URL used to check if a page was already seen, e.g.
+    `HTTPS://Docs.Example.com:443/a#intro` and `https://docs.example.com/a` are the
+    same page"""
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port != _DEFAULT_PORTS.get(scheme):
+        netloc += f":{parsed.port}"
+    return urlunparse((scheme, netloc, parsed.path or "/", "", parsed.query, ""))
+
+
+def looks_js_rendered(soup: BeautifulSoup) -> bool:
+    """Whether the HTML as served (without running any JavaScript) is missing the
+    content of the page, meaning that it has to be rendered in a browser"""
+    if soup.body is None:
+        return True
+
+    visible_text_len = sum(
+        len(text.strip())
+        for text in soup.body.find_all(string=True)
+        if text.parent is None or text.parent.name not in _NON_VISIBLE_ELEMENTS
+    )
+    if visible_text_len < _MIN_STATIC_TEXT_CHARS:
+        return True
+
+    for selector in _SPA_ROOT_SELECTORS:
+        spa_root = soup.select_one(selector)
+        if (
+            spa_root is not None
+            and len(spa_root.get_text(strip=True)) < _MIN_STATIC_TEXT_CHARS
+        ):
+            return True
+
+    return False
+
+
+class CrawlFrontier:
+    """URLs left to visit, in the order they were found. Every (normalized) URL is only
+    ever handed out once."""
+
+    def __init__(self, urls: list[str] | None = None) -> None:
+        self._to_visit: deque[str] = deque()
+        self._seen: set[str] = set()
+        for url in urls or []:
+            self.add(url)
+
+    def add(self, url: str) -> bool:
+        """Returns False if the URL has already been seen"""
+        normalized_url = normalize_url(url)
+        if normalized_url in self._seen:
+            return False
+        self._seen.add(normalized_url)
+        self._to_visit.append(url)
+        return True
+
+    def mark_seen(self, url: str) -> bool:
+        """For URLs reached without going through the frontier (e.g. redirects).
+        Returns False if the URL has already been seen"""
+        normalized_url = normalize_url(url)
+        if normalized_url in self._seen:
+            return False
+        self._seen.add(normalized_url)
+        return True
+
+    def pop(self) -> str | None:
+        return self._to_visit.popleft() if self._to_visit else None
+
+    def __len__(self) -> int:
+        return len(self._to_visit)
+
+
+class HostRateLimiter:
+    """Politeness limits for crawling: at most `max_concurrent_per_host` requests in
+    flight to a single host, and at least `min_interval_seconds` between the start of
+    two requests to it"""
+
+    def __init__(
+        self, max_concurrent_per_host: int, min_interval_seconds: float = 0
+    ) -> None:
+        self.max_concurrent_per_host = max_concurrent_per_host
+        self.min_interval_seconds = min_interval_seconds
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._next_request_time: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def limit(self, url: str) -> AsyncIterator[None]:
+        host = (urlparse(url).hostname or "").lower()
+        semaphore = self._semaphores.setdefault(
+            host, asyncio.Semaphore(self.max_concurrent_per_host)
+        )
+        async with semaphore:
+            if self.min_interval_seconds:
+                now = time.monotonic()
+                request_time = max(now, self._next_request_time.get(host, now))
+                self._next_request_time[host] = request_time + self.min_interval_seconds
+                await asyncio.sleep(request_time - now)
+            yield
+
+
+class PageStateStore:
+    """Per URL state from the previous crawls of a site: the `etag` and `last_modified`
+    response headers, the `content_hash` of the indexed text and the internal `links`
+    found on the page (recursive crawls only).
+
+    Every page is its own value in the connector state, so a crawl only reads the
+    states of the pages it visits and only writes the ones that changed. Without a
+    `state_store` (i.e. outside of an index attempt) the states are only kept in
+    memory."""
+
+    def __init__(self, state_store: ConnectorStateStore | None) -> None:
+        self._state_store = state_store
+        self._page_states: dict[str, dict[str, Any]] = {}
+        self._changed_urls: set[str] = set()
+
+    @staticmethod
+    def _build_key(url: str) -> str:
+        # URLs can be longer than what fits in an index entry
+        return "page_state:" + hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url: str) -> dict[str, Any]:
+        """Should not be modified, use `update` instead"""
+        if url not in self._page_states:
+            key = self._build_key(url)
+            self._page_states[url] = (
+                self._state_store.load([key]).get(key, {})
+                if self._state_store is not None
+                else {}
+            )
+        return self._page_states[url]
+
+    def update(self, url: str, **values: Any) -> None:
+        page_state = self.get(url)
+        if any(page_state.get(field) != value for field, value in values.items()):
+            self._page_states[url] = {**page_state, **values}
+            self._changed_urls.add(url)
+
+    def save(self) -> None:
+        """Writes the states changed since the last call"""
+        if self._state_store is not None:
+            self._state_store.store(
+                {
+                    self._build_key(url): self._page_states[url]
+                    for url in self._changed_urls
+                }
+            )
+        self._changed_urls = set()
+
+
+def parse_sitemap_lastmod(lastmod_str: str) -> datetime | None:
+    """Latest time the page may have been modified at according to its sitemap
+    `<lastmod>`. Sitemaps often only give the date, in which case the page may have
+    been modified up until the end of that day in any timezone. None if not
+    (precisely enough) known."""
+    if "T" not in lastmod_str:
+        # W3C datetime also allows just the year or the month
+        if len(lastmod_str) != len("YYYY-MM-DD"):
+            return None
+        return time_str_to_utc(lastmod_str) + _DATE_ONLY_LASTMOD_MARGIN
+    return time_str_to_utc(lastmod_str)
+
+
+def get_content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
@@ -11,6 +11,8 @@ from danswer.configs.constants import DocumentSource
 from danswer.connectors.models import InputType
 from danswer.db.models import Connector
 from danswer.db.models import IndexAttempt
+from danswer.db.notifications import IndexingEvent
+from danswer.db.notifications import notify_indexing_event
 from danswer.server.documents.models import ConnectorBase
 from danswer.server.documents.models import ObjectCreationIdResponse
 from danswer.server.models import StatusResponse
@@ -81,6 +83,7 @@ def create_connector(
         disabled=connector_data.disabled,
     )
     db_session.add(connector)
+    notify_indexing_event(db_session, IndexingEvent.CONNECTOR_UPDATED)
     db_session.commit()
 
     return ObjectCreationIdResponse(id=connector.id)
@@ -109,6 +112,7 @@ def update_connector(
     connector.refresh_freq = connector_data.refresh_freq
     connector.disabled = connector_data.disabled
 
+    notify_indexing_event(db_session, IndexingEvent.CONNECTOR_UPDATED)
     db_session.commit()
     return connector
 
@@ -122,6 +126,7 @@ def disable_connector(
         raise HTTPException(status_code=404, detail="Connector does not exist")
 
     connector.disabled = True
+    notify_indexing_event(db_session, IndexingEvent.CONNECTOR_UPDATED)
     db_session.commit()
     return StatusResponse(
         success=True, message="Connector deleted successfully", data=connector_id
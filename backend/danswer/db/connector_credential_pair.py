@@ -3,6 +3,7 @@ from datetime import datetime
 from fastapi import HTTPException
 from sqlalchemy import delete
 from sqlalchemy import select
+from sqlalchemy import tuple_
 from sqlalchemy import update
 from sqlalchemy.orm import Session
 
@@ -11,6 +12,8 @@ from danswer.db.credentials import fetch_credential_by_id
 from danswer.db.models import ConnectorCredentialPair
 from danswer.db.models import IndexingStatus
 from danswer.db.models import User
+from danswer.db.notifications import IndexingEvent
+from danswer.db.notifications import notify_indexing_event
 from danswer.server.models import StatusResponse
 from danswer.utils.logger import setup_logger
 
@@ -96,6 +99,28 @@ def update_connector_credential_pair(
     db_session.commit()
 
 
+def update_connector_credential_pairs_attempt_status(
+    db_session: Session,
+    cc_pair_ids: list[tuple[int, int]],
+    attempt_status: IndexingStatus,
+) -> None:
+    """Bulk version of `update_connector_credential_pair` for just the status"""
+    if not cc_pair_ids:
+        return
+
+    db_session.execute(
+        update(ConnectorCredentialPair)
+        .where(
+            tuple_(
+                ConnectorCredentialPair.connector_id,
+                ConnectorCredentialPair.credential_id,
+            ).in_(cc_pair_ids)
+        )
+        .values(last_attempt_status=attempt_status)
+    )
+    db_session.commit()
+
+
 def delete_connector_credential_pair__no_commit(
     db_session: Session,
     connector_id: int,
@@ -183,6 +208,7 @@ def add_credential_to_connector(
         name=cc_pair_name,
     )
     db_session.add(association)
+    notify_indexing_event(db_session, IndexingEvent.CONNECTOR_UPDATED)
     db_session.commit()
 
     return StatusResponse(
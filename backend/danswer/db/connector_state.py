@@ -0,0 +1,91 @@
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from danswer.db.models import ConnectorCredentialPairState
+
+
+def get_connector_state_values(
+    db_session: Session,
+    connector_id: int,
+    credential_id: int,
+    keys: Sequence[str],
+) -> dict[str, Any]:
+    """Keys without a stored value are left out"""
+    if not keys:
+        return {}
+
+    stmt = select(ConnectorCredentialPairState.key, ConnectorCredentialPairState.value)
+    stmt = stmt.where(
+        ConnectorCredentialPairState.connector_id == connector_id,
+        ConnectorCredentialPairState.credential_id == credential_id,
+        ConnectorCredentialPairState.key.in_(keys),
+    )
+    return {key: value for key, value in db_session.execute(stmt)}
+
+
+def upsert_connector_state_values(
+    db_session: Session,
+    connector_id: int,
+    credential_id: int,
+    values: dict[str, Any],
+) -> None:
+    """NOTE: this function is Postgres specific. Not all DBs support the ON CONFLICT clause."""
+    if not values:
+        return
+
+    insert_stmt = insert(ConnectorCredentialPairState).values(
+        [
+            {
+                "connector_id": connector_id,
+                "credential_id": credential_id,
+                "key": key,
+                "value": value,
+            }
+            for key, value in values.items()
+        ]
+    )
+    on_conflict_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[
+            ConnectorCredentialPairState.connector_id,
+            ConnectorCredentialPairState.credential_id,
+            ConnectorCredentialPairState.key,
+        ],
+        set_={"value": insert_stmt.excluded.value},
+    )
+    db_session.execute(on_conflict_stmt)
+    db_session.commit()
+
+
+def delete_connector_state_values(
+    db_session: Session,
+    connector_id: int,
+    credential_id: int,
+    keys: Sequence[str],
+) -> None:
+    if not keys:
+        return
+
+    stmt = delete(ConnectorCredentialPairState).where(
+        ConnectorCredentialPairState.connector_id == connector_id,
+        ConnectorCredentialPairState.credential_id == credential_id,
+        ConnectorCredentialPairState.key.in_(keys),
+    )
+    db_session.execute(stmt)
+    db_session.commit()
+
+
+def delete_connector_state__no_commit(
+    db_session: Session,
+    connector_id: int,
+    credential_id: int,
+) -> None:
+    stmt = delete(ConnectorCredentialPairState).where(
+        ConnectorCredentialPairState.connector_id == connector_id,
+        ConnectorCredentialPairState.credential_id == credential_id,
+    )
+    db_session.execute(stmt)
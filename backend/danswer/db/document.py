@@ -1,5 +1,10 @@
+import random
+import threading
 import time
+from collections import defaultdict
 from collections.abc import Sequence
+from dataclasses import dataclass
+from dataclasses import replace
 from datetime import datetime
 from uuid import UUID
 
@@ -9,8 +14,12 @@ from sqlalchemy import func
 from sqlalchemy import or_
 from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from danswer.configs.app_configs import DOCUMENT_LOCK_CONTENDED_THRESHOLD_MS
+from danswer.configs.app_configs import DOCUMENT_LOCK_MAX_WAIT_SECONDS
+from danswer.configs.app_configs import DOCUMENT_LOCK_TIMEOUT_MS
 from danswer.configs.constants import DEFAULT_BOOST
 from danswer.db.feedback import delete_document_feedback_for_documents
 from danswer.db.models import ConnectorCredentialPair
@@ -24,6 +33,12 @@ from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Postgres error codes for hitting `lock_timeout` and for being picked as the victim of
+# a deadlock (e.g. with locks the other transaction took earlier), both are retried
+_RETRYABLE_LOCK_PGCODES = ("55P03", "40P01")
+_LOCK_RETRY_BASE_DELAY = 1
+_LOCK_RETRY_MAX_DELAY = 30
+
 
 def get_documents_for_connector_credential_pair(
     db_session: Session, connector_id: int, credential_id: int, limit: int | None = None
@@ -40,6 +55,28 @@ def get_documents_for_connector_credential_pair(
     return db_session.scalars(stmt).all()
 
 
+def get_document_ids_page_for_connector_credential_pair(
+    db_session: Session,
+    connector_id: int,
+    credential_id: int,
+    limit: int,
+    after_document_id: str | None = None,
+) -> list[str]:
+    """Keyset pagination over the IDs of the documents of the connector / credential
+    pair, ordered by ID. Pass in the last ID of the previous page to get the next one.
+    """
+    stmt = select(DocumentByConnectorCredentialPair.id).where(
+        and_(
+            DocumentByConnectorCredentialPair.connector_id == connector_id,
+            DocumentByConnectorCredentialPair.credential_id == credential_id,
+        )
+    )
+    if after_document_id is not None:
+        stmt = stmt.where(DocumentByConnectorCredentialPair.id > after_document_id)
+    stmt = stmt.order_by(DocumentByConnectorCredentialPair.id).limit(limit)
+    return list(db_session.scalars(stmt).all())
+
+
 def get_documents_by_ids(
     document_ids: list[str],
     db_session: Session,
@@ -49,6 +86,24 @@ def get_documents_by_ids(
     return list(documents)
 
 
+def get_document_ids_for_connector_credential_pair(
+    db_session: Session,
+    document_ids: list[str],
+    connector_id: int,
+    credential_id: int,
+) -> set[str]:
+    """Returns the subset of `document_ids` which are already associated with
+    the given connector / credential pair"""
+    stmt = select(DocumentByConnectorCredentialPair.id).where(
+        and_(
+            DocumentByConnectorCredentialPair.id.in_(document_ids),
+            DocumentByConnectorCredentialPair.connector_id == connector_id,
+            DocumentByConnectorCredentialPair.credential_id == credential_id,
+        )
+    )
+    return set(db_session.scalars(stmt).all())
+
+
 def get_document_connector_cnts(
     db_session: Session,
     document_ids: list[str],
@@ -230,6 +285,21 @@ def update_docs_updated_at(
     db_session.commit()
 
 
+def update_docs_content_hash(
+    ids_to_content_hash: dict[str, str],
+    db_session: Session,
+) -> None:
+    doc_ids = list(ids_to_content_hash.keys())
+    documents_to_update = (
+        db_session.query(DbDocument).filter(DbDocument.id.in_(doc_ids)).all()
+    )
+
+    for document in documents_to_update:
+        document.content_hash = ids_to_content_hash[document.id]
+
+    db_session.commit()
+
+
 def upsert_documents_complete(
     db_session: Session,
     document_metadata_batch: list[DocumentMetadata],
@@ -276,46 +346,165 @@ def delete_documents_complete(db_session: Session, document_ids: list[str]) -> N
     db_session.commit()
 
 
-def acquire_document_locks(db_session: Session, document_ids: list[str]) -> bool:
-    """Acquire locks for the specified documents. Ideally this shouldn't be
-    called with large list of document_ids (an exception could be made if the
-    length of holding the lock is very short).
+@dataclass
+class DocumentLockStats:
+    """Per caller stats about acquiring document locks (for this process)"""
 
-    Will simply raise an exception if any of the documents are already locked.
-    This prevents deadlocks (assuming that the caller passes in all required
-    document IDs in a single call).
-    """
-    stmt = (
-        select(DbDocument)
-        .where(DbDocument.id.in_(document_ids))
-        .with_for_update(nowait=True)
-    )
-    # will raise exception if any of the documents are already locked
-    db_session.execute(stmt)
-    return True
+    num_acquisitions: int = 0
+    num_failures: int = 0
+    # every attempt at taking the locks, with the time its locking query spent waiting
+    # on other transactions (as measured by Postgres)
+    num_attempts: int = 0
+    # attempts which waited longer than the contended threshold
+    num_contended_attempts: int = 0
+    total_lock_wait_seconds: float = 0.0
+    max_lock_wait_seconds: float = 0.0
+    # from the first attempt until the locks were acquired / given up on, including
+    # the backoff between attempts
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+_document_lock_stats: dict[str, DocumentLockStats] = defaultdict(DocumentLockStats)
+_document_lock_stats_lock = threading.Lock()
+
+
+def get_document_lock_stats() -> dict[str, DocumentLockStats]:
+    with _document_lock_stats_lock:
+        return {
+            caller: replace(stats) for caller, stats in _document_lock_stats.items()
+        }
 
 
-_NUM_LOCK_ATTEMPTS = 10
-_LOCK_RETRY_DELAY = 30
+def _record_document_lock_attempt(
+    caller: str, lock_wait_seconds: float, contended: bool
+) -> None:
+    with _document_lock_stats_lock:
+        stats = _document_lock_stats[caller]
+        stats.num_attempts += 1
+        if contended:
+            stats.num_contended_attempts += 1
+        stats.total_lock_wait_seconds += lock_wait_seconds
+        stats.max_lock_wait_seconds = max(
+            stats.max_lock_wait_seconds, lock_wait_seconds
+        )
+
+
+def _record_document_lock_result(
+    caller: str, wait_seconds: float, acquired: bool
+) -> None:
+    with _document_lock_stats_lock:
+        stats = _document_lock_stats[caller]
+        if acquired:
+            stats.num_acquisitions += 1
+        else:
+            stats.num_failures += 1
+        stats.total_wait_seconds += wait_seconds
+        stats.max_wait_seconds = max(stats.max_wait_seconds, wait_seconds)
+
 
+def acquire_document_locks(
+    db_session: Session,
+    document_ids: list[str],
+    lock_timeout_ms: int = DOCUMENT_LOCK_TIMEOUT_MS,
+) -> tuple[bool, float]:
+    """Acquire locks for the specified documents. Ideally this shouldn't be
+    called with large list of document_ids (an exception could be made if the
+    length of holding the lock is very short).
 
-def prepare_to_modify_documents(db_session: Session, document_ids: list[str]) -> None:
+    Locks are taken in document ID order, so two callers blocking on each other can't
+    deadlock. Waits at most `lock_timeout_ms` for documents locked by another
+    transaction, then gives up without holding any of the locks (the rest of the
+    transaction is left untouched). Returns whether the locks were acquired and how
+    long the locking query waited for them in seconds."""
+    previous_lock_timeout = db_session.scalar(
+        select(func.current_setting("lock_timeout"))
+    )
+    # savepoint so that a timeout doesn't abort the caller's transaction
+    savepoint = db_session.begin_nested()
+    try:
+        # `clock_timestamp()` is the actual time rather than the start of the
+        # transaction, it is taken by the statements right before and after the
+        # locking query so that the wait doesn't need any extra round trips
+        lock_start = db_session.execute(
+            select(
+                func.set_config("lock_timeout", f"{lock_timeout_ms}ms", True),
+                func.clock_timestamp(),
+            )
+        ).one()[1]
+        db_session.execute(
+            select(DbDocument.id)
+            .where(DbDocument.id.in_(sorted(set(document_ids))))
+            .order_by(DbDocument.id)
+            .with_for_update()
+        )
+        lock_end = db_session.execute(
+            select(
+                func.set_config("lock_timeout", previous_lock_timeout, True),
+                func.clock_timestamp(),
+            )
+        ).one()[1]
+        savepoint.commit()
+        return True, (lock_end - lock_start).total_seconds()
+    except OperationalError as e:
+        savepoint.rollback()
+        if getattr(e.orig, "pgcode", None) not in _RETRYABLE_LOCK_PGCODES:
+            raise
+        lock_end = db_session.scalar(select(func.clock_timestamp()))
+        return False, (lock_end - lock_start).total_seconds()
+
+
+def prepare_to_modify_documents(
+    db_session: Session,
+    document_ids: list[str],
+    caller: str = "unknown",
+    max_wait_seconds: float = DOCUMENT_LOCK_MAX_WAIT_SECONDS,
+    contended_threshold_ms: int = DOCUMENT_LOCK_CONTENDED_THRESHOLD_MS,
+) -> None:
     """Try and acquire locks for the documents to prevent other jobs from
     modifying them at the same time (e.g. avoid race conditions). This should be
     called ahead of any modification to Vespa. Locks should be released by the
-    caller as soon as updates are complete by finishing the transaction."""
-    lock_acquired = False
-    for _ in range(_NUM_LOCK_ATTEMPTS):
-        try:
-            lock_acquired = acquire_document_locks(
-                db_session=db_session, document_ids=document_ids
+    caller as soon as updates are complete by finishing the transaction.
+
+    Retries with jittered exponential backoff until `max_wait_seconds` have passed.
+    Wait times / contention are tracked per `caller`, see `get_document_lock_stats`.
+    An attempt counts as contended if its locking query waited for longer than
+    `contended_threshold_ms`, even if it did acquire the locks."""
+    start_time = time.monotonic()
+    attempt_num = 0
+    while True:
+        acquired, lock_wait_seconds = acquire_document_locks(
+            db_session=db_session, document_ids=document_ids
+        )
+        _record_document_lock_attempt(
+            caller,
+            lock_wait_seconds,
+            contended=lock_wait_seconds * 1000 > contended_threshold_ms,
+        )
+        if acquired:
+            wait_seconds = time.monotonic() - start_time
+            _record_document_lock_result(caller, wait_seconds, acquired=True)
+            if attempt_num > 0:
+                logger.info(
+                    f"Acquired locks for {len(document_ids)} documents for '{caller}' "
+                    f"after {attempt_num + 1} attempts / {wait_seconds:.1f}s"
+                )
+            return
+
+        wait_seconds = time.monotonic() - start_time
+        backoff = random.uniform(
+            0, min(_LOCK_RETRY_MAX_DELAY, _LOCK_RETRY_BASE_DELAY * 2**attempt_num)
+        )
+        if wait_seconds + backoff > max_wait_seconds:
+            _record_document_lock_result(caller, wait_seconds, acquired=False)
+            raise RuntimeError(
+                f"Failed to acquire locks for '{caller}' after {attempt_num + 1} "
+                f"attempts / {wait_seconds:.1f}s for documents: {document_ids}"
             )
-        except Exception as e:
-            logger.info(f"Failed to acquire locks for documents, retrying. Error: {e}")
-            time.sleep(_LOCK_RETRY_DELAY)
-
-    if not lock_acquired:
-        raise RuntimeError(
-            f"Failed to acquire locks after {_NUM_LOCK_ATTEMPTS} attempts "
-            f"for documents: {document_ids}"
+
+        logger.info(
+            f"Documents are locked by another job, '{caller}' retrying in "
+            f"{backoff:.1f}s"
         )
+        time.sleep(backoff)
+        attempt_num += 1
@@ -1,3 +1,4 @@
+from collections.abc import Collection
 from collections.abc import Sequence
 from typing import cast
 from uuid import UUID
@@ -232,6 +233,11 @@ def mark_cc_pair__document_set_relationships_to_be_deleted__no_commit(
 
     document_set_ids_touched: set[int] = set()
     for document_set__cc_pair_relationship in document_set__cc_pair_relationships:
+        document_set_ids_touched.add(document_set__cc_pair_relationship.document_set_id)
+        if not document_set__cc_pair_relationship.is_current:
+            # already marked by an earlier (interrupted) deletion of this CC pair
+            continue
+
         document_set__cc_pair_relationship.is_current = False
 
         if not document_set__cc_pair_relationship.document_set.is_up_to_date:
@@ -242,7 +248,6 @@ def mark_cc_pair__document_set_relationships_to_be_deleted__no_commit(
             )
 
         document_set__cc_pair_relationship.document_set.is_up_to_date = False
-        document_set_ids_touched.add(document_set__cc_pair_relationship.document_set_id)
 
     return document_set_ids_touched
 
@@ -340,6 +345,52 @@ def fetch_documents_for_document_set(
     return db_session.scalars(stmt).all()
 
 
+def fetch_changed_cc_pair_ids_for_document_set(
+    document_set_id: int, db_session: Session
+) -> set[int]:
+    """Returns the IDs of the CC pairs which were added to or removed from the document
+    set since it was last synced. Only documents from these CC pairs can have a
+    different set of document sets than what is currently in the document index.
+
+    Pairs that are both in the prior (`is_current=False`) and the current state of the
+    document set are unchanged."""
+    rows = db_session.execute(
+        select(
+            DocumentSet__ConnectorCredentialPair.connector_credential_pair_id,
+            DocumentSet__ConnectorCredentialPair.is_current,
+        ).where(DocumentSet__ConnectorCredentialPair.document_set_id == document_set_id)
+    ).all()
+
+    current_cc_pair_ids = {cc_pair_id for cc_pair_id, is_current in rows if is_current}
+    prior_cc_pair_ids = {
+        cc_pair_id for cc_pair_id, is_current in rows if not is_current
+    }
+    return current_cc_pair_ids ^ prior_cc_pair_ids
+
+
+def fetch_document_ids_for_cc_pairs(
+    cc_pair_ids: Collection[int], db_session: Session
+) -> list[str]:
+    if not cc_pair_ids:
+        return []
+
+    stmt = (
+        select(DocumentByConnectorCredentialPair.id)
+        .join(
+            ConnectorCredentialPair,
+            and_(
+                ConnectorCredentialPair.connector_id
+                == DocumentByConnectorCredentialPair.connector_id,
+                ConnectorCredentialPair.credential_id
+                == DocumentByConnectorCredentialPair.credential_id,
+            ),
+        )
+        .where(ConnectorCredentialPair.id.in_(cc_pair_ids))
+        .distinct()
+    )
+    return list(db_session.scalars(stmt).all())
+
+
 def fetch_document_sets_for_documents(
     document_ids: list[str], db_session: Session
 ) -> Sequence[tuple[str, list[str]]]:
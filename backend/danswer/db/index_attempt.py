@@ -1,17 +1,25 @@
 from collections.abc import Sequence
+from typing import Any
 
 from sqlalchemy import and_
 from sqlalchemy import ColumnElement
 from sqlalchemy import delete
 from sqlalchemy import desc
 from sqlalchemy import func
+from sqlalchemy import insert
 from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import Subquery
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import Session
 
+from danswer.db.models import Connector
+from danswer.db.models import ConnectorCredentialPair
 from danswer.db.models import IndexAttempt
+from danswer.db.models import IndexingPriority
 from danswer.db.models import IndexingStatus
+from danswer.db.notifications import IndexingEvent
+from danswer.db.notifications import notify_indexing_event
 from danswer.server.documents.models import ConnectorCredentialPairIdentifier
 from danswer.utils.logger import setup_logger
 from danswer.utils.telemetry import optional_telemetry
@@ -31,18 +39,58 @@ def create_index_attempt(
     connector_id: int,
     credential_id: int,
     db_session: Session,
+    priority: IndexingPriority = IndexingPriority.INCREMENTAL,
 ) -> int:
     new_attempt = IndexAttempt(
         connector_id=connector_id,
         credential_id=credential_id,
         status=IndexingStatus.NOT_STARTED,
+        priority=priority,
     )
     db_session.add(new_attempt)
+    notify_indexing_event(db_session, IndexingEvent.ATTEMPT_CREATED)
     db_session.commit()
 
     return new_attempt.id
 
 
+def get_index_attempts(
+    db_session: Session, index_attempt_ids: list[int]
+) -> list[IndexAttempt]:
+    if not index_attempt_ids:
+        return []
+    stmt = select(IndexAttempt).where(IndexAttempt.id.in_(index_attempt_ids))
+    return list(db_session.scalars(stmt).all())
+
+
+def create_index_attempts(
+    cc_pair_ids: list[tuple[int, int]],
+    db_session: Session,
+    priority: IndexingPriority = IndexingPriority.INCREMENTAL,
+) -> list[int]:
+    """Creates a new, not started, attempt for each (connector_id, credential_id) with
+    a single insert"""
+    if not cc_pair_ids:
+        return []
+
+    new_attempt_ids = db_session.scalars(
+        insert(IndexAttempt).returning(IndexAttempt.id),
+        [
+            {
+                "connector_id": connector_id,
+                "credential_id": credential_id,
+                "status": IndexingStatus.NOT_STARTED,
+                "priority": priority,
+            }
+            for connector_id, credential_id in cc_pair_ids
+        ],
+    ).all()
+    notify_indexing_event(db_session, IndexingEvent.ATTEMPT_CREATED)
+    db_session.commit()
+
+    return list(new_attempt_ids)
+
+
 def get_inprogress_index_attempts(
     connector_id: int | None,
     db_session: Session,
@@ -84,6 +132,7 @@ def mark_attempt_succeeded(
 ) -> None:
     index_attempt.status = IndexingStatus.SUCCESS
     db_session.add(index_attempt)
+    notify_indexing_event(db_session, IndexingEvent.ATTEMPT_FINISHED)
     db_session.commit()
 
 
@@ -93,6 +142,7 @@ def mark_attempt_failed(
     index_attempt.status = IndexingStatus.FAILED
     index_attempt.error_msg = failure_reason
     db_session.add(index_attempt)
+    notify_indexing_event(db_session, IndexingEvent.ATTEMPT_FINISHED)
     db_session.commit()
 
     source = index_attempt.connector.source
@@ -112,6 +162,70 @@ def update_docs_indexed(
     db_session.commit()
 
 
+def update_batch_size_stats(
+    db_session: Session,
+    index_attempt: IndexAttempt,
+    batch_size_stats: dict[str, Any],
+) -> None:
+    index_attempt.batch_size_stats = batch_size_stats
+
+    db_session.add(index_attempt)
+    db_session.commit()
+
+
+def update_peak_resource_usage(
+    db_session: Session,
+    index_attempt: IndexAttempt,
+    peak_rss_mb: int,
+    peak_cpu_percent: float,
+) -> None:
+    index_attempt.peak_rss_mb = peak_rss_mb
+    index_attempt.peak_cpu_percent = peak_cpu_percent
+
+    db_session.add(index_attempt)
+    db_session.commit()
+
+
+def update_index_attempt_checkpoint(
+    db_session: Session,
+    index_attempt: IndexAttempt,
+    checkpoint: str | None,
+) -> None:
+    index_attempt.checkpoint = checkpoint
+
+    db_session.add(index_attempt)
+    db_session.commit()
+
+
+def get_checkpoint_to_resume_from(
+    index_attempt: IndexAttempt, db_session: Session
+) -> str | None:
+    """If the attempt before this one for the same connector / credential pair failed
+    part way through, returns the checkpoint it reached. Not resumed if the connector
+    has been changed since, as the checkpoint may no longer be valid."""
+    stmt = (
+        select(IndexAttempt)
+        .where(IndexAttempt.connector_id == index_attempt.connector_id)
+        .where(IndexAttempt.credential_id == index_attempt.credential_id)
+        .where(IndexAttempt.id != index_attempt.id)
+        .where(IndexAttempt.time_created <= index_attempt.time_created)
+        .order_by(desc(IndexAttempt.time_created))
+        .limit(1)
+    )
+    previous_attempt = db_session.scalars(stmt).first()
+    if (
+        previous_attempt is None
+        or previous_attempt.status != IndexingStatus.FAILED
+        or previous_attempt.checkpoint is None
+    ):
+        return None
+
+    if index_attempt.connector.time_updated > previous_attempt.time_created:
+        return None
+
+    return previous_attempt.checkpoint
+
+
 def get_last_attempt(
     connector_id: int,
     credential_id: int,
@@ -126,6 +240,76 @@ def get_last_attempt(
     return db_session.execute(stmt).scalars().first()
 
 
+def _latest_index_attempt_subquery() -> Subquery:
+    """Most recently created attempt for each connector / credential pair, in a single
+    pass over the `ix_index_attempt_latest_for_connector_credential_pair` index"""
+    ranked_attempts = select(
+        IndexAttempt.connector_id,
+        IndexAttempt.credential_id,
+        IndexAttempt.status,
+        IndexAttempt.time_updated,
+        func.row_number()
+        .over(
+            partition_by=(IndexAttempt.connector_id, IndexAttempt.credential_id),
+            order_by=desc(IndexAttempt.time_created),
+        )
+        .label("attempt_rank"),
+    ).subquery()
+
+    return (
+        select(ranked_attempts)
+        .where(ranked_attempts.c.attempt_rank == 1)
+        .subquery("latest_index_attempt")
+    )
+
+
+def get_cc_pairs_due_for_indexing(
+    db_session: Session,
+    exclude_cc_pair_ids: set[tuple[int, int]] | None = None,
+) -> list[ConnectorCredentialPair]:
+    """Returns every connector / credential pair for which a new indexing attempt
+    should be created. A pair is due if its connector is enabled and has a
+    `refresh_freq`, and its latest attempt either doesn't exist or has not just been
+    scheduled (status not NOT_STARTED) and was last updated at least `refresh_freq`
+    seconds ago, all computed in a single query against the DB clock."""
+    latest_attempt = _latest_index_attempt_subquery()
+
+    stmt = (
+        select(ConnectorCredentialPair)
+        .join(Connector, Connector.id == ConnectorCredentialPair.connector_id)
+        .outerjoin(
+            latest_attempt,
+            and_(
+                latest_attempt.c.connector_id == ConnectorCredentialPair.connector_id,
+                latest_attempt.c.credential_id == ConnectorCredentialPair.credential_id,
+            ),
+        )
+        .where(Connector.disabled.is_(False))
+        .where(Connector.refresh_freq.is_not(None))
+        .where(
+            or_(
+                latest_attempt.c.connector_id.is_(None),
+                and_(
+                    latest_attempt.c.status != IndexingStatus.NOT_STARTED,
+                    latest_attempt.c.time_updated
+                    <= func.now()
+                    - func.make_interval(0, 0, 0, 0, 0, 0, Connector.refresh_freq),
+                ),
+            )
+        )
+        .order_by(
+            ConnectorCredentialPair.connector_id, ConnectorCredentialPair.credential_id
+        )
+    )
+
+    exclude_cc_pair_ids = exclude_cc_pair_ids or set()
+    return [
+        cc_pair
+        for cc_pair in db_session.scalars(stmt).all()
+        if (cc_pair.connector_id, cc_pair.credential_id) not in exclude_cc_pair_ids
+    ]
+
+
 def get_latest_index_attempts(
     connector_credential_pair_identifiers: list[ConnectorCredentialPairIdentifier],
     db_session: Session,
@@ -45,6 +45,14 @@ class IndexingStatus(str, PyEnum):
     FAILED = "failed"
 
 
+class IndexingPriority(str, PyEnum):
+    """Classes in order of precedence when picking which attempt to start next"""
+
+    MANUAL = "manual"  # triggered via "run once"
+    INCREMENTAL = "incremental"  # scheduled poll of a previously indexed pair
+    FULL_REINDEX = "full_reindex"  # scheduled run of a pair never indexed before
+
+
 # these may differ in the future, which is why we're okay with this duplication
 class DeletionStatus(str, PyEnum):
     NOT_STARTED = "not_started"
@@ -234,6 +242,10 @@ class Document(Base):
     doc_updated_at: Mapped[datetime.datetime | None] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
+    # Fingerprint of the indexed content (sections, title, metadata, owners) of the
+    # last successfully indexed version of the doc, used to skip re-indexing unchanged
+    # docs for connectors that don't provide reliable update times
+    content_hash: Mapped[str | None] = mapped_column(String, nullable=True)
     # The following are not attached to User because the account/email may not be known
     # within Danswer
     # Something like the document creator
@@ -338,6 +350,20 @@ class IndexAttempt(Base):
     error_msg: Mapped[str | None] = mapped_column(
         Text, default=None
     )  # only filled if status = "failed"
+    # null for attempts created before priorities existed, treated as INCREMENTAL
+    priority: Mapped[IndexingPriority | None] = mapped_column(
+        Enum(IndexingPriority, native_enum=False), nullable=True
+    )
+    # Connector checkpoint after the last committed batch, a failed attempt is resumed
+    # from here by the next attempt (only for connectors which support checkpoints)
+    checkpoint: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Peak memory (including child processes) / CPU usage of the indexing job
+    peak_rss_mb: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    peak_cpu_percent: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # Summary of the document batch sizes chosen by adaptive batching, if enabled
+    batch_size_stats: Mapped[dict[str, Any] | None] = mapped_column(
+        postgresql.JSONB(), nullable=True
+    )
     time_created: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -402,6 +428,23 @@ class DocumentByConnectorCredentialPair(Base):
     )
 
 
+class ConnectorCredentialPairState(Base):
+    """State kept by a connector between runs for a specific connector / credential
+    pair (see `StatefulConnector`). Split up into many small values, so that a run only
+    reads and writes the values it needs"""
+
+    __tablename__ = "connector_credential_pair_state"
+
+    connector_id: Mapped[int] = mapped_column(
+        ForeignKey("connector.id"), primary_key=True
+    )
+    credential_id: Mapped[int] = mapped_column(
+        ForeignKey("credential.id"), primary_key=True
+    )
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[Any] = mapped_column(postgresql.JSONB())
+
+
 """
 Messages Tables
 """
@@ -718,3 +761,8 @@ class TaskQueueState(Base):
     register_time: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    # Task specific progress information, e.g. the number of documents processed so
+    # far by a connector deletion
+    progress: Mapped[dict[str, Any] | None] = mapped_column(
+        postgresql.JSONB(), nullable=True
+    )
@@ -0,0 +1,96 @@
+"""Thin wrapper around Postgres LISTEN / NOTIFY, used to wake up background processes
+(e.g. the indexing scheduler) as soon as something relevant changes rather than having
+them constantly poll Postgres."""
+import select
+from enum import Enum
+
+import psycopg2
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from danswer.configs.app_configs import POSTGRES_DB
+from danswer.configs.app_configs import POSTGRES_HOST
+from danswer.configs.app_configs import POSTGRES_PASSWORD
+from danswer.configs.app_configs import POSTGRES_PORT
+from danswer.configs.app_configs import POSTGRES_USER
+
+
+class NotificationChannel(str, Enum):
+    INDEXING = "danswer_indexing"
+
+
+class IndexingEvent(str, Enum):
+    ATTEMPT_CREATED = "attempt_created"
+    ATTEMPT_FINISHED = "attempt_finished"
+    CONNECTOR_UPDATED = "connector_updated"
+
+
+def notify(db_session: Session, channel: NotificationChannel, payload: str) -> None:
+    """Queues a notification on the channel. Postgres only delivers it to listeners
+    once the current transaction commits (and drops it on rollback), so this should be
+    called before the commit of the change it describes."""
+    db_session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel.value, "payload": payload},
+    )
+
+
+def notify_indexing_event(db_session: Session, event: IndexingEvent) -> None:
+    notify(db_session=db_session, channel=NotificationChannel.INDEXING, payload=event)
+
+
+class PostgresListener:
+    """Holds a dedicated connection (outside of the SQLAlchemy pool, since the LISTEN
+    is tied to the connection) subscribed to the given channels."""
+
+    def __init__(self, channels: list[NotificationChannel]) -> None:
+        self.channels = channels
+        self._conn: PGConnection | None = None
+
+    def connect(self) -> None:
+        """Notifications are only received from the point the LISTEN is issued, so
+        this should be called before the initial state is read"""
+        self.close()
+        self._conn = self._connect()
+
+    def _connect(self) -> PGConnection:
+        conn = psycopg2.connect(
+            host=POSTGRES_HOST,
+            port=POSTGRES_PORT,
+            user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD,
+            dbname=POSTGRES_DB,
+        )
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            for channel in self.channels:
+                cursor.execute(f"LISTEN {channel.value};")
+        return conn
+
+    def wait(self, timeout: float) -> list[str]:
+        """Blocks until at least one notification arrives or `timeout` seconds pass.
+        Returns the payloads of all pending notifications. Raises if the connection
+        is lost, the next call will reconnect."""
+        if self._conn is None or self._conn.closed:
+            self.connect()
+        assert self._conn is not None
+
+        try:
+            ready, _, _ = select.select([self._conn], [], [], timeout)
+            if not ready:
+                return []
+
+            self._conn.poll()
+            payloads = [notification.payload for notification in self._conn.notifies]
+            self._conn.notifies.clear()
+            return payloads
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
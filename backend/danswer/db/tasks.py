@@ -1,3 +1,5 @@
+from typing import Any
+
 from sqlalchemy import desc
 from sqlalchemy import func
 from sqlalchemy import select
@@ -66,6 +68,19 @@ def mark_task_finished(
     db_session.commit()
 
 
+def update_task_progress(
+    task_name: str,
+    progress: dict[str, Any],
+    db_session: Session,
+) -> None:
+    latest_task = get_latest_task(task_name, db_session)
+    if latest_task is None:
+        raise ValueError(f"tasks for {task_name} do not exist")
+
+    latest_task.progress = progress
+    db_session.commit()
+
+
 def check_live_task_not_timed_out(
     task: TaskQueueState,
     db_session: Session,
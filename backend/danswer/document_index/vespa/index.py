@@ -37,6 +37,7 @@ from danswer.configs.constants import DOCUMENT_ID
 from danswer.configs.constants import DOCUMENT_SETS
 from danswer.configs.constants import EMBEDDINGS
 from danswer.configs.constants import HIDDEN
+from danswer.configs.constants import LLM_TOKEN_COUNT
 from danswer.configs.constants import METADATA
 from danswer.configs.constants import PRIMARY_OWNERS
 from danswer.configs.constants import RECENCY_BIAS
@@ -258,6 +259,7 @@ def _index_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
         # element an arbitrary weight
         ACCESS_CONTROL_LIST: {acl_entry: 1 for acl_entry in chunk.access.to_acl()},
         DOCUMENT_SETS: {document_set: 1 for document_set in chunk.document_sets},
+        LLM_TOKEN_COUNT: chunk.llm_token_count,
     }
 
     def _index_chunk(
@@ -517,6 +519,7 @@ def _vespa_hit_to_inference_chunk(hit: dict[str, Any]) -> InferenceChunk:
         metadata=metadata,
         match_highlights=match_highlights,
         updated_at=updated_at,
+        llm_token_count=fields.get(LLM_TOKEN_COUNT),
     )
 
 
@@ -584,6 +587,7 @@ class VespaIndex(DocumentIndex):
         f"{PRIMARY_OWNERS}, "
         f"{SECONDARY_OWNERS}, "
         f"{METADATA}, "
+        f"{LLM_TOKEN_COUNT}, "
         f"{CONTENT_SUMMARY} "
         f"from {DOCUMENT_INDEX_NAME} where "
     )
@@ -653,9 +657,13 @@ class VespaIndex(DocumentIndex):
                         raise requests.HTTPError(failure_msg) from e
 
     def update(self, update_requests: list[UpdateRequest]) -> None:
-        logger.info(f"Updating {len(update_requests)} documents in Vespa")
+        logger.info(
+            f"Updating {sum(len(request.document_ids) for request in update_requests)} "
+            "documents in Vespa"
+        )
         start = time.time()
 
+        update_dicts_by_document_id: list[tuple[str, dict[str, dict]]] = []
         processed_updates_requests: list[_VespaUpdateRequest] = []
         for update_request in update_requests:
             update_dict: dict[str, dict] = {"fields": {}}
@@ -681,7 +689,21 @@ class VespaIndex(DocumentIndex):
                 continue
 
             for document_id in update_request.document_ids:
-                for doc_chunk_id in _get_vespa_chunk_ids_by_document_id(document_id):
+                update_dicts_by_document_id.append((document_id, update_dict))
+
+        # looking up the chunks of each document is a separate query, run them in
+        # parallel rather than one after the other
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=_NUM_THREADS
+        ) as executor:
+            chunk_ids_by_document = executor.map(
+                _get_vespa_chunk_ids_by_document_id,
+                [document_id for document_id, _ in update_dicts_by_document_id],
+            )
+            for (document_id, update_dict), doc_chunk_ids in zip(
+                update_dicts_by_document_id, chunk_ids_by_document
+            ):
+                for doc_chunk_id in doc_chunk_ids:
                     processed_updates_requests.append(
                         _VespaUpdateRequest(
                             document_id=document_id,
@@ -697,6 +719,9 @@ class VespaIndex(DocumentIndex):
 
     def delete(self, doc_ids: list[str]) -> None:
         logger.info(f"Deleting {len(doc_ids)} documents from Vespa")
+        # the chunks of every document are looked up through the `document_id`
+        # attribute and deleted by ID. A selection based delete would be simpler, but
+        # visits every document in the content cluster
         _delete_vespa_docs(doc_ids)
 
     def id_based_retrieval(
@@ -1,22 +1,27 @@
-from sentence_transformers import SentenceTransformer  # type: ignore
-
 from danswer.configs.app_configs import ENABLE_MINI_CHUNK
 from danswer.configs.model_configs import ASYM_PASSAGE_PREFIX
 from danswer.configs.model_configs import BATCH_SIZE_ENCODE_CHUNKS
+from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
+from danswer.configs.model_configs import EMBEDDING_BATCH_TOKEN_BUDGET
+from danswer.configs.model_configs import MAX_BATCH_SIZE_ENCODE_CHUNKS
 from danswer.indexing.chunker import split_chunk_text_into_mini_chunks
+from danswer.indexing.embedding_pool import LocalEmbeddingPoolClient
 from danswer.indexing.models import ChunkEmbedding
 from danswer.indexing.models import DocAwareChunk
 from danswer.indexing.models import IndexChunk
 from danswer.search.models import Embedder
 from danswer.search.search_nlp_models import EmbeddingModel
+from danswer.search.search_nlp_models import get_default_tokenizer
+from danswer.utils.batching import apply_length_bucketed
 from danswer.utils.timing import log_function_time
 
 
 @log_function_time()
 def embed_chunks(
     chunks: list[DocAwareChunk],
-    embedding_model: SentenceTransformer | None = None,
+    embedding_model: EmbeddingModel | LocalEmbeddingPoolClient | None = None,
     batch_size: int = BATCH_SIZE_ENCODE_CHUNKS,
+    batch_token_budget: int = EMBEDDING_BATCH_TOKEN_BUDGET,
     enable_mini_chunk: bool = ENABLE_MINI_CHUNK,
     passage_prefix: str = ASYM_PASSAGE_PREFIX,
 ) -> list[IndexChunk]:
@@ -37,17 +42,51 @@ def embed_chunks(
         chunk_texts.extend(prefixed_mini_chunk_texts)
         chunk_mini_chunks_count[chunk_ind] = 1 + len(prefixed_mini_chunk_texts)
 
-    text_batches = [
-        chunk_texts[i : i + batch_size] for i in range(0, len(chunk_texts), batch_size)
-    ]
+    embeddings: list[list[float]]
+    if isinstance(embedding_model, LocalEmbeddingPoolClient):
+        # The pool does its own batching, all texts are passed at once so that the
+        # batches can be embedded in parallel by the workers
+        embeddings = embedding_model.encode(chunk_texts)
+    elif batch_token_budget > 0 and embedding_model.embed_server_endpoint:
+        # The model server groups the texts of each request by token length itself,
+        # so the texts are not tokenized here and are sent in requests as large as
+        # the largest batch the server may build
+        embeddings = []
+        for i in range(0, len(chunk_texts), MAX_BATCH_SIZE_ENCODE_CHUNKS):
+            embeddings.extend(
+                embedding_model.encode(
+                    chunk_texts[i : i + MAX_BATCH_SIZE_ENCODE_CHUNKS]
+                )
+            )
+    elif batch_token_budget > 0:
+        # Group texts of similar token length so that mini-chunks are not padded out
+        # to the length of full chunks, results are returned in the original order
+        tokenizer = get_default_tokenizer()
+        text_lengths = [
+            min(len(tokenizer.tokenize(text)), DOC_EMBEDDING_CONTEXT_SIZE)
+            for text in chunk_texts
+        ]
+        embeddings = apply_length_bucketed(
+            items=chunk_texts,
+            lengths=text_lengths,
+            # Normalize embeddings is only configured via model_configs.py, be sure to use right value for the set loss
+            func=embedding_model.encode,
+            token_budget=batch_token_budget,
+            max_batch_size=MAX_BATCH_SIZE_ENCODE_CHUNKS,
+        )
+    else:
+        text_batches = [
+            chunk_texts[i : i + batch_size]
+            for i in range(0, len(chunk_texts), batch_size)
+        ]
 
-    embeddings: list[list[float]] = []
-    for text_batch in text_batches:
-        # Normalize embeddings is only configured via model_configs.py, be sure to use right value for the set loss
-        embeddings.extend(embedding_model.encode(text_batch))
+        embeddings = []
+        for text_batch in text_batches:
+            # Normalize embeddings is only configured via model_configs.py, be sure to use right value for the set loss
+            embeddings.extend(embedding_model.encode(text_batch))
 
-        # Replace line above with the line below for easy debugging of indexing flow, skipping the actual model
-        # embeddings.extend([[0.0] * 384 for _ in range(len(text_batch))])
+            # Replace line above with the line below for easy debugging of indexing flow, skipping the actual model
+            # embeddings.extend([[0.0] * 384 for _ in range(len(text_batch))])
 
     embedding_ind_start = 0
     for chunk_ind, chunk in enumerate(chunks):
@@ -69,5 +108,11 @@ def embed_chunks(
 
 
 class DefaultEmbedder(Embedder):
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel | LocalEmbeddingPoolClient | None = None,
+    ) -> None:
+        self.embedding_model = embedding_model
+
     def embed(self, chunks: list[DocAwareChunk]) -> list[IndexChunk]:
-        return embed_chunks(chunks)
+        return embed_chunks(chunks, embedding_model=self.embedding_model)
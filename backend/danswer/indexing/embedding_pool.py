@@ -0,0 +1,323 @@
+"""Pool of long-lived local processes which each hold a copy of the embedding model.
+
+Used by the background indexing jobs when there is no model server, so that a single
+large machine can spread the embedding work of a job across all of its cores rather than
+each job encoding inline in its own process.
+
+The texts to embed are sent to the workers over a shared task queue and the resulting
+embeddings are written by the workers directly into a shared memory block owned by the
+requesting client, so only a small completion message is sent back over the result queue.
+
+NOTE: the pool must be started from the main background process and its task queue can
+only be shared via inheritance. Clients are either handed to the indexing jobs as
+process args, or (for long-lived processes which receive their jobs over a queue) the
+process is given the task queue with `set_inherited_task_queue` when it is started and
+the clients are created without it. This means it is not usable with the Dask job
+client."""
+import queue
+import uuid
+from dataclasses import dataclass
+from multiprocessing.managers import SyncManager
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+import numpy as np
+import torch
+from torch import multiprocessing
+
+from danswer.configs.model_configs import BATCH_SIZE_ENCODE_CHUNKS
+from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
+from danswer.configs.model_configs import DOC_EMBEDDING_DIM
+from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.configs.model_configs import EMBEDDING_BATCH_TOKEN_BUDGET
+from danswer.configs.model_configs import MAX_BATCH_SIZE_ENCODE_CHUNKS
+from danswer.configs.model_configs import NORMALIZE_EMBEDDINGS
+from danswer.search.search_nlp_models import get_default_tokenizer
+from danswer.search.search_nlp_models import get_local_embedding_model
+from danswer.utils.batching import length_bucketed_batch_indices
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# max time to wait on the workers for a single `encode` call before giving up
+_EMBEDDING_RESULT_TIMEOUT = 60 * 10
+_FLOAT32_NUM_BYTES = 4
+
+# task queue passed to this process when it was started, see `set_inherited_task_queue`
+_inherited_task_queue: "multiprocessing.Queue | None" = None
+
+
+@dataclass
+class _EmbeddingTask:
+    task_id: str
+    texts: list[str]
+    normalize_embeddings: bool
+    # name of the shared memory block to write the embeddings into
+    shm_name: str
+    # proxy to the requesting client's result queue
+    result_queue: Any
+
+
+def _embedding_worker_loop(
+    task_queue: multiprocessing.Queue,
+    model_name: str,
+    max_seq_length: int,
+    num_threads: int,
+) -> None:
+    torch.set_num_threads(num_threads)
+    model = get_local_embedding_model(
+        model_name=model_name, max_context_length=max_seq_length
+    )
+    logger.info(f"Local embedding worker started with {num_threads} threads")
+
+    while True:
+        task: _EmbeddingTask | None = task_queue.get()
+        if task is None:
+            return
+
+        try:
+            embeddings = model.encode(
+                task.texts,
+                batch_size=len(task.texts),
+                normalize_embeddings=task.normalize_embeddings,
+            )
+            shm = SharedMemory(name=task.shm_name)
+            try:
+                output: np.ndarray = np.ndarray(
+                    (len(task.texts), DOC_EMBEDDING_DIM),
+                    dtype=np.float32,
+                    buffer=shm.buf,
+                )
+                output[:] = embeddings
+                # the view must be released before the shared memory can be closed
+                del output
+            finally:
+                shm.close()
+            task.result_queue.put((task.task_id, None))
+        except Exception as e:
+            logger.exception(f"Local embedding worker failed to embed texts: {e}")
+            task.result_queue.put((task.task_id, str(e)))
+
+
+def set_inherited_task_queue(task_queue: multiprocessing.Queue) -> None:
+    """Used as the initializer of processes which get the clients without a task queue"""
+    global _inherited_task_queue
+    _inherited_task_queue = task_queue
+
+
+class LocalEmbeddingPoolClient:
+    """Handle to a `LocalEmbeddingPool`, passed to each indexing job. Exposes the same
+    `encode` interface as `EmbeddingModel`.
+
+    Without a `task_queue` the client can be pickled and sent to a process which was
+    given the task queue on startup."""
+
+    def __init__(
+        self,
+        task_queue: "multiprocessing.Queue | None",
+        result_queue: Any,
+        batch_token_budget: int = EMBEDDING_BATCH_TOKEN_BUDGET,
+        batch_size: int = BATCH_SIZE_ENCODE_CHUNKS,
+    ) -> None:
+        self.task_queue = task_queue
+        self.result_queue = result_queue
+        self.batch_token_budget = batch_token_budget
+        self.batch_size = batch_size
+
+    def _build_batches(self, texts: list[str]) -> list[list[int]]:
+        if self.batch_token_budget <= 0:
+            return [
+                list(range(i, min(i + self.batch_size, len(texts))))
+                for i in range(0, len(texts), self.batch_size)
+            ]
+
+        tokenizer = get_default_tokenizer()
+        return length_bucketed_batch_indices(
+            lengths=[
+                min(len(tokenizer.tokenize(text)), DOC_EMBEDDING_CONTEXT_SIZE)
+                for text in texts
+            ],
+            token_budget=self.batch_token_budget,
+            max_batch_size=MAX_BATCH_SIZE_ENCODE_CHUNKS,
+        )
+
+    def encode(
+        self, texts: list[str], normalize_embeddings: bool = NORMALIZE_EMBEDDINGS
+    ) -> list[list[float]]:
+        """All batches are submitted up front so that they are embedded in parallel
+        by all of the workers in the pool, results are in the order of `texts`"""
+        if not texts:
+            return []
+
+        task_queue = (
+            self.task_queue if self.task_queue is not None else _inherited_task_queue
+        )
+        if task_queue is None:
+            raise RuntimeError("No task queue for the local embedding pool")
+
+        pending_tasks: dict[str, tuple[list[int], SharedMemory]] = {}
+        try:
+            for batch_indices in self._build_batches(texts):
+                shm = SharedMemory(
+                    create=True,
+                    size=len(batch_indices) * DOC_EMBEDDING_DIM * _FLOAT32_NUM_BYTES,
+                )
+                task_id = str(uuid.uuid4())
+                pending_tasks[task_id] = (batch_indices, shm)
+                task_queue.put(
+                    _EmbeddingTask(
+                        task_id=task_id,
+                        texts=[texts[ind] for ind in batch_indices],
+                        normalize_embeddings=normalize_embeddings,
+                        shm_name=shm.name,
+                        result_queue=self.result_queue,
+                    )
+                )
+
+            embeddings: list[list[float]] = [[] for _ in texts]
+            remaining_task_ids = set(pending_tasks.keys())
+            while remaining_task_ids:
+                try:
+                    task_id, error = self.result_queue.get(
+                        timeout=_EMBEDDING_RESULT_TIMEOUT
+                    )
+                except queue.Empty:
+                    raise RuntimeError(
+                        "Timed out waiting on the local embedding workers"
+                    )
+
+                # may be a leftover result from a previously failed call
+                if task_id not in remaining_task_ids:
+                    continue
+                remaining_task_ids.remove(task_id)
+
+                if error:
+                    raise RuntimeError(f"Local embedding worker failed: {error}")
+
+                batch_indices, shm = pending_tasks[task_id]
+                batch_embeddings: np.ndarray = np.ndarray(
+                    (len(batch_indices), DOC_EMBEDDING_DIM),
+                    dtype=np.float32,
+                    buffer=shm.buf,
+                )
+                for ind, embedding in zip(batch_indices, batch_embeddings.tolist()):
+                    embeddings[ind] = embedding
+                del batch_embeddings
+
+            return embeddings
+        finally:
+            for _, shm in pending_tasks.values():
+                shm.close()
+                shm.unlink()
+
+
+class LocalEmbeddingPool:
+    def __init__(
+        self,
+        num_workers: int,
+        num_threads_per_worker: int,
+        model_name: str = DOCUMENT_ENCODER_MODEL,
+        max_seq_length: int = DOC_EMBEDDING_CONTEXT_SIZE,
+    ) -> None:
+        self.num_workers = num_workers
+        self.num_threads_per_worker = num_threads_per_worker
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+
+        self._manager: SyncManager | None = None
+        self._task_queue: multiprocessing.Queue | None = None
+        self._workers: list[multiprocessing.Process] = []
+        # result queues live in the manager process until it is shut down, so they
+        # are handed from finished clients to new ones rather than created per job
+        self._free_result_queues: list[Any] = []
+        self._result_queues_in_use: dict[int, Any] = {}
+
+    def _start_worker(self) -> multiprocessing.Process:
+        worker = multiprocessing.Process(
+            target=_embedding_worker_loop,
+            args=(
+                self._task_queue,
+                self.model_name,
+                self.max_seq_length,
+                self.num_threads_per_worker,
+            ),
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def start(self) -> None:
+        logger.info(
+            f"Starting {self.num_workers} local embedding workers with "
+            f"{self.num_threads_per_worker} threads each"
+        )
+        self._manager = multiprocessing.Manager()
+        self._task_queue = multiprocessing.Queue()
+        self._workers = [self._start_worker() for _ in range(self.num_workers)]
+
+    def ensure_workers_alive(self) -> None:
+        """Replaces any workers that have died (e.g. were OOM killed)"""
+        for ind, worker in enumerate(self._workers):
+            if not worker.is_alive():
+                logger.warning(
+                    f"Local embedding worker exited with code {worker.exitcode}, restarting"
+                )
+                self._workers[ind] = self._start_worker()
+
+    @property
+    def task_queue(self) -> multiprocessing.Queue:
+        if self._task_queue is None:
+            raise RuntimeError("Local embedding pool has not been started")
+        return self._task_queue
+
+    def get_client(
+        self, attempt_id: int, include_task_queue: bool = True
+    ) -> LocalEmbeddingPoolClient:
+        """The client must be released with `release_client` once the index attempt
+        using it is no longer running. Set `include_task_queue` to False if the client
+        is sent to a process which inherited the task queue instead."""
+        if self._manager is None or self._task_queue is None:
+            raise RuntimeError("Local embedding pool has not been started")
+
+        # each client gets its own result queue so that concurrent indexing jobs
+        # only ever see the results of their own tasks
+        if attempt_id not in self._result_queues_in_use:
+            self._result_queues_in_use[attempt_id] = (
+                self._free_result_queues.pop()
+                if self._free_result_queues
+                else self._manager.Queue()
+            )
+        return LocalEmbeddingPoolClient(
+            task_queue=self._task_queue if include_task_queue else None,
+            result_queue=self._result_queues_in_use[attempt_id],
+        )
+
+    def release_client(self, attempt_id: int) -> None:
+        result_queue = self._result_queues_in_use.pop(attempt_id, None)
+        if result_queue is None:
+            return
+
+        # results of tasks that were still in flight when the job stopped, the next
+        # client would skip them anyway
+        try:
+            while True:
+                result_queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._free_result_queues.append(result_queue)
+
+    def stop(self) -> None:
+        if self._task_queue is not None:
+            for _ in self._workers:
+                self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+
+        self._free_result_queues = []
+        self._result_queues_in_use = {}
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
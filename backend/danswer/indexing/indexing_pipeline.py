@@ -1,3 +1,5 @@
+import hashlib
+import json
 from functools import partial
 from itertools import chain
 from typing import Protocol
@@ -10,8 +12,10 @@ from danswer.connectors.cross_connector_utils.miscellaneous_utils import (
 )
 from danswer.connectors.models import Document
 from danswer.connectors.models import IndexAttemptMetadata
+from danswer.db.document import get_document_ids_for_connector_credential_pair
 from danswer.db.document import get_documents_by_ids
 from danswer.db.document import prepare_to_modify_documents
+from danswer.db.document import update_docs_content_hash
 from danswer.db.document import update_docs_updated_at
 from danswer.db.document import upsert_documents_complete
 from danswer.db.document_set import fetch_document_sets_for_documents
@@ -19,11 +23,13 @@ from danswer.db.engine import get_sqlalchemy_engine
 from danswer.document_index.factory import get_default_document_index
 from danswer.document_index.interfaces import DocumentIndex
 from danswer.document_index.interfaces import DocumentMetadata
+from danswer.document_index.interfaces import UpdateRequest
 from danswer.indexing.chunker import Chunker
 from danswer.indexing.chunker import DefaultChunker
 from danswer.indexing.embedder import DefaultEmbedder
 from danswer.indexing.models import DocAwareChunk
 from danswer.indexing.models import DocMetadataAwareIndexChunk
+from danswer.llm.utils import get_indexing_llm_tokenizer
 from danswer.search.models import Embedder
 from danswer.utils.logger import setup_logger
 
@@ -37,6 +43,25 @@ class IndexingPipelineProtocol(Protocol):
         ...
 
 
+def get_document_content_hash(document: Document) -> str:
+    """Fingerprint of everything about a document that ends up in the chunks written
+    to the document index. Timestamps are intentionally excluded so that connectors
+    which bump the updated time without changing the content don't trigger a reindex"""
+    content = {
+        "sections": [[section.text, section.link] for section in document.sections],
+        "semantic_identifier": document.semantic_identifier,
+        "title": document.title,
+        "metadata": document.metadata,
+        "primary_owners": get_experts_stores_representations(document.primary_owners),
+        "secondary_owners": get_experts_stores_representations(
+            document.secondary_owners
+        ),
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
 def upsert_documents_in_db(
     documents: list[Document],
     index_attempt_metadata: IndexAttemptMetadata,
@@ -80,8 +105,9 @@ def _indexing_pipeline(
     with Session(get_sqlalchemy_engine()) as db_session:
         document_ids = [document.id for document in documents]
 
-        # Skip indexing docs that don't have a newer updated at
-        # Shortcuts the time-consuming flow on connector index retries
+        # Skip indexing docs that don't have a newer updated at or whose content has
+        # not changed since the last successful index
+        # Shortcuts the time-consuming flow on connector index retries and re-crawls
         db_docs = get_documents_by_ids(
             document_ids=document_ids,
             db_session=db_session,
@@ -89,33 +115,91 @@ def _indexing_pipeline(
         id_update_time_map = {
             doc.id: doc.doc_updated_at for doc in db_docs if doc.doc_updated_at
         }
+        id_content_hash_map = {
+            doc.id: doc.content_hash for doc in db_docs if doc.content_hash
+        }
+        # Docs previously indexed via this connector / credential pair, for these the
+        # access and document sets stored in the document index are already up to date
+        already_linked_ids = get_document_ids_for_connector_credential_pair(
+            db_session=db_session,
+            document_ids=document_ids,
+            connector_id=index_attempt_metadata.connector_id,
+            credential_id=index_attempt_metadata.credential_id,
+        )
 
         updatable_docs: list[Document] = []
-        if ignore_time_skip:
-            updatable_docs = documents
-        else:
-            for doc in documents:
-                if (
-                    doc.id in id_update_time_map
-                    and doc.doc_updated_at
-                    and doc.doc_updated_at <= id_update_time_map[doc.id]
-                ):
-                    continue
+        unchanged_docs: list[Document] = []
+        ids_to_content_hash: dict[str, str] = {}
+        for doc in documents:
+            content_hash = get_document_content_hash(doc)
+            ids_to_content_hash[doc.id] = content_hash
+
+            if ignore_time_skip:
                 updatable_docs.append(doc)
+                continue
+
+            if (
+                doc.id in id_update_time_map
+                and doc.doc_updated_at
+                and doc.doc_updated_at <= id_update_time_map[doc.id]
+            ) or id_content_hash_map.get(doc.id) == content_hash:
+                unchanged_docs.append(doc)
+                continue
+
+            updatable_docs.append(doc)
+
+        # Unchanged docs newly seen by this connector / credential pair still need
+        # their access / document set metadata refreshed in the document index
+        relinked_docs = [
+            doc for doc in unchanged_docs if doc.id not in already_linked_ids
+        ]
+        if unchanged_docs:
+            logger.debug(
+                f"Skipping {len(unchanged_docs)} unchanged documents, "
+                f"refreshing metadata for {len(relinked_docs)} of them"
+            )
 
         updatable_ids = [doc.id for doc in updatable_docs]
+        relinked_ids = [doc.id for doc in relinked_docs]
 
         # Acquires a lock on the documents so that no other process can modify them
-        prepare_to_modify_documents(db_session=db_session, document_ids=updatable_ids)
+        prepare_to_modify_documents(
+            db_session=db_session,
+            document_ids=updatable_ids + relinked_ids,
+            caller="indexing",
+        )
 
         # Create records in the source of truth about these documents,
         # does not include doc_updated_at which is also used to indicate a successful update
         upsert_documents_in_db(
-            documents=updatable_docs,
+            documents=updatable_docs + relinked_docs,
             index_attempt_metadata=index_attempt_metadata,
             db_session=db_session,
         )
 
+        if relinked_ids:
+            relinked_id_to_access_info = get_access_for_documents(
+                document_ids=relinked_ids, db_session=db_session
+            )
+            relinked_id_to_document_set = {
+                document_id: document_sets
+                for document_id, document_sets in fetch_document_sets_for_documents(
+                    document_ids=relinked_ids, db_session=db_session
+                )
+            }
+            document_index.update(
+                update_requests=[
+                    UpdateRequest(
+                        document_ids=[document_id],
+                        access=relinked_id_to_access_info[document_id],
+                        document_sets=set(
+                            relinked_id_to_document_set.get(document_id, [])
+                        ),
+                    )
+                    for document_id in relinked_ids
+                ]
+            )
+
         logger.debug("Starting chunking")
         chunks: list[DocAwareChunk] = list(
             chain(*[chunker.chunk(document=document) for document in updatable_docs])
@@ -136,6 +220,9 @@ def _indexing_pipeline(
                 document_ids=updatable_ids, db_session=db_session
             )
         }
+        # Precompute the LLM token counts so that chunks don't need to be
+        # re-tokenized when packing them into prompts at query time
+        llm_tokenizer = get_indexing_llm_tokenizer()
         access_aware_chunks = [
             DocMetadataAwareIndexChunk.from_index_chunk(
                 index_chunk=chunk,
@@ -143,6 +230,7 @@ def _indexing_pipeline(
                 document_sets=set(
                     document_id_to_document_set.get(chunk.source_document.id, [])
                 ),
+                llm_token_count=len(llm_tokenizer.encode(chunk.content)),
             )
             for chunk in chunks_with_embeddings
         ]
@@ -173,6 +261,14 @@ def _indexing_pipeline(
             ids_to_new_updated_at=ids_to_new_updated_at, db_session=db_session
         )
 
+        # Store the fingerprint of the successfully indexed content
+        update_docs_content_hash(
+            ids_to_content_hash={
+                doc.id: ids_to_content_hash[doc.id] for doc in successful_docs
+            },
+            db_session=db_session,
+        )
+
     return len([r for r in insertion_records if r.already_existed is False]), len(
         chunks
     )
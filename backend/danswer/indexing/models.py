@@ -59,14 +59,21 @@ class DocMetadataAwareIndexChunk(IndexChunk):
             source document for this chunk.
     document_sets: all document sets the source document for this chunk is a part
                    of. This is used for filtering / personas.
+    llm_token_count: number of LLM tokens in the chunk content, precomputed so that
+                     the chunk does not need to be re-tokenized when building prompts.
     """
 
     access: "DocumentAccess"
     document_sets: set[str]
+    llm_token_count: int
 
     @classmethod
     def from_index_chunk(
-        cls, index_chunk: IndexChunk, access: "DocumentAccess", document_sets: set[str]
+        cls,
+        index_chunk: IndexChunk,
+        access: "DocumentAccess",
+        document_sets: set[str],
+        llm_token_count: int,
     ) -> "DocMetadataAwareIndexChunk":
         return cls(
             **{
@@ -75,6 +82,7 @@ class DocMetadataAwareIndexChunk(IndexChunk):
             },
             access=access,
             document_sets=document_sets,
+            llm_token_count=llm_token_count,
         )
 
 
@@ -96,6 +104,9 @@ class InferenceChunk(BaseChunk):
     updated_at: datetime | None
     primary_owners: list[str] | None = None
     secondary_owners: list[str] | None = None
+    # Precomputed at indexing time with INDEXING_LLM_TOKENIZER_ENCODING, not available
+    # for chunks indexed before this was added
+    llm_token_count: int | None = None
 
     @property
     def unique_id(self) -> str:
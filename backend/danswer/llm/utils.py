@@ -21,6 +21,7 @@ from danswer.configs.constants import GEN_AI_API_KEY_STORAGE_KEY
 from danswer.configs.constants import MessageType
 from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
 from danswer.configs.model_configs import GEN_AI_API_KEY
+from danswer.configs.model_configs import INDEXING_LLM_TOKENIZER_ENCODING
 from danswer.db.models import ChatMessage
 from danswer.dynamic_configs import get_dynamic_config_store
 from danswer.dynamic_configs.interface import ConfigNotFoundError
@@ -55,16 +56,40 @@ def get_default_llm_token_encode() -> Callable[[str], Any]:
     return _LLM_TOKENIZER_ENCODE
 
 
+def get_indexing_llm_tokenizer() -> Encoding:
+    """Tokenizer used to precompute the LLM token counts stored on chunks"""
+    return tiktoken.get_encoding(INDEXING_LLM_TOKENIZER_ENCODING)
+
+
+def get_chunk_llm_token_count(chunk: InferenceChunk) -> int:
+    """Uses the token count precomputed at indexing time if it was computed with the
+    same tokenizer as the configured LLM uses, otherwise tokenizes the chunk"""
+    tokenizer = get_default_llm_tokenizer()
+    if (
+        chunk.llm_token_count is not None
+        and isinstance(tokenizer, Encoding)
+        and tokenizer.name == INDEXING_LLM_TOKENIZER_ENCODING
+    ):
+        return chunk.llm_token_count
+
+    return len(tokenizer.encode(chunk.content))
+
+
 def tokenizer_trim_chunks(
     chunks: list[InferenceChunk], max_chunk_toks: int = DOC_EMBEDDING_CONTEXT_SIZE
 ) -> list[InferenceChunk]:
     tokenizer = get_default_llm_tokenizer()
     new_chunks = copy(chunks)
     for ind, chunk in enumerate(new_chunks):
+        # only chunks which are too long need to be tokenized for trimming
+        if get_chunk_llm_token_count(chunk) <= max_chunk_toks:
+            continue
+
         tokens = tokenizer.encode(chunk.content)
         if len(tokens) > max_chunk_toks:
             new_chunk = copy(chunk)
             new_chunk.content = tokenizer.decode(tokens[:max_chunk_toks])
+            new_chunk.llm_token_count = None
             new_chunks[ind] = new_chunk
     return new_chunks
 
@@ -11,6 +11,8 @@ from sqlalchemy.orm import Session
 from danswer.auth.users import current_admin_user
 from danswer.auth.users import current_user
 from danswer.background.celery.celery_utils import get_deletion_status
+from danswer.background.indexing.scheduling import get_queue_positions
+from danswer.background.indexing.scheduling import QueuedAttempt
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.file.utils import write_temp_files
 from danswer.connectors.google_drive.connector_auth import build_service_account_creds
@@ -41,9 +43,12 @@ from danswer.db.credentials import delete_google_drive_service_account_credentia
 from danswer.db.credentials import fetch_credential_by_id
 from danswer.db.deletion_attempt import check_deletion_attempt_is_allowed
 from danswer.db.document import get_document_cnts_for_cc_pairs
+from danswer.db.engine import get_db_current_time
 from danswer.db.engine import get_session
 from danswer.db.index_attempt import create_index_attempt
 from danswer.db.index_attempt import get_latest_index_attempts
+from danswer.db.index_attempt import get_not_started_index_attempts
+from danswer.db.models import IndexingPriority
 from danswer.db.models import User
 from danswer.dynamic_configs.interface import ConfigNotFoundError
 from danswer.server.documents.models import AuthStatus
@@ -251,6 +256,16 @@ def get_connector_indexing_status(
         for index_attempt in latest_index_attempts
     }
 
+    # position of each waiting attempt in the order the scheduler will start them
+    attempt_queue_positions = get_queue_positions(
+        attempts=[
+            QueuedAttempt.from_index_attempt_db_model(index_attempt)
+            for index_attempt in get_not_started_index_attempts(db_session)
+            if index_attempt.connector is not None
+        ],
+        now=get_db_current_time(db_session),
+    )
+
     document_count_info = get_document_cnts_for_cc_pairs(
         db_session=db_session,
         cc_pair_identifiers=cc_pair_identifiers,
@@ -291,6 +306,9 @@ def get_connector_indexing_status(
                 )
                 if latest_index_attempt
                 else None,
+                queue_position=attempt_queue_positions.get(latest_index_attempt.id)
+                if latest_index_attempt
+                else None,
                 deletion_attempt=get_deletion_status(
                     connector_id=connector.id,
                     credential_id=credential.id,
@@ -395,7 +413,12 @@ def connector_run_once(
         )
 
     index_attempt_ids = [
-        create_index_attempt(run_info.connector_id, credential_id, db_session)
+        create_index_attempt(
+            run_info.connector_id,
+            credential_id,
+            db_session,
+            priority=IndexingPriority.MANUAL,
+        )
         for credential_id in credential_ids
     ]
     return StatusResponse(
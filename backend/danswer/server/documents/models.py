@@ -56,6 +56,11 @@ class DeletionAttemptSnapshot(BaseModel):
     connector_id: int
     credential_id: int
     status: TaskStatus
+    # progress of the deletion, only available once it has started
+    num_docs_deleted: int | None = None
+    num_docs_updated: int | None = None
+    num_docs_remaining: int | None = None
+    eta_seconds: float | None = None
 
 
 class ConnectorBase(BaseModel):
@@ -166,6 +171,8 @@ class ConnectorIndexingStatus(BaseModel):
     docs_indexed: int
     error_msg: str | None
     latest_index_attempt: IndexAttemptSnapshot | None
+    # only set if the latest attempt is waiting to be started, 1 = next to be started
+    queue_position: int | None
     deletion_attempt: DeletionAttemptSnapshot | None
     is_deletable: bool
 
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 
 from danswer.auth.users import current_admin_user
 from danswer.auth.users import current_user
+from danswer.background.celery.celery_utils import enqueue_document_set_sync
 from danswer.db.document_set import check_document_sets_are_public
 from danswer.db.document_set import fetch_document_sets
 from danswer.db.document_set import insert_document_set
@@ -39,6 +40,8 @@ def create_document_set(
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    enqueue_document_set_sync(document_set_db_model.id)
     return document_set_db_model.id
 
 
@@ -56,6 +59,8 @@ def patch_document_set(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    enqueue_document_set_sync(document_set_update_request.id)
+
 
 @router.delete("/admin/document-set/{document_set_id}")
 def delete_document_set(
@@ -70,6 +75,8 @@ def delete_document_set(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    enqueue_document_set_sync(document_set_id)
+
 
 """Endpoints for non-admins"""
 
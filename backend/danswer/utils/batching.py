@@ -2,9 +2,11 @@ from collections.abc import Callable
 from collections.abc import Generator
 from collections.abc import Iterable
 from itertools import islice
+from typing import cast
 from typing import TypeVar
 
 T = TypeVar("T")
+U = TypeVar("U")
 
 
 def batch_generator(
@@ -21,3 +23,57 @@ def batch_generator(
         if pre_batch_yield:
             pre_batch_yield(batch)
         yield batch
+
+
+def length_bucketed_batch_indices(
+    lengths: list[int],
+    token_budget: int,
+    max_batch_size: int | None = None,
+) -> list[list[int]]:
+    """Groups item indices into batches of similar length. Items are sorted longest
+    first and added to a batch as long as the padded size of the batch
+    (number of items * longest item) stays within the token budget, so short items are
+    not padded out to the length of the longest item of the original ordering.
+    A single item longer than the budget still gets its own batch."""
+    sorted_indices = sorted(range(len(lengths)), key=lambda ind: -lengths[ind])
+
+    batches: list[list[int]] = []
+    current_batch: list[int] = []
+    batch_max_len = 0
+    for ind in sorted_indices:
+        if current_batch and (
+            (len(current_batch) + 1) * batch_max_len > token_budget
+            or (max_batch_size is not None and len(current_batch) >= max_batch_size)
+        ):
+            batches.append(current_batch)
+            current_batch = []
+
+        if not current_batch:
+            # sorted longest first, so the first item of a batch sets the padded length
+            batch_max_len = max(lengths[ind], 1)
+        current_batch.append(ind)
+
+    if current_batch:
+        batches.append(current_batch)
+
+    return batches
+
+
+def apply_length_bucketed(
+    items: list[T],
+    lengths: list[int],
+    func: Callable[[list[T]], list[U]],
+    token_budget: int,
+    max_batch_size: int | None = None,
+) -> list[U]:
+    """Applies `func` over length bucketed batches of `items` and returns the results
+    in the original order of `items`"""
+    results: list[U | None] = [None] * len(items)
+    for batch_indices in length_bucketed_batch_indices(
+        lengths=lengths, token_budget=token_budget, max_batch_size=max_batch_size
+    ):
+        batch_results = func([items[ind] for ind in batch_indices])
+        for ind, result in zip(batch_indices, batch_results):
+            results[ind] = result
+
+    return cast(list[U], results)
@@ -21,6 +21,11 @@ class IndexAttemptSingleton:
     def set_index_attempt_id(cls, index_attempt_id: int) -> None:
         cls._INDEX_ATTEMPT_ID = index_attempt_id
 
+    @classmethod
+    def clear_index_attempt_id(cls) -> None:
+        """Used by long-lived workers which run many indexing attempts"""
+        cls._INDEX_ATTEMPT_ID = None
+
 
 def get_log_level_from_str(log_level_str: str = LOG_LEVEL) -> int:
     log_level_dict = {
@@ -3,9 +3,12 @@ from fastapi import HTTPException
 
 from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
 from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.configs.model_configs import EMBEDDING_BATCH_TOKEN_BUDGET
+from danswer.configs.model_configs import MAX_BATCH_SIZE_ENCODE_CHUNKS
 from danswer.configs.model_configs import NORMALIZE_EMBEDDINGS
 from danswer.search.search_nlp_models import get_local_embedding_model
 from danswer.search.search_nlp_models import get_local_reranking_model_ensemble
+from danswer.utils.batching import apply_length_bucketed
 from danswer.utils.logger import setup_logger
 from danswer.utils.timing import log_function_time
 from shared_models.model_server_models import EmbedRequest
@@ -24,14 +27,39 @@ router = APIRouter(prefix="/encoder")
 def embed_text(
     texts: list[str],
     normalize_embeddings: bool = NORMALIZE_EMBEDDINGS,
+    batch_token_budget: int = EMBEDDING_BATCH_TOKEN_BUDGET,
 ) -> list[list[float]]:
     model = get_local_embedding_model()
-    embeddings = model.encode(texts, normalize_embeddings=normalize_embeddings)
 
-    if not isinstance(embeddings, list):
-        embeddings = embeddings.tolist()
+    if batch_token_budget <= 0:
+        embeddings = model.encode(texts, normalize_embeddings=normalize_embeddings)
 
-    return embeddings
+        if not isinstance(embeddings, list):
+            embeddings = embeddings.tolist()
+
+        return embeddings
+
+    def _encode_batch(text_batch: list[str]) -> list[list[float]]:
+        # each length bucketed batch is encoded as a single model batch
+        batch_embeddings = model.encode(
+            text_batch,
+            batch_size=len(text_batch),
+            normalize_embeddings=normalize_embeddings,
+        )
+        if not isinstance(batch_embeddings, list):
+            batch_embeddings = batch_embeddings.tolist()
+        return batch_embeddings
+
+    text_lengths = [
+        min(len(model.tokenizer.tokenize(text)), model.max_seq_length) for text in texts
+    ]
+    return apply_length_bucketed(
+        items=texts,
+        lengths=text_lengths,
+        func=_encode_batch,
+        token_budget=batch_token_budget,
+        max_batch_size=MAX_BATCH_SIZE_ENCODE_CHUNKS,
+    )
 
 
 @log_function_time()
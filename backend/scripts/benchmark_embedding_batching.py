@@ -0,0 +1,83 @@
+# This file is purely for development use, not included in any builds
+# Compares embedding throughput of fixed count batching (in document order) against
+# length bucketed batching for a mix of full chunks and mini-chunks
+import argparse
+import os
+import random
+import sys
+import time
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from danswer.configs.model_configs import BATCH_SIZE_ENCODE_CHUNKS  # noqa: E402
+from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE  # noqa: E402
+from danswer.configs.model_configs import EMBEDDING_BATCH_TOKEN_BUDGET  # noqa: E402
+from danswer.configs.model_configs import MAX_BATCH_SIZE_ENCODE_CHUNKS  # noqa: E402
+from danswer.search.search_nlp_models import get_local_embedding_model  # noqa: E402
+from danswer.utils.batching import apply_length_bucketed  # noqa: E402
+
+
+_WORDS = (
+    "danswer connects to all of your workplace tools and answers questions "
+    "using the documents that your team has already written"
+).split()
+
+
+def _build_texts(num_chunks: int, mini_chunks_per_chunk: int) -> list[str]:
+    texts: list[str] = []
+    for _ in range(num_chunks):
+        # roughly mimics the chunker output: a full chunk followed by its mini-chunks
+        texts.append(" ".join(random.choices(_WORDS, k=random.randint(200, 400))))
+        for _ in range(mini_chunks_per_chunk):
+            texts.append(" ".join(random.choices(_WORDS, k=random.randint(10, 30))))
+    return texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-chunks", type=int, default=256)
+    parser.add_argument("--mini-chunks-per-chunk", type=int, default=4)
+    parser.add_argument(
+        "--token-budget", type=int, default=EMBEDDING_BATCH_TOKEN_BUDGET
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    texts = _build_texts(args.num_chunks, args.mini_chunks_per_chunk)
+    model = get_local_embedding_model()
+    # warm up
+    model.encode(texts[:BATCH_SIZE_ENCODE_CHUNKS])
+
+    start = time.monotonic()
+    for i in range(0, len(texts), BATCH_SIZE_ENCODE_CHUNKS):
+        model.encode(
+            texts[i : i + BATCH_SIZE_ENCODE_CHUNKS],
+            batch_size=BATCH_SIZE_ENCODE_CHUNKS,
+        )
+    fixed_time = time.monotonic() - start
+
+    start = time.monotonic()
+    lengths = [
+        min(len(model.tokenizer.tokenize(text)), DOC_EMBEDDING_CONTEXT_SIZE)
+        for text in texts
+    ]
+    apply_length_bucketed(
+        items=texts,
+        lengths=lengths,
+        func=lambda batch: model.encode(batch, batch_size=len(batch)).tolist(),
+        token_budget=args.token_budget,
+        max_batch_size=MAX_BATCH_SIZE_ENCODE_CHUNKS,
+    )
+    bucketed_time = time.monotonic() - start
+
+    print(f"Texts embedded: {len(texts)}")
+    print(
+        f"Fixed batches of {BATCH_SIZE_ENCODE_CHUNKS}: {fixed_time:.2f}s "
+        f"({len(texts) / fixed_time:.1f} texts/s)"
+    )
+    print(
+        f"Length bucketed, budget of {args.token_budget} tokens: {bucketed_time:.2f}s "
+        f"({len(texts) / bucketed_time:.1f} texts/s)"
+    )
@@ -0,0 +1,149 @@
+# This file is purely for development use, not included in any builds
+# Times a single indexing scheduler tick (cleanup + job creation) against a large number
+# of connector / credential pairs and reports the number of SQL statements issued.
+# NOTE: everything (the seeded connectors as well as the changes the scheduler makes)
+# happens in a single transaction which is rolled back at the end, so nothing is kept.
+# Still run against a dev DB with the background indexing process stopped, since the
+# tick also sees (and locks) the existing connectors / index attempts.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from typing import Any
+from unittest.mock import patch
+
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+import danswer.background.update  # noqa: E402
+from danswer.background.update import cleanup_indexing_jobs  # noqa: E402
+from danswer.background.update import create_indexing_jobs  # noqa: E402
+from danswer.configs.constants import DocumentSource  # noqa: E402
+from danswer.connectors.models import InputType  # noqa: E402
+from danswer.db.engine import get_db_current_time  # noqa: E402
+from danswer.db.engine import get_sqlalchemy_engine  # noqa: E402
+from danswer.db.models import Connector  # noqa: E402
+from danswer.db.models import ConnectorCredentialPair  # noqa: E402
+from danswer.db.models import Credential  # noqa: E402
+from danswer.db.models import IndexAttempt  # noqa: E402
+from danswer.db.models import IndexingStatus  # noqa: E402
+
+_CONNECTOR_NAME_PREFIX = "scheduler-benchmark-"
+
+
+def _seed(db_session: Session, num_cc_pairs: int, attempts_per_pair: int) -> int:
+    credential = Credential(credential_json={}, user_id=None, admin_public=True)
+    db_session.add(credential)
+    db_session.flush()
+
+    connector_ids = db_session.scalars(
+        insert(Connector).returning(Connector.id),
+        [
+            {
+                "name": f"{_CONNECTOR_NAME_PREFIX}{ind}",
+                "source": DocumentSource.WEB,
+                "input_type": InputType.LOAD_STATE,
+                "connector_specific_config": {},
+                "refresh_freq": random.choice([60 * 10, 60 * 60, 60 * 60 * 24]),
+                "disabled": False,
+            }
+            for ind in range(num_cc_pairs)
+        ],
+    ).all()
+    db_session.execute(
+        insert(ConnectorCredentialPair),
+        [
+            {
+                "connector_id": connector_id,
+                "credential_id": credential.id,
+                "name": None,
+                "is_public": True,
+                "total_docs_indexed": 0,
+            }
+            for connector_id in connector_ids
+        ],
+    )
+
+    now = get_db_current_time(db_session)
+    attempts: list[dict[str, Any]] = []
+    for connector_id in connector_ids:
+        for ind in range(attempts_per_pair):
+            # spread out so that some pairs are due and some are not
+            attempt_time = now - timedelta(minutes=random.randint(1, 60 * 24 * 30))
+            attempts.append(
+                {
+                    "connector_id": connector_id,
+                    "credential_id": credential.id,
+                    "status": IndexingStatus.SUCCESS,
+                    "time_created": attempt_time,
+                    "time_updated": attempt_time,
+                }
+            )
+    db_session.execute(insert(IndexAttempt), attempts)
+    db_session.commit()
+    return credential.id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-cc-pairs", type=int, default=1000)
+    parser.add_argument("--attempts-per-pair", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    engine = get_sqlalchemy_engine()
+    num_statements = 0
+
+    def _count_statement(*_: Any) -> None:
+        global num_statements
+        num_statements += 1
+
+    with engine.connect() as connection:
+        # sessions on a connection which is already in a transaction join it rather
+        # than committing, this includes the ones the scheduler opens itself
+        transaction = connection.begin()
+        try:
+            with Session(connection) as db_session:
+                credential_id = _seed(
+                    db_session, args.num_cc_pairs, args.attempts_per_pair
+                )
+
+            event.listen(engine, "before_cursor_execute", _count_statement)
+            with patch.object(
+                danswer.background.update,
+                "get_sqlalchemy_engine",
+                return_value=connection,
+            ):
+                # first tick schedules every due pair, the second is the steady
+                # state where nothing new is due
+                for tick in ["initial", "steady state"]:
+                    num_statements = 0
+                    start = time.monotonic()
+                    cleanup_indexing_jobs(existing_jobs={})
+                    create_indexing_jobs(existing_jobs={})
+                    elapsed = time.monotonic() - start
+                    print(
+                        f"{tick} tick over {args.num_cc_pairs} cc-pairs: "
+                        f"{elapsed:.3f}s, {num_statements} SQL statements"
+                    )
+            event.remove(engine, "before_cursor_execute", _count_statement)
+
+            with Session(connection) as db_session:
+                num_scheduled = db_session.scalar(
+                    select(func.count())
+                    .select_from(IndexAttempt)
+                    .where(IndexAttempt.credential_id == credential_id)
+                    .where(IndexAttempt.status == IndexingStatus.NOT_STARTED)
+                )
+            print(f"Index attempts scheduled: {num_scheduled}")
+        finally:
+            transaction.rollback()
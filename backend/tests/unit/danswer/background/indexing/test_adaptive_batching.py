@@ -0,0 +1,120 @@
+import unittest
+from collections.abc import Iterator
+
+from danswer.background.indexing.adaptive_batching import AdaptiveDocumentBatcher
+from danswer.configs.constants import DocumentSource
+from danswer.connectors.interfaces import ConnectorCheckpoint
+from danswer.connectors.models import Document
+from danswer.connectors.models import Section
+
+
+def _build_doc(doc_id: str, num_chars: int) -> Document:
+    return Document(
+        id=doc_id,
+        sections=[Section(text="a" * num_chars, link=None)],
+        source=DocumentSource.WEB,
+        semantic_identifier="",
+        metadata={},
+    )
+
+
+class TestAdaptiveDocumentBatcher(unittest.TestCase):
+    def _build_batcher(self, rss_bytes: int = 0) -> AdaptiveDocumentBatcher:
+        return AdaptiveDocumentBatcher(
+            initial_batch_tokens=1000,
+            min_batch_tokens=100,
+            max_batch_tokens=10_000,
+            max_batch_docs=50,
+            target_batch_seconds=10,
+            max_rss_bytes=1000,
+            get_rss_bytes=lambda: rss_bytes,
+        )
+
+    def test_rebatch_by_token_volume(self) -> None:
+        batcher = self._build_batcher()
+        # ~251 tokens each, connector batches of 2 regrouped into batches of 4
+        connector_batches = [
+            [_build_doc(f"{i}_{j}", 1000) for j in range(2)] for i in range(4)
+        ]
+        batches = list(batcher.rebatch(connector_batches))
+        self.assertEqual([len(batch) for batch in batches], [4, 4])
+
+    def test_rebatch_dedupes_and_caps_docs(self) -> None:
+        batcher = self._build_batcher()
+        connector_batches = [[_build_doc("dup", 4)], [_build_doc("dup", 8)]]
+        batches = list(batcher.rebatch(connector_batches))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 1)
+        self.assertEqual(batches[0][0].sections[0].text, "a" * 8)
+
+        many_small_docs = [[_build_doc(str(i), 4) for i in range(120)]]
+        batches = list(batcher.rebatch(many_small_docs))
+        self.assertEqual([len(batch) for batch in batches], [50, 50, 20])
+
+    def test_rebatch_with_checkpoints(self) -> None:
+        batcher = self._build_batcher()
+        # connector batches of 3 docs regrouped into batches of 4, each output batch
+        # must only carry the checkpoint of a fully output connector batch
+        connector_batches = [
+            ([_build_doc(f"{i}_{j}", 1000) for j in range(3)], str(i)) for i in range(3)
+        ]
+        batches = list(batcher.rebatch_with_checkpoints(connector_batches))
+        self.assertEqual(
+            [(len(batch), checkpoint) for batch, checkpoint in batches],
+            [(4, "0"), (4, "1"), (1, "2")],
+        )
+
+    def test_rebatch_without_merging(self) -> None:
+        batcher = self._build_batcher()
+        num_requested_batches = 0
+
+        def _connector_batches() -> (
+            Iterator[tuple[list[Document], ConnectorCheckpoint | None]]
+        ):
+            nonlocal num_requested_batches
+            for i in range(3):
+                num_requested_batches += 1
+                yield [_build_doc(f"{i}_{j}", 1000) for j in range(6)], str(i)
+
+        # connector batches are split up, but the next one is only requested once
+        # all docs of the previous one have been output
+        self.assertEqual(
+            [
+                (len(batch), checkpoint, num_requested_batches)
+                for batch, checkpoint in batcher.rebatch_with_checkpoints(
+                    _connector_batches(), merge_batches=False
+                )
+            ],
+            [
+                (4, None, 1),
+                (2, "0", 1),
+                (4, "0", 2),
+                (2, "1", 2),
+                (4, "1", 3),
+                (2, "2", 3),
+            ],
+        )
+
+    def test_target_follows_latency(self) -> None:
+        batcher = self._build_batcher()
+        docs = [_build_doc(str(i), 1000) for i in range(4)]
+
+        # fast batch, grows but at most doubles
+        batcher.record_batch(documents=docs, elapsed_seconds=0.1)
+        self.assertEqual(batcher.target_batch_tokens, 2000)
+
+        # slow batch, shrinks towards the size that would hit the target latency
+        batcher.record_batch(documents=docs, elapsed_seconds=100)
+        self.assertLess(batcher.target_batch_tokens, 2000)
+        self.assertEqual(batcher.get_stats()["num_batches"], 2)
+
+    def test_target_halves_on_high_memory(self) -> None:
+        batcher = self._build_batcher(rss_bytes=2000)
+        docs = [_build_doc("doc", 1000)]
+        batcher.record_batch(documents=docs, elapsed_seconds=0.1)
+        self.assertEqual(batcher.target_batch_tokens, 500)
+        self.assertEqual(batcher.get_stats()["peak_rss_mb"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from danswer.background.indexing.resource_governor import (
+    IndexingMemoryLimitExceededError,
+)
+from danswer.background.indexing.resource_governor import ResourceGovernor
+
+
+class TestResourceGovernor(unittest.TestCase):
+    def test_usage_is_logged_periodically(self) -> None:
+        governor = ResourceGovernor(soft_limit_mb=0, hard_limit_mb=0, log_interval=60)
+        with patch(
+            "danswer.background.indexing.resource_governor.logger"
+        ) as mock_logger:
+            governor.sample()
+            mock_logger.debug.assert_not_called()
+
+            governor.log_interval = 0
+            governor.sample()
+            mock_logger.debug.assert_called_once()
+
+    def test_split_batch_without_pressure(self) -> None:
+        governor = ResourceGovernor(soft_limit_mb=0, hard_limit_mb=0)
+        self.assertEqual(list(governor.split_batch(list(range(10)))), [list(range(10))])
+
+    def test_split_batch_halves_over_soft_limit(self) -> None:
+        # any process is over a 1MB soft limit
+        governor = ResourceGovernor(soft_limit_mb=1, hard_limit_mb=0)
+        governor.sample()
+        self.assertGreater(governor.peak_rss_mb, 1)
+
+        batches = list(governor.split_batch(list(range(10))))
+        self.assertEqual([len(batch) for batch in batches], [5, 5])
+
+        # stays reduced until the limit is exceeded again
+        batches = list(governor.split_batch(list(range(10))))
+        self.assertEqual([len(batch) for batch in batches], [5, 5])
+
+        governor.sample()
+        batches = list(governor.split_batch(list(range(10))))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 2, 2, 2])
+
+    def test_hard_limit_raises_at_batch_boundary(self) -> None:
+        governor = ResourceGovernor(soft_limit_mb=0, hard_limit_mb=1)
+        governor.raise_if_hard_limit_exceeded()
+
+        governor.sample()
+        self.assertTrue(governor.hard_limit_exceeded)
+        with self.assertRaises(IndexingMemoryLimitExceededError):
+            governor.raise_if_hard_limit_exceeded()
+        # still raised if the first one was swallowed
+        with self.assertRaises(IndexingMemoryLimitExceededError):
+            governor.raise_if_hard_limit_exceeded()
+
+    def test_kills_job_which_does_not_stop(self) -> None:
+        killed: list[bool] = []
+        governor = ResourceGovernor(
+            soft_limit_mb=0,
+            hard_limit_mb=1,
+            sample_interval=0.01,
+            kill_grace_seconds=0.2,
+            on_kill=lambda: killed.append(True),
+        )
+        with patch(
+            "danswer.background.indexing.resource_governor._kill_process_tree"
+        ) as kill_process_tree:
+            governor.start()
+            try:
+                time.sleep(0.1)
+                self.assertFalse(killed)
+                time.sleep(0.5)
+            finally:
+                governor.stop()
+
+        self.assertEqual(killed, [True])
+        kill_process_tree.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
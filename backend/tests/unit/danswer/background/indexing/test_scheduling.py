@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from danswer.background.indexing.scheduling import get_queue_positions
+from danswer.background.indexing.scheduling import QueuedAttempt
+from danswer.background.indexing.scheduling import select_attempts_to_start
+from danswer.configs.constants import DocumentSource
+from danswer.db.models import IndexingPriority
+
+_NOW = datetime(2023, 12, 1, tzinfo=timezone.utc)
+
+
+def _build_attempt(
+    attempt_id: int,
+    priority: IndexingPriority,
+    minutes_waited: int = 0,
+    connector_id: int | None = None,
+    source: DocumentSource = DocumentSource.SLACK,
+) -> QueuedAttempt:
+    return QueuedAttempt(
+        attempt_id=attempt_id,
+        connector_id=connector_id if connector_id is not None else attempt_id,
+        source=source,
+        priority=priority,
+        time_created=_NOW - timedelta(minutes=minutes_waited),
+    )
+
+
+class TestIndexingScheduling(unittest.TestCase):
+    def test_priority_classes(self) -> None:
+        attempts = [
+            _build_attempt(1, IndexingPriority.FULL_REINDEX, minutes_waited=5),
+            _build_attempt(2, IndexingPriority.INCREMENTAL, minutes_waited=2),
+            _build_attempt(3, IndexingPriority.MANUAL),
+            _build_attempt(4, IndexingPriority.INCREMENTAL, minutes_waited=3),
+        ]
+        positions = get_queue_positions(attempts, now=_NOW, aging_seconds=3600)
+        self.assertEqual(positions, {3: 1, 4: 2, 2: 3, 1: 4})
+
+    def test_aging_prevents_starvation(self) -> None:
+        attempts = [
+            _build_attempt(1, IndexingPriority.FULL_REINDEX, minutes_waited=150),
+            _build_attempt(2, IndexingPriority.MANUAL),
+        ]
+        positions = get_queue_positions(attempts, now=_NOW, aging_seconds=3600)
+        self.assertEqual(positions, {1: 1, 2: 2})
+
+        # without aging, strict priority order
+        positions = get_queue_positions(attempts, now=_NOW, aging_seconds=0)
+        self.assertEqual(positions, {2: 1, 1: 2})
+
+    def test_concurrency_limits(self) -> None:
+        attempts = [
+            _build_attempt(
+                1, IndexingPriority.MANUAL, source=DocumentSource.GOOGLE_DRIVE
+            ),
+            _build_attempt(
+                2, IndexingPriority.INCREMENTAL, source=DocumentSource.GOOGLE_DRIVE
+            ),
+            # same connector as a running job
+            _build_attempt(3, IndexingPriority.INCREMENTAL, connector_id=100),
+            _build_attempt(4, IndexingPriority.FULL_REINDEX),
+            _build_attempt(5, IndexingPriority.FULL_REINDEX),
+        ]
+        to_start = select_attempts_to_start(
+            queued_attempts=attempts,
+            running=[(100, DocumentSource.SLACK)],
+            num_available_slots=3,
+            now=_NOW,
+            max_jobs_per_source={DocumentSource.GOOGLE_DRIVE.value: 1},
+            max_jobs_per_connector=1,
+            aging_seconds=3600,
+        )
+        self.assertEqual([attempt.attempt_id for attempt in to_start], [1, 4, 5])
+
+    def test_no_available_slots(self) -> None:
+        to_start = select_attempts_to_start(
+            queued_attempts=[_build_attempt(1, IndexingPriority.MANUAL)],
+            running=[],
+            num_available_slots=0,
+            now=_NOW,
+        )
+        self.assertEqual(to_start, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
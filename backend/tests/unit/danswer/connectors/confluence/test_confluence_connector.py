@@ -0,0 +1,184 @@
+import re
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Any
+
+from danswer.connectors.confluence.connector import ConfluenceConnector
+
+
+class _FakeConfluence:
+    """Serves the CQL page searches made by the connector from an in-memory space"""
+
+    def __init__(self, page_times: dict[str, datetime]) -> None:
+        self.page_times = page_times
+        self.num_searches = 0
+        # called after every search, e.g. to edit pages in between requests
+        self.after_search: Any = None
+
+    def get(self, path: str, params: dict[str, Any]) -> dict[str, Any]:
+        assert path == "rest/api/content/search"
+        now = datetime.now(tz=timezone.utc)
+        cql = params["cql"]
+        lower_match = re.search(r'lastmodified >= now\("-(\d+)m"\)', cql)
+        upper_match = re.search(r'lastmodified <= now\("-(\d+)m"\)', cql)
+        lower = (
+            now - timedelta(minutes=int(lower_match[1]))
+            if lower_match
+            else datetime.min.replace(tzinfo=timezone.utc)
+        )
+        upper = now - timedelta(minutes=int(upper_match[1])) if upper_match else now
+
+        matching = sorted(
+            (
+                (last_modified, page_id)
+                for page_id, last_modified in self.page_times.items()
+                if lower <= last_modified <= upper
+            ),
+        )
+        results = [
+            {
+                "id": page_id,
+                "title": f"Page {page_id}",
+                "version": {"when": last_modified.isoformat()},
+                "body": {"storage": {"value": f"<p>Content of {page_id}</p>"}},
+                "_links": {"webui": f"/pages/{page_id}"},
+            }
+            for last_modified, page_id in matching[
+                params["start"] : params["start"] + params["limit"]
+            ]
+        ]
+
+        self.num_searches += 1
+        if self.after_search is not None:
+            self.after_search(self.num_searches)
+        return {"results": results}
+
+    def get_page_child_by_type(self, *args: Any, **kwargs: Any) -> list:
+        return []
+
+
+def _build_connector(
+    page_times: dict[str, datetime], batch_size: int
+) -> tuple[ConfluenceConnector, _FakeConfluence]:
+    connector = ConfluenceConnector(
+        "https://test.atlassian.net/wiki/spaces/TEST/overview",
+        batch_size=batch_size,
+        continue_on_failure=False,
+        labels_to_skip=[],
+    )
+    client = _FakeConfluence(page_times)
+    connector.confluence_client = client  # type: ignore
+    return connector, client
+
+
+def _poll_page_ids(
+    connector: ConfluenceConnector, start: datetime, end: datetime
+) -> list[str]:
+    return [
+        doc.semantic_identifier.removeprefix("Page ")
+        for doc_batch in connector.poll_source(start.timestamp(), end.timestamp())
+        for doc in doc_batch
+    ]
+
+
+class TestConfluencePoll(unittest.TestCase):
+    def test_page_edited_during_poll(self) -> None:
+        now = datetime.now(tz=timezone.utc)
+        page_times = {
+            f"{ind}": now - timedelta(minutes=100 - ind * 5) for ind in range(10)
+        }
+        # a page from before the window
+        page_times["old"] = now - timedelta(hours=5)
+        connector, client = _build_connector(page_times, batch_size=3)
+
+        def edit_page(num_searches: int) -> None:
+            # moves to the end of the results, shifting everything after it
+            if num_searches == 1:
+                page_times["1"] = datetime.now(tz=timezone.utc)
+
+        client.after_search = edit_page
+        page_ids = _poll_page_ids(connector, now - timedelta(hours=2), now)
+
+        self.assertEqual(page_ids, [f"{ind}" for ind in range(10)])
+
+    def test_pages_modified_at_the_same_time(self) -> None:
+        now = datetime.now(tz=timezone.utc)
+        same_time = now - timedelta(minutes=30)
+        page_times = {f"{ind}": same_time for ind in range(7)}
+        page_times["later"] = now - timedelta(minutes=10)
+        connector, _ = _build_connector(page_times, batch_size=3)
+
+        page_ids = _poll_page_ids(connector, now - timedelta(hours=1), now)
+
+        self.assertEqual(sorted(page_ids), sorted(page_times))
+        self.assertEqual(len(page_ids), len(page_times))
+
+    def test_many_pages_modified_within_a_minute(self) -> None:
+        now = datetime.now(tz=timezone.utc)
+        page_times = {
+            f"{ind}": now - timedelta(minutes=30, milliseconds=100 * ind)
+            for ind in range(400)
+        }
+        connector, client = _build_connector(page_times, batch_size=16)
+
+        page_ids = _poll_page_ids(connector, now - timedelta(hours=1), now)
+
+        self.assertEqual(sorted(page_ids), sorted(page_times))
+        self.assertEqual(len(page_ids), len(page_times))
+        # pages already seen are not fetched again and again
+        self.assertLessEqual(client.num_searches, 400 // 16 + 2)
+
+
+class TestConfluenceCheckpoints(unittest.TestCase):
+    def test_resume_poll_from_checkpoint(self) -> None:
+        now = datetime.now(tz=timezone.utc)
+        page_times = {
+            f"{ind}": now - timedelta(minutes=100 - ind * 5) for ind in range(10)
+        }
+        connector, _ = _build_connector(page_times, batch_size=3)
+        start, end = (now - timedelta(hours=2)).timestamp(), now.timestamp()
+
+        batches = list(connector.poll_source_from_checkpoint(start, end, None))
+        # e.g. the job was killed after the second batch was indexed
+        _, checkpoint = batches[1]
+        # pages added in the meantime do not shift the checkpoint
+        page_times["new"] = now - timedelta(minutes=1)
+        del page_times["0"]
+
+        resumed_page_ids = [
+            doc.semantic_identifier.removeprefix("Page ")
+            for doc_batch, _ in connector.poll_source_from_checkpoint(
+                start, end, checkpoint
+            )
+            for doc in doc_batch
+        ]
+        # the last page before the checkpoint is indexed again
+        self.assertEqual(resumed_page_ids, ["5", "6", "7", "8", "9", "new"])
+
+    def test_load_checkpoints(self) -> None:
+        now = datetime.now(tz=timezone.utc)
+        page_times = {f"{ind}": now - timedelta(days=100 - ind) for ind in range(10)}
+        connector, _ = _build_connector(page_times, batch_size=4)
+
+        batches = list(connector.load_from_checkpoint(None))
+        self.assertEqual(
+            [[doc.semantic_identifier for doc in batch] for batch, _ in batches],
+            [
+                [f"Page {ind}" for ind in range(4)],
+                [f"Page {ind}" for ind in range(4, 8)],
+                [f"Page {ind}" for ind in range(8, 10)],
+            ],
+        )
+        self.assertEqual(
+            [checkpoint for _, checkpoint in batches],
+            [page_times[ind].isoformat() for ind in ["3", "7", "9"]],
+        )
+
+        # offsets, as stored by older versions, are ignored
+        self.assertEqual(len(list(connector.load_from_checkpoint("4"))), len(batches))
+
+
+if __name__ == "__main__":
+    unittest.main()
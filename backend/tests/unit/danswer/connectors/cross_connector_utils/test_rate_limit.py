@@ -1,9 +1,16 @@
+import os
+import tempfile
+import threading
 import time
 import unittest
+from types import SimpleNamespace
 
 from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
     rate_limit_builder,
 )
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
+    TokenBucketRateLimiter,
+)
 
 
 class TestRateLimit(unittest.TestCase):
@@ -31,6 +38,91 @@ class TestRateLimit(unittest.TestCase):
         self.assertLess(time_to_finish_non_ratelimited, 1)
         self.assertGreater(time_to_finish_ratelimited, 5)
 
+    def test_rate_limit_threads(self) -> None:
+        limiter = TokenBucketRateLimiter(max_calls=2, period=1)
+        call_times: list[float] = []
+        call_times_lock = threading.Lock()
+
+        def func() -> None:
+            with call_times_lock:
+                call_times.append(time.time())
+
+        threads = [
+            threading.Thread(target=limiter.call, args=(func,)) for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        call_times.sort()
+        self.assertEqual(len(call_times), 6)
+        # no more than 2 calls in any 1 second window
+        for ind in range(2, len(call_times)):
+            self.assertGreaterEqual(call_times[ind] - call_times[ind - 2], 0.99)
+
+        stats = limiter.get_stats()
+        self.assertEqual(stats.num_calls, 6)
+        self.assertEqual(stats.num_waits, 4)
+        self.assertGreater(stats.max_wait_seconds, 1.5)
+
+    def test_retry_after(self) -> None:
+        limiter = TokenBucketRateLimiter(max_calls=10, period=1)
+        self.call_cnt = 0
+
+        def func() -> str:
+            self.call_cnt += 1
+            if self.call_cnt == 1:
+                error = Exception("rate limited")
+                error.response = SimpleNamespace(  # type: ignore
+                    status_code=429, headers={"Retry-After": "1"}
+                )
+                raise error
+            return "done"
+
+        start = time.time()
+        self.assertEqual(limiter.call(func), "done")
+        self.assertGreaterEqual(time.time() - start, 1)
+        self.assertEqual(self.call_cnt, 2)
+        self.assertEqual(limiter.get_stats().num_rate_limited_responses, 1)
+
+    def test_back_off_delays_reserved_calls(self) -> None:
+        limiter = TokenBucketRateLimiter(max_calls=1, period=1)
+        limiter.acquire()
+        call_times: list[float] = []
+
+        # reserves the next token (available in 1 second) and sleeps
+        thread = threading.Thread(
+            target=limiter.call, args=(lambda: call_times.append(time.time()),)
+        )
+        start = time.time()
+        thread.start()
+        time.sleep(0.2)
+        # e.g. another thread got a 429 response
+        limiter.back_off(2)
+        thread.join()
+
+        self.assertEqual(len(call_times), 1)
+        self.assertGreaterEqual(call_times[0] - start, 2.2)
+
+    def test_shared_state_file(self) -> None:
+        with tempfile.TemporaryDirectory() as state_dir:
+            state_path = os.path.join(state_dir, "limiter.json")
+            # e.g. in two different processes
+            limiter_1 = TokenBucketRateLimiter(
+                max_calls=2, period=1, state_path=state_path
+            )
+            limiter_2 = TokenBucketRateLimiter(
+                max_calls=2, period=1, state_path=state_path
+            )
+
+            start = time.time()
+            limiter_1.acquire()
+            limiter_1.acquire()
+            self.assertLess(time.time() - start, 0.5)
+            limiter_2.acquire()
+            self.assertGreaterEqual(time.time() - start, 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,289 @@
+import re
+import unittest
+from collections.abc import Sequence
+from typing import Any
+from unittest.mock import patch
+
+from googleapiclient.errors import HttpError  # type: ignore
+from httplib2 import Response  # type: ignore
+
+from danswer.connectors.cross_connector_utils.state_store import ConnectorStateStore
+from danswer.connectors.google_drive.connector import DRIVE_FOLDER_TYPE
+from danswer.connectors.google_drive.connector import GoogleDriveConnector
+from danswer.connectors.models import Document
+
+# (connector_id, credential_id, key) -> value
+_StateValues = dict[tuple[int, int, str], Any]
+
+
+class _InMemoryStateStore(ConnectorStateStore):
+    def __init__(
+        self, connector_id: int, credential_id: int, values: _StateValues
+    ) -> None:
+        super().__init__(connector_id, credential_id)
+        self.values = values
+
+    def load(self, keys: Sequence[str]) -> dict[str, Any]:
+        cc_pair = (self.connector_id, self.credential_id)
+        return {
+            key: self.values[(*cc_pair, key)]
+            for key in keys
+            if (*cc_pair, key) in self.values
+        }
+
+    def store(self, values: dict[str, Any]) -> None:
+        for key, value in values.items():
+            self.values[(self.connector_id, self.credential_id, key)] = value
+
+    def delete(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self.values.pop((self.connector_id, self.credential_id, key), None)
+
+
+class _FakeRequest:
+    def __init__(self, result: Any) -> None:
+        self.result = result
+
+    def execute(self) -> Any:
+        return self.result
+
+
+class _FakeFiles:
+    def __init__(self, drive: "_FakeDriveService") -> None:
+        self.drive = drive
+
+    def list(self, q: str, **kwargs: Any) -> _FakeRequest:
+        files = list(self.drive.files_by_id.values())
+        name_match = re.search(r"name='([^']*)'", q)
+        if name_match:
+            files = [file for file in files if file["name"] == name_match[1]]
+        if "mimeType != " in q:
+            files = [file for file in files if file["mimeType"] != DRIVE_FOLDER_TYPE]
+        else:
+            files = [file for file in files if file["mimeType"] == DRIVE_FOLDER_TYPE]
+        parent_match = re.search(r"'([^']*)' in parents", q)
+        if parent_match:
+            files = [file for file in files if parent_match[1] in file["parents"]]
+        return _FakeRequest({"files": files})
+
+    def get(self, fileId: str, **kwargs: Any) -> _FakeRequest:
+        if fileId not in self.drive.files_by_id:
+            # e.g. the user's root folder
+            raise HttpError(Response({"status": 404}), b"File not found")
+        return _FakeRequest(self.drive.files_by_id[fileId])
+
+
+class _FakeChanges:
+    def __init__(self, drive: "_FakeDriveService") -> None:
+        self.drive = drive
+
+    def list(self, pageToken: str, **kwargs: Any) -> _FakeRequest:
+        self.drive.page_tokens_listed.append(pageToken)
+        return _FakeRequest(
+            {
+                "changes": self.drive.pending_changes,
+                "newStartPageToken": "token-after-changes",
+            }
+        )
+
+    def getStartPageToken(self, **kwargs: Any) -> _FakeRequest:
+        return _FakeRequest({"startPageToken": "token-before-listing"})
+
+
+class _FakeDriveService:
+    def __init__(self, files: list[dict[str, Any]]) -> None:
+        self.files_by_id = {file["id"]: file for file in files}
+        self.pending_changes: list[dict[str, Any]] = []
+        self.page_tokens_listed: list[str] = []
+
+    def files(self) -> _FakeFiles:
+        return _FakeFiles(self)
+
+    def changes(self) -> _FakeChanges:
+        return _FakeChanges(self)
+
+
+def _build_file(
+    file_id: str, parents: list[str], mime_type: str = "text/plain"
+) -> dict[str, Any]:
+    return {
+        "id": file_id,
+        "name": file_id,
+        "mimeType": mime_type,
+        "modifiedTime": "2024-01-01T00:00:00+00:00",
+        "webViewLink": f"https://drive.google.com/{file_id}",
+        "parents": parents,
+    }
+
+
+def _link(file_id: str) -> str:
+    return f"https://drive.google.com/{file_id}"
+
+
+class TestGoogleDriveChangesFeed(unittest.TestCase):
+    def setUp(self) -> None:
+        self.service = _FakeDriveService(
+            [
+                _build_file("scoped", ["root"], mime_type=DRIVE_FOLDER_TYPE),
+                _build_file("other", ["root"], mime_type=DRIVE_FOLDER_TYPE),
+                _build_file("removed", ["scoped"]),
+                _build_file("trashed", ["scoped"]),
+                _build_file("modified", ["scoped"]),
+                _build_file("out-of-scope", ["other"]),
+            ]
+        )
+        self.state_values: _StateValues = {}
+        state_store_patch = patch(
+            "danswer.connectors.google_drive.connector.ConnectorStateStore",
+            lambda connector_id, credential_id: _InMemoryStateStore(
+                connector_id, credential_id, self.state_values
+            ),
+        )
+        state_store_patch.start()
+        self.addCleanup(state_store_patch.stop)
+
+    def _build_connector(self, credential_id: int = 1) -> GoogleDriveConnector:
+        connector = GoogleDriveConnector(
+            folder_paths=["scoped"],
+            batch_size=2,
+            continue_on_failure=False,
+            use_changes_feed=True,
+            num_threads=1,
+        )
+        connector._build_service = lambda: self.service  # type: ignore
+        connector.set_cc_pair_id(connector_id=1, credential_id=credential_id)
+        return connector
+
+    def _get_state(self, credential_id: int = 1) -> dict[str, Any]:
+        return {
+            key: value
+            for (_, state_credential_id, key), value in self.state_values.items()
+            if state_credential_id == credential_id
+        }
+
+    @staticmethod
+    def _file_state(file_ids: list[str]) -> dict[str, str]:
+        return {f"file_document_id:{file_id}": _link(file_id) for file_id in file_ids}
+
+    @staticmethod
+    def _doc_ids(doc_batches: Any) -> list[str]:
+        docs: list[Document] = [doc for batch in doc_batches for doc in batch]
+        return [doc.id for doc in docs]
+
+    def test_no_stored_page_token_falls_back_to_listing(self) -> None:
+        connector = self._build_connector()
+
+        doc_ids = self._doc_ids(connector.poll_source(100, 200))
+
+        self.assertEqual(
+            sorted(doc_ids),
+            [_link("modified"), _link("removed"), _link("trashed")],
+        )
+        self.assertEqual(self.service.page_tokens_listed, [])
+        self.assertEqual(
+            self._get_state(),
+            {
+                # the position from before the listing, so that nothing is missed
+                "changes_position": {
+                    "poll_end": 200,
+                    "page_token": "token-before-listing",
+                },
+                **self._file_state(["modified", "removed", "trashed"]),
+            },
+        )
+
+    def test_changes_since_load(self) -> None:
+        doc_ids = self._doc_ids(self._build_connector().load_from_state())
+        self.assertEqual(
+            sorted(doc_ids),
+            [_link("modified"), _link("removed"), _link("trashed")],
+        )
+        # the first poll after the load has no position in the changes feed
+        list(self._build_connector().poll_source(100, 200))
+
+        self.service.files_by_id["trashed"]["trashed"] = True
+        self.service.pending_changes = [
+            # only the ID of files which are no longer visible is known
+            {"changeType": "file", "fileId": "removed", "removed": True},
+            {
+                "changeType": "file",
+                "fileId": "trashed",
+                "file": self.service.files_by_id["trashed"],
+            },
+            {
+                "changeType": "file",
+                "fileId": "out-of-scope",
+                "file": self.service.files_by_id["out-of-scope"],
+            },
+            {
+                "changeType": "file",
+                "fileId": "modified",
+                "file": self.service.files_by_id["modified"],
+            },
+        ]
+        connector = self._build_connector()
+        doc_ids = self._doc_ids(connector.poll_source(200, 300))
+
+        self.assertEqual(self.service.page_tokens_listed, ["token-before-listing"])
+        self.assertEqual(doc_ids, [_link("modified")])
+        self.assertEqual(
+            connector.pop_deleted_document_ids(), [_link("removed"), _link("trashed")]
+        )
+        self.assertEqual(
+            self._get_state(),
+            {
+                "changes_position": {
+                    "poll_end": 300,
+                    "page_token": "token-after-changes",
+                },
+                **self._file_state(["modified"]),
+            },
+        )
+
+    def test_load_from_state_keeps_document_ids(self) -> None:
+        list(self._build_connector().load_from_state())
+        self.state_values[(1, 1, "changes_position")] = {
+            "poll_end": 100,
+            "page_token": "token-1",
+        }
+        self.service.pending_changes = [
+            {"changeType": "file", "fileId": "removed", "removed": True},
+        ]
+
+        connector = self._build_connector()
+        self.assertEqual(self._doc_ids(connector.poll_source(100, 200)), [])
+        self.assertEqual(self.service.page_tokens_listed, ["token-1"])
+        self.assertEqual(connector.pop_deleted_document_ids(), [_link("removed")])
+
+    def test_state_is_kept_per_cc_pair(self) -> None:
+        list(self._build_connector(credential_id=1).load_from_state())
+        self.state_values[(1, 1, "changes_position")] = {
+            "poll_end": 100,
+            "page_token": "token-1",
+        }
+
+        # the same user / folders indexed with another credential
+        connector = self._build_connector(credential_id=2)
+        list(connector.poll_source(100, 200))
+
+        self.assertEqual(self.service.page_tokens_listed, [])
+        self.assertEqual(
+            self._get_state(credential_id=1),
+            {
+                "changes_position": {"poll_end": 100, "page_token": "token-1"},
+                **self._file_state(["modified", "removed", "trashed"]),
+            },
+        )
+
+    def test_without_cc_pair_lists_files(self) -> None:
+        connector = self._build_connector()
+        connector._state_store = None
+
+        doc_ids = self._doc_ids(connector.poll_source(100, 200))
+
+        self.assertEqual(len(doc_ids), 3)
+        self.assertEqual(self.state_values, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import unittest
+from collections import Counter
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+
+from danswer.connectors.slack.connector import get_all_docs
+from danswer.connectors.slack.connector import SlackLoadConnector
+
+# can be raised to try out much larger (e.g. multi-GB) exports
+_EXPORT_MESSAGES_PER_CHANNEL = int(
+    os.environ.get("SLACK_TEST_EXPORT_MESSAGES_PER_CHANNEL") or 5000
+)
+_EXPORT_MESSAGES_PER_DAY = 100
+_EXPORT_START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+class _FakeSlackResponse(dict):
+    def validate(self) -> "_FakeSlackResponse":
+        return self
+
+
+class _FakeSlackClient:
+    """Two channels with a mix of threads and standalone messages, replies come back
+    after a random delay so that threads finish out of order"""
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+        self.channels = [
+            {"id": "C1", "name": "general", "is_member": True, "is_private": False},
+            {"id": "C2", "name": "random", "is_member": True, "is_private": False},
+        ]
+        self.messages = {
+            channel["id"]: [
+                {"ts": f"{ind}.0", "text": f"message {ind}", "user": "U1"}
+                | ({"thread_ts": f"{ind}.0"} if ind % 2 == 0 else {})
+                | ({"bot_id": "B1"} if ind == 5 else {})
+                for ind in range(8)
+            ]
+            for channel in self.channels
+        }
+
+    def conversations_list(self, **kwargs: Any) -> _FakeSlackResponse:
+        return _FakeSlackResponse(channels=self.channels)
+
+    def conversations_history(self, **kwargs: Any) -> _FakeSlackResponse:
+        return _FakeSlackResponse(messages=self.messages[kwargs["channel"]])
+
+    def conversations_replies(self, **kwargs: Any) -> _FakeSlackResponse:
+        time.sleep(random.random() / 10)
+        thread_ts = kwargs["ts"]
+        return _FakeSlackResponse(
+            messages=[
+                {"ts": thread_ts, "text": "parent", "user": "U1"},
+                {"ts": thread_ts + "1", "text": "reply", "user": "U2"},
+            ]
+        )
+
+
+class TestGetAllDocs(unittest.TestCase):
+    def test_concurrent_fetching_is_deterministic(self) -> None:
+        sequential_doc_ids = [
+            doc.id
+            for doc in get_all_docs(
+                client=_FakeSlackClient(token="sequential"),  # type: ignore
+                workspace="test",
+                num_channel_workers=1,
+                num_thread_workers=1,
+            )
+        ]
+        concurrent_docs = list(
+            get_all_docs(
+                client=_FakeSlackClient(token="concurrent"),  # type: ignore
+                workspace="test",
+                num_channel_workers=2,
+                num_thread_workers=4,
+            )
+        )
+
+        expected_doc_ids = [
+            f"{channel_id}__{ind}.0"
+            for channel_id in ["C1", "C2"]
+            for ind in range(8)
+            if ind != 5
+        ]
+        self.assertEqual(sequential_doc_ids, expected_doc_ids)
+        self.assertEqual([doc.id for doc in concurrent_docs], expected_doc_ids)
+        # threads include their replies
+        self.assertEqual(len(concurrent_docs[0].sections), 2)
+        self.assertEqual(len(concurrent_docs[1].sections), 1)
+
+
+def _get_message_time(channel_ind: int, num_channels: int, ind: int) -> datetime:
+    # the load connector's document ids are the message timestamps, so they must not
+    # collide across channels
+    return _EXPORT_START + timedelta(
+        days=ind // _EXPORT_MESSAGES_PER_DAY,
+        seconds=(ind % _EXPORT_MESSAGES_PER_DAY) * num_channels + channel_ind,
+    )
+
+
+def _get_message_ind(doc_id: str, num_channels: int) -> int:
+    """Inverse of `_get_message_time`, position of the message across all channels"""
+    day, seconds = divmod(int(float(doc_id) - _EXPORT_START.timestamp()), 86400)
+    slot, channel_ind = divmod(seconds, num_channels)
+    return (
+        channel_ind * _EXPORT_MESSAGES_PER_CHANNEL
+        + day * _EXPORT_MESSAGES_PER_DAY
+        + slot
+    )
+
+
+def _write_synthetic_export(export_path: Path, channel_names: list[str]) -> None:
+    """Every 10th message starts a thread with 3 replies, spread over the following
+    days. One reply of every 50th thread is missing from the export."""
+    with open(export_path / "channels.json", "w") as f:
+        json.dump(
+            [
+                {"id": f"C{ind}", "name": channel_name}
+                for ind, channel_name in enumerate(channel_names)
+            ],
+            f,
+        )
+
+    for channel_ind, channel_name in enumerate(channel_names):
+        events_by_day: dict[str, list[dict[str, Any]]] = {}
+
+        def _add_event(event_time: datetime, event: dict[str, Any]) -> None:
+            events_by_day.setdefault(event_time.strftime("%Y-%m-%d"), []).append(
+                {"type": "message", "ts": f"{event_time.timestamp():.6f}"} | event
+            )
+
+        for ind in range(_EXPORT_MESSAGES_PER_CHANNEL):
+            message_time = _get_message_time(channel_ind, len(channel_names), ind)
+            message: dict[str, Any] = {"text": f"message {ind} " + "lorem ipsum " * 20}
+            if ind % 10 == 0:
+                reply_times = [message_time + timedelta(days=day) for day in (0, 1, 3)]
+                thread_ts = f"{message_time.timestamp():.6f}"
+                message |= {
+                    "thread_ts": thread_ts,
+                    "reply_count": len(reply_times),
+                    "latest_reply": f"{reply_times[-1].timestamp() + 0.5:.6f}",
+                }
+                for reply_ind, reply_time in enumerate(reply_times):
+                    if ind % 500 == 0 and reply_ind == 1:
+                        continue
+                    _add_event(
+                        reply_time + timedelta(microseconds=500000),
+                        {"text": f"reply {reply_ind}", "thread_ts": thread_ts},
+                    )
+            _add_event(message_time, message)
+            if ind % 100 == 0:
+                _add_event(message_time, {"subtype": "channel_join", "text": "hi"})
+
+        os.makedirs(export_path / channel_name)
+        for day, events in events_by_day.items():
+            with open(export_path / channel_name / f"{day}.json", "w") as f:
+                json.dump(sorted(events, key=lambda event: float(event["ts"])), f)
+
+
+class TestSlackLoadConnector(unittest.TestCase):
+    def test_load_synthetic_export(self) -> None:
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_path = Path(export_dir)
+            channel_names = ["general", "random", "engineering"]
+            _write_synthetic_export(export_path, channel_names)
+            num_expected_docs = len(channel_names) * _EXPORT_MESSAGES_PER_CHANNEL
+            export_size = sum(
+                path.stat().st_size for path in export_path.rglob("*.json")
+            )
+
+            connector = SlackLoadConnector(
+                workspace="test",
+                export_path_str=export_dir,
+                batch_size=16,
+                num_workers=2,
+            )
+            # allocated up front so that it doesn't count towards the traced memory
+            times_seen = bytearray(num_expected_docs)
+            section_cnts: Counter[int] = Counter()
+            tracemalloc.start()
+            try:
+                for doc_batch in connector.load_from_state():
+                    self.assertLessEqual(len(doc_batch), 16)
+                    for doc in doc_batch:
+                        times_seen[_get_message_ind(doc.id, len(channel_names))] += 1
+                    section_cnts.update(len(doc.sections) for doc in doc_batch)
+                _, peak_memory = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        # every thread / message exactly once, nothing re-yielded
+        self.assertEqual(set(times_seen), {1})
+        # threads are collected across day files, including ones missing a reply
+        num_threads = num_expected_docs // 10
+        num_incomplete_threads = num_expected_docs // 500
+        self.assertEqual(
+            section_cnts,
+            {
+                1: num_expected_docs - num_threads,
+                4: num_threads - num_incomplete_threads,
+                3: num_incomplete_threads,
+            },
+        )
+        # memory doesn't grow with the size of the export
+        self.assertLess(peak_memory, min(export_size // 2, 16 * 1024 * 1024))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+import unittest
+from collections.abc import Sequence
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+
+from bs4 import BeautifulSoup
+
+from danswer.connectors.cross_connector_utils.state_store import ConnectorStateStore
+from danswer.connectors.web.utils import CrawlFrontier
+from danswer.connectors.web.utils import HostRateLimiter
+from danswer.connectors.web.utils import looks_js_rendered
+from danswer.connectors.web.utils import normalize_url
+from danswer.connectors.web.utils import PageStateStore
+from danswer.connectors.web.utils import parse_sitemap_lastmod
+
+
+class _InMemoryStateStore(ConnectorStateStore):
+    def __init__(self, connector_id: int, credential_id: int) -> None:
+        super().__init__(connector_id, credential_id)
+        self.values: dict[str, Any] = {}
+        self.num_stored_values = 0
+
+    def load(self, keys: Sequence[str]) -> dict[str, Any]:
+        return {key: self.values[key] for key in keys if key in self.values}
+
+    def store(self, values: dict[str, Any]) -> None:
+        self.values.update(values)
+        self.num_stored_values += len(values)
+
+    def delete(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class TestCrawlUtils(unittest.TestCase):
+    def test_normalize_url(self) -> None:
+        self.assertEqual(
+            normalize_url("HTTPS://Docs.Example.com:443/a?b=1#intro"),
+            "https://docs.example.com/a?b=1",
+        )
+        self.assertEqual(
+            normalize_url("http://example.com"), normalize_url("http://example.com/")
+        )
+        self.assertNotEqual(
+            normalize_url("http://example.com:8080/"),
+            normalize_url("http://example.com/"),
+        )
+
+    def test_frontier_dedupes(self) -> None:
+        frontier = CrawlFrontier(["https://example.com/a", "https://example.com/a#b"])
+        self.assertEqual(len(frontier), 1)
+        self.assertFalse(frontier.mark_seen("https://EXAMPLE.com/a"))
+        self.assertTrue(frontier.mark_seen("https://example.com/redirected"))
+        self.assertFalse(frontier.add("https://example.com/redirected"))
+
+        self.assertTrue(frontier.add("https://example.com/c"))
+        self.assertEqual(frontier.pop(), "https://example.com/a")
+        self.assertEqual(frontier.pop(), "https://example.com/c")
+        self.assertIsNone(frontier.pop())
+        # already visited URLs are not handed out again
+        self.assertFalse(frontier.add("https://example.com/c"))
+
+    def test_looks_js_rendered(self) -> None:
+        paragraph = "<p>" + "Some documentation text. " * 20 + "</p>"
+        static_page = f"<html><body><main>{paragraph}</main></body></html>"
+        self.assertFalse(looks_js_rendered(BeautifulSoup(static_page, "html.parser")))
+
+        empty_spa = (
+            '<html><body><div id="root"></div>'
+            f"<script>{'var a = 1;' * 100}</script></body></html>"
+        )
+        self.assertTrue(looks_js_rendered(BeautifulSoup(empty_spa, "html.parser")))
+
+        # server side rendered single page app
+        rendered_spa = f'<html><body><div id="__next">{paragraph}</div></body></html>'
+        self.assertFalse(looks_js_rendered(BeautifulSoup(rendered_spa, "html.parser")))
+
+    def test_host_rate_limiter(self) -> None:
+        limiter = HostRateLimiter(max_concurrent_per_host=1, min_interval_seconds=0.05)
+        max_in_flight = 0
+        in_flight = 0
+
+        async def _request(url: str) -> None:
+            nonlocal in_flight, max_in_flight
+            async with limiter.limit(url):
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        async def _run() -> None:
+            await asyncio.gather(
+                *[_request(f"https://example.com/{i}") for i in range(3)]
+            )
+
+        start = time.monotonic()
+        asyncio.run(_run())
+        self.assertEqual(max_in_flight, 1)
+        # 3 requests to the same host are spaced out by the minimum interval
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_parse_sitemap_lastmod(self) -> None:
+        self.assertEqual(
+            parse_sitemap_lastmod("2024-05-01T10:00:00+02:00"),
+            datetime(2024, 5, 1, 8, tzinfo=timezone.utc),
+        )
+        # the page may have been edited later that day, e.g. after the last crawl
+        date_only_lastmod = parse_sitemap_lastmod("2024-05-01")
+        assert date_only_lastmod is not None
+        self.assertGreater(
+            date_only_lastmod, datetime(2024, 5, 1, 23, 59, tzinfo=timezone.utc)
+        )
+        self.assertIsNone(parse_sitemap_lastmod("2024-05"))
+
+    def test_page_state_store(self) -> None:
+        state_store = _InMemoryStateStore(connector_id=1, credential_id=1)
+        page_states = PageStateStore(state_store)
+        self.assertEqual(page_states.get("https://example.com/a"), {})
+        page_states.update("https://example.com/a", content_hash="1", etag="x")
+        page_states.update("https://example.com/b", content_hash="2")
+        # nothing is written until the batch is done
+        self.assertEqual(state_store.num_stored_values, 0)
+        page_states.save()
+        self.assertEqual(state_store.num_stored_values, 2)
+
+        # only the pages which changed are written
+        page_states.update("https://example.com/a", content_hash="1")
+        page_states.update("https://example.com/b", content_hash="3")
+        page_states.save()
+        self.assertEqual(state_store.num_stored_values, 3)
+
+        self.assertEqual(
+            PageStateStore(state_store).get("https://example.com/a"),
+            {"content_hash": "1", "etag": "x"},
+        )
+
+    def test_page_state_store_without_cc_pair(self) -> None:
+        page_states = PageStateStore(None)
+        page_states.update("https://example.com/a", content_hash="1")
+        page_states.save()
+        self.assertEqual(
+            page_states.get("https://example.com/a"), {"content_hash": "1"}
+        )
+        self.assertEqual(PageStateStore(None).get("https://example.com/a"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
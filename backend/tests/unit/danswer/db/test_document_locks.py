@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from danswer.db.document import get_document_lock_stats
+from danswer.db.document import prepare_to_modify_documents
+
+
+@patch("danswer.db.document.time.sleep")
+class TestPrepareToModifyDocuments(unittest.TestCase):
+    def _prepare(self, caller: str, attempts: list[tuple[bool, float]]) -> None:
+        with patch("danswer.db.document.acquire_document_locks", side_effect=attempts):
+            prepare_to_modify_documents(
+                db_session=MagicMock(),
+                document_ids=["a", "b"],
+                caller=caller,
+                contended_threshold_ms=100,
+            )
+
+    def test_slow_first_attempt_is_contended(self, _sleep: MagicMock) -> None:
+        self._prepare("slow_first_attempt", [(True, 2.5)])
+
+        stats = get_document_lock_stats()["slow_first_attempt"]
+        self.assertEqual(stats.num_acquisitions, 1)
+        self.assertEqual(stats.num_attempts, 1)
+        self.assertEqual(stats.num_contended_attempts, 1)
+        self.assertEqual(stats.total_lock_wait_seconds, 2.5)
+
+    def test_every_attempt_is_recorded(self, _sleep: MagicMock) -> None:
+        self._prepare("retried", [(False, 10.0), (True, 0.01)])
+
+        stats = get_document_lock_stats()["retried"]
+        self.assertEqual(stats.num_acquisitions, 1)
+        self.assertEqual(stats.num_failures, 0)
+        self.assertEqual(stats.num_attempts, 2)
+        # the retry got the locks right away
+        self.assertEqual(stats.num_contended_attempts, 1)
+        self.assertAlmostEqual(stats.total_lock_wait_seconds, 10.01)
+        self.assertEqual(stats.max_lock_wait_seconds, 10.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
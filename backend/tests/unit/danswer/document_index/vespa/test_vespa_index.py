@@ -0,0 +1,69 @@
+import unittest
+from typing import Any
+from unittest.mock import patch
+
+from tiktoken.core import Encoding
+
+from danswer.configs.constants import LLM_TOKEN_COUNT
+from danswer.configs.model_configs import INDEXING_LLM_TOKENIZER_ENCODING
+from danswer.document_index.vespa.index import _vespa_hit_to_inference_chunk
+from danswer.document_index.vespa.index import VespaIndex
+from danswer.llm.utils import get_chunk_llm_token_count
+from danswer.llm.utils import tokenizer_trim_chunks
+
+
+def _build_hit(content: str, llm_token_count: int | None) -> dict[str, Any]:
+    fields: dict[str, Any] = {
+        "document_id": "doc-1",
+        "chunk_id": 0,
+        "blurb": content[:20],
+        "content": content,
+        "source_type": "web",
+        "source_links": '{"0": "https://example.com"}',
+        "semantic_identifier": "Example",
+        "section_continuation": False,
+    }
+    if llm_token_count is not None:
+        fields[LLM_TOKEN_COUNT] = llm_token_count
+    return {"fields": fields, "relevance": 1.0}
+
+
+class TestVespaLlmTokenCount(unittest.TestCase):
+    def setUp(self) -> None:
+        # stand-in for the indexing tokenizer, the real one needs to be downloaded
+        self.tokenizer = Encoding(
+            name=INDEXING_LLM_TOKENIZER_ENCODING,
+            pat_str=r"\S+|\s+",
+            mergeable_ranks={bytes([ind]): ind for ind in range(256)},
+            special_tokens={},
+        )
+        tokenizer_patch = patch(
+            "danswer.llm.utils.get_default_llm_tokenizer",
+            return_value=self.tokenizer,
+        )
+        tokenizer_patch.start()
+        self.addCleanup(tokenizer_patch.stop)
+
+    def test_token_count_is_selected(self) -> None:
+        self.assertIn(f"{LLM_TOKEN_COUNT}, ", VespaIndex.yql_base)
+
+    def test_stored_token_count_skips_tokenizer(self) -> None:
+        chunk = _vespa_hit_to_inference_chunk(
+            _build_hit("some chunk content", llm_token_count=4)
+        )
+        with patch.object(self.tokenizer, "encode") as encode:
+            self.assertEqual(get_chunk_llm_token_count(chunk), 4)
+            self.assertEqual(tokenizer_trim_chunks([chunk], max_chunk_toks=10), [chunk])
+        encode.assert_not_called()
+
+    def test_missing_token_count_tokenizes(self) -> None:
+        chunk = _vespa_hit_to_inference_chunk(
+            _build_hit("some chunk content", llm_token_count=None)
+        )
+        with patch.object(self.tokenizer, "encode", return_value=[1, 2, 3]) as encode:
+            self.assertEqual(get_chunk_llm_token_count(chunk), 3)
+        encode.assert_called_once_with("some chunk content")
+
+
+if __name__ == "__main__":
+    unittest.main()
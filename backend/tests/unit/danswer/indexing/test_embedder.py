@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from danswer.configs.constants import DocumentSource
+from danswer.connectors.models import Document
+from danswer.connectors.models import Section
+from danswer.indexing.embedder import embed_chunks
+from danswer.indexing.models import DocAwareChunk
+
+
+def _build_chunks(num_chunks: int) -> list[DocAwareChunk]:
+    document = Document(
+        id="doc",
+        sections=[Section(link="https://example.com", text="text")],
+        source=DocumentSource.WEB,
+        semantic_identifier="doc",
+        metadata={},
+    )
+    return [
+        DocAwareChunk(
+            source_document=document,
+            chunk_id=chunk_id,
+            blurb="chunk",
+            content=f"chunk {chunk_id}",
+            source_links=None,
+            section_continuation=False,
+        )
+        for chunk_id in range(num_chunks)
+    ]
+
+
+def _fake_encode(texts: list[str]) -> list[list[float]]:
+    return [[float(text.split()[-1])] for text in texts]
+
+
+class TestEmbedChunks(unittest.TestCase):
+    @patch("danswer.indexing.embedder.MAX_BATCH_SIZE_ENCODE_CHUNKS", 4)
+    @patch("danswer.indexing.embedder.get_default_tokenizer")
+    def test_model_server_buckets_texts(self, get_tokenizer: MagicMock) -> None:
+        embedding_model = MagicMock(embed_server_endpoint="http://model-server")
+        embedding_model.encode.side_effect = _fake_encode
+
+        embedded_chunks = embed_chunks(
+            _build_chunks(10), embedding_model=embedding_model, enable_mini_chunk=False
+        )
+
+        get_tokenizer.assert_not_called()
+        self.assertEqual(
+            [len(call.args[0]) for call in embedding_model.encode.call_args_list],
+            [4, 4, 2],
+        )
+        self.assertEqual(
+            [chunk.embeddings.full_embedding for chunk in embedded_chunks],
+            [[float(chunk_id)] for chunk_id in range(10)],
+        )
+
+    @patch("danswer.indexing.embedder.get_default_tokenizer")
+    def test_local_model_buckets_texts(self, get_tokenizer: MagicMock) -> None:
+        get_tokenizer.return_value.tokenize.side_effect = lambda text: text.split()
+        embedding_model = MagicMock(embed_server_endpoint=None)
+        embedding_model.encode.side_effect = _fake_encode
+
+        embedded_chunks = embed_chunks(
+            _build_chunks(3), embedding_model=embedding_model, enable_mini_chunk=False
+        )
+
+        get_tokenizer.assert_called()
+        self.assertEqual(
+            [chunk.embeddings.full_embedding for chunk in embedded_chunks],
+            [[0.0], [1.0], [2.0]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
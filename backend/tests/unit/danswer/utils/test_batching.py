@@ -0,0 +1,51 @@
+import unittest
+
+from danswer.utils.batching import apply_length_bucketed
+from danswer.utils.batching import length_bucketed_batch_indices
+
+
+class TestLengthBucketedBatching(unittest.TestCase):
+    def test_batches_respect_token_budget(self) -> None:
+        lengths = [512, 20, 512, 20, 300, 20]
+        batches = length_bucketed_batch_indices(lengths=lengths, token_budget=1024)
+
+        # every index is batched exactly once
+        self.assertEqual(sorted(ind for batch in batches for ind in batch), [*range(6)])
+        for batch in batches:
+            padded_size = len(batch) * max(lengths[ind] for ind in batch)
+            self.assertLessEqual(padded_size, 1024)
+
+        # batches are consecutive runs of the items sorted longest first, so the
+        # medium length item is batched with the short ones that still fit the budget
+        # at its length, and the last short one starts a new batch
+        self.assertEqual(batches[0], [0, 2])
+        self.assertEqual(batches[1], [4, 1, 3])
+        self.assertEqual(batches[2], [5])
+
+    def test_oversized_item_and_max_batch_size(self) -> None:
+        batches = length_bucketed_batch_indices(
+            lengths=[2000, 10, 10, 10], token_budget=512, max_batch_size=2
+        )
+        self.assertEqual(batches, [[0], [1, 2], [3]])
+
+    def test_apply_restores_original_order(self) -> None:
+        items = ["aaaa", "b", "ccc", "dd", ""]
+        seen_batches: list[list[str]] = []
+
+        def _func(batch: list[str]) -> list[int]:
+            seen_batches.append(batch)
+            return [len(item) for item in batch]
+
+        results = apply_length_bucketed(
+            items=items,
+            lengths=[len(item) for item in items],
+            func=_func,
+            token_budget=4,
+        )
+
+        self.assertEqual(results, [4, 1, 3, 2, 0])
+        self.assertEqual(seen_batches[0], ["aaaa"])
+
+
+if __name__ == "__main__":
+    unittest.main()
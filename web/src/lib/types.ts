@@ -163,6 +163,7 @@ export interface ConnectorIndexingStatus<
   docs_indexed: number;
   error_msg: string;
   latest_index_attempt: IndexAttemptSnapshot | null;
+  queue_position: number | null;
   deletion_attempt: DeletionAttemptSnapshot | null;
   is_deletable: boolean;
 }
@@ -270,6 +271,10 @@ export interface DeletionAttemptSnapshot {
   connector_id: number;
   credential_id: number;
   status: TaskStatus;
+  num_docs_deleted: number | null;
+  num_docs_updated: number | null;
+  num_docs_remaining: number | null;
+  eta_seconds: number | null;
 }
 
 // DOCUMENT SETS